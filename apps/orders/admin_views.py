@@ -0,0 +1,78 @@
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from apps.products.permissions import IsAdmin
+from .models import Order
+from .serializers import OrderSerializer, OrderStatusHistorySerializer, BulkTransitionSerializer
+from .status import transition_orders, order_queue, MAX_BULK_ORDERS, QUEUE_PAGE_SIZE, MAX_QUEUE_PAGE_SIZE
+
+class AdminOrderViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet for admins to move orders through fulfilment
+    """
+    queryset = Order.objects.select_related('user').prefetch_related('items__product')
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated, IsAdmin]
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        order_status = self.request.query_params.get('status')
+        if order_status:
+            queryset = queryset.filter(status=order_status)
+        return queryset
+    
+    @action(detail=False, methods=['post'])
+    def bulk_transition(self, request):
+        """Move up to MAX_BULK_ORDERS orders to a new status in one transaction"""
+        return self.transition(request, request.data)
+    
+    @action(detail=False, methods=['post'])
+    def bulk_cancel(self, request):
+        """Cancel many orders (e.g. a failed payment batch) and restock their items; safe to retry"""
+        return self.transition(request, {
+            'order_ids': request.data.get('order_ids'),
+            'status': 'cancelled',
+            'note': request.data.get('note', ''),
+        })
+    
+    def transition(self, request, data):
+        serializer = BulkTransitionSerializer(data=data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        if len(data['order_ids']) > MAX_BULK_ORDERS:
+            return Response({'error': f'At most {MAX_BULK_ORDERS} orders per call'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        moved, skipped = transition_orders(data['order_ids'], data['status'], user=request.user, note=data['note'])
+        return Response({
+            'status': data['status'],
+            'updated': sum(len(pks) for pks in moved.values()),
+            'updated_ids': [pk for pks in moved.values() for pk in pks],
+            'skipped': [{'id': pk, 'reason': reason} for pk, reason in skipped.items()],
+        })
+    
+    @action(detail=False, methods=['get'])
+    def queue(self, request):
+        """Oldest orders in a status (?status=pending&limit=&cursor=), for fulfilment to work through"""
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', QUEUE_PAGE_SIZE)), MAX_QUEUE_PAGE_SIZE))
+            orders, next_cursor = order_queue(
+                request.query_params.get('status', 'pending'),
+                cursor=request.query_params.get('cursor'),
+                limit=limit,
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'results': OrderSerializer(orders, many=True).data,
+            'next_cursor': next_cursor,
+        })
+    
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Status changes of one order, oldest first"""
+        order = self.get_object()
+        history = order.status_history.select_related('changed_by')
+        return Response(OrderStatusHistorySerializer(history, many=True).data)
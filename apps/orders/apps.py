@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.orders'
\ No newline at end of file
+    name = 'apps.orders'
+
+    def ready(self):
+        from . import signals  # noqa: F401
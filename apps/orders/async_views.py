@@ -0,0 +1,176 @@
+"""
+Async (ASGI) versions of the cart and order-history endpoints.
+
+Responses have the same shape as CartSerializer / OrderSerializer; the
+cart view is read-only, so a user without a cart gets an empty one
+instead of having it created.
+
+`events` is a server-sent event stream that replaces polling the cart and
+products: 'product' events (the change feed entries) for the products
+given in ?products=, and 'cart' events for the user's cart. EventSource
+can't send headers, so the token may come as ?token=. A stream ends after
+EVENTS['MAX_CONNECTION_SECONDS'] and the browser reconnects by itself,
+which also bounds streams whose client vanished without the server
+noticing.
+"""
+import asyncio
+import time
+from decimal import Decimal
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import exceptions
+from retailhive.authentication import CachedTokenAuthentication
+from retailhive.async_db import get_store
+from retailhive.events import get_broker, get_config as get_events_config
+from retailhive.renderers import dumps
+from apps.products.async_views import PRODUCTS, fetch_by_ids, json_value, serialize_products
+
+ORDERS = 'orders_order'
+ORDER_ITEMS = 'orders_orderitem'
+CARTS = 'orders_cart'
+CART_ITEMS = 'orders_cartitem'
+
+def to_decimal(value):
+    if hasattr(value, 'to_decimal'):
+        value = value.to_decimal()
+    return Decimal(value)
+
+async def authenticate(request):
+    """Return the token user, or None when the request is not authenticated"""
+    try:
+        credentials = await CachedTokenAuthentication().aauthenticate(request)
+    except exceptions.AuthenticationFailed:
+        return None
+    return credentials[0] if credentials else None
+
+def unauthorized():
+    return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+async def cart(request):
+    """GET the current user's cart"""
+    user = await authenticate(request)
+    if user is None:
+        return unauthorized()
+
+    store = get_store()
+    user_cart = await store[CARTS].find_one({'user_id': user.pk})
+    if user_cart is None:
+        return JsonResponse({'id': None, 'items': [], 'total_items': 0, 'total_price': 0, 'created_at': None})
+
+    items = await store[CART_ITEMS].find({'cart_id': user_cart['id']}).sort('id', 1).to_list(None)
+    products = await store[PRODUCTS].find({'id': {'$in': [i['product_id'] for i in items]}}).to_list(None)
+    products = {p['id']: p for p in await serialize_products(store, products)}
+
+    data = [
+        {'id': item['id'], 'product': products.get(item['product_id']), 'quantity': item['quantity']}
+        for item in items
+    ]
+    total_price = sum(
+        item['quantity'] * Decimal(products[item['product_id']]['price'])
+        for item in items if item['product_id'] in products
+    )
+    return JsonResponse({
+        'id': user_cart['id'],
+        'items': data,
+        'total_items': sum(item['quantity'] for item in items),
+        'total_price': json_value(total_price) if items else 0,
+        'created_at': json_value(user_cart.get('created_at')),
+    })
+
+async def orders(request):
+    """GET the current user's orders, newest first"""
+    user = await authenticate(request)
+    if user is None:
+        return unauthorized()
+
+    store = get_store()
+    user_orders = await store[ORDERS].find({'user_id': user.pk}).sort('created_at', -1).to_list(None)
+    items = await store[ORDER_ITEMS].find(
+        {'order_id': {'$in': [o['id'] for o in user_orders]}}
+    ).sort('id', 1).to_list(None) if user_orders else []
+    products = await fetch_by_ids(store, PRODUCTS, {i['product_id'] for i in items}, {'id': 1, 'name': 1})
+
+    items_by_order = {}
+    for item in items:
+        price = to_decimal(item['price'])
+        items_by_order.setdefault(item['order_id'], []).append({
+            'id': item['id'],
+            'product': item['product_id'],
+            'product_name': products.get(item['product_id'], {}).get('name'),
+            'quantity': item['quantity'],
+            'price': json_value(price),
+            'total_price': json_value(item['quantity'] * price),
+        })
+
+    return JsonResponse([
+        {
+            'id': order['id'],
+            'user_name': user.username,
+            'status': order['status'],
+            'total_amount': json_value(order['total_amount']),
+            'shipping_address': order['shipping_address'],
+            'created_at': json_value(order.get('created_at')),
+            'items': items_by_order.get(order['id'], []),
+        }
+        for order in user_orders
+    ], safe=False)
+
+async def authenticate_key(key):
+    try:
+        credentials = await CachedTokenAuthentication().aauthenticate_key(key)
+    except exceptions.AuthenticationFailed:
+        return None
+    return credentials[0]
+
+def format_event(event, data):
+    return b'event: ' + event.encode() + b'\ndata: ' + dumps(data) + b'\n\n'
+
+async def event_stream(broker, subscription, config):
+    deadline = time.monotonic() + config['MAX_CONNECTION_SECONDS']
+    try:
+        # Reconnect after 3s, and tell the client to (re)load its state
+        yield b'retry: 3000\n' + format_event('ready', {})
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event, data = await asyncio.wait_for(subscription.get(), min(config['HEARTBEAT_SECONDS'], remaining))
+            except asyncio.TimeoutError:
+                yield b': keepalive\n\n'
+                continue
+            yield format_event(event, data)
+    finally:
+        broker.unsubscribe(subscription)
+
+async def events(request):
+    """GET a server-sent event stream of ?products= stock changes and, when authenticated, cart changes"""
+    config = get_events_config()
+    try:
+        product_ids = {int(pk) for pk in request.GET.get('products', '').split(',') if pk}
+    except ValueError:
+        return JsonResponse({'error': 'products must be comma separated ids'}, status=400)
+    if len(product_ids) > config['MAX_PRODUCTS']:
+        return JsonResponse({'error': f"At most {config['MAX_PRODUCTS']} products per stream"}, status=400)
+    channels = {f'product:{pk}' for pk in product_ids}
+
+    user = await authenticate(request)
+    if user is None and request.GET.get('token'):
+        user = await authenticate_key(request.GET['token'])
+        if user is None:
+            return unauthorized()
+    if user is not None:
+        channels.add(f'user:{user.pk}')
+    if not channels:
+        return JsonResponse({'error': 'Give products or a token to subscribe to'}, status=400)
+
+    broker = get_broker()
+    subscription = broker.subscribe(channels)
+    if subscription is None:
+        response = JsonResponse({'error': 'Too many event streams, retry later'}, status=503)
+        response['Retry-After'] = '30'
+        return response
+
+    response = StreamingHttpResponse(event_stream(broker, subscription, config), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'   # don't let nginx buffer the stream
+    return response
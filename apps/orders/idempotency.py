@@ -0,0 +1,126 @@
+"""
+Idempotency-Key support for order and cart writes.
+
+A client that may retry a write sends the same Idempotency-Key header
+with each attempt. The first attempt claims the key by inserting a row;
+the unique (user, key) index makes the claim atomic, so concurrent
+duplicates can't both run. When the view finishes, its response is
+stored on the row (compact JSON). Later attempts are answered from that
+row without running the view again:
+
+    - finished          -> the stored response, with Idempotent-Replayed: true
+    - still in flight   -> 409, with Retry-After
+    - different request -> 422 (same key, other endpoint or body)
+
+5xx responses and exceptions release the key so the request can be
+retried for real. Keys expire after IDEMPOTENCY['TTL'] seconds (purge
+with purge_idempotency_keys). A claim left by a crashed worker is taken
+over after IDEMPOTENCY['IN_FLIGHT_TIMEOUT'] seconds.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+def get_config():
+    config = {'TTL': 86400, 'IN_FLIGHT_TIMEOUT': 60}
+    config.update(getattr(settings, 'IDEMPOTENCY', {}))
+    return config
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, separators=(',', ':'), cls=JSONEncoder, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+def claim(user, key, endpoint, fingerprint):
+    """Return (record, created): a new in-flight claim, or the existing record for the key"""
+    config = get_config()
+    now = timezone.now()
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, endpoint=endpoint, request_hash=fingerprint,
+                    expires_at=now + timedelta(seconds=config['TTL']),
+                ), True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if record is None:
+                continue
+            abandoned = record.response_status is None and \
+                record.created_at <= now - timedelta(seconds=config['IN_FLIGHT_TIMEOUT'])
+            if record.expires_at > now and not abandoned:
+                return record, False
+            # Expired or abandoned: drop it (unless someone else just did) and claim again
+            IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).delete()
+    return None, False
+
+def replay(record, endpoint, fingerprint):
+    if record is None or record.response_status is None:
+        return Response(
+            {'error': 'A request with this Idempotency-Key is still being processed'},
+            status=status.HTTP_409_CONFLICT,
+            headers={'Retry-After': '1'},
+        )
+    if record.endpoint != endpoint or record.request_hash != fingerprint:
+        return Response(
+            {'error': 'This Idempotency-Key was already used for a different request'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    body = json.loads(record.response_body) if record.response_body else None
+    return Response(body, status=record.response_status, headers={'Idempotent-Replayed': 'true'})
+
+def idempotent(endpoint):
+    """Decorator for DRF views and viewset actions that honours the Idempotency-Key header"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, Request))
+            key = request.headers.get(HEADER)
+            if not key or not request.user.is_authenticated:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            fingerprint = request_fingerprint(request)
+            record, created = claim(request.user, key, endpoint, fingerprint)
+            if not created:
+                return replay(record, endpoint, fingerprint)
+
+            try:
+                response = view(*args, **kwargs)
+            except BaseException:
+                IdempotencyKey.objects.filter(pk=record.pk).delete()
+                raise
+            if response.status_code >= 500:
+                IdempotencyKey.objects.filter(pk=record.pk).delete()
+            else:
+                # update() rather than save(): the claim may have been taken over if this ran too long
+                IdempotencyKey.objects.filter(pk=record.pk).update(
+                    response_status=response.status_code,
+                    response_body=json.dumps(response.data, cls=JSONEncoder, separators=(',', ':')),
+                )
+            return response
+        return wrapper
+    return decorator
+
+def purge_expired(batch_size=1000):
+    """Delete expired keys in batches; returns the number deleted"""
+    deleted = 0
+    now = timezone.now()
+    while True:
+        pks = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from apps.orders.idempotency import purge_expired
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per query')
+
+    def handle(self, *args, **options):
+        deleted = purge_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Deleted {deleted} expired idempotency keys'))
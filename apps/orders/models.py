@@ -1,4 +1,4 @@
-from djongo import models
+from django.db import models
 from django.contrib.auth.models import User
 from apps.products.models import Product
 
@@ -15,12 +15,19 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     shipping_address = models.TextField()
+    # Set when placing the order took its items out of stock; only such orders are restocked on cancel
+    stock_reserved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
         db_table = "orders_order"
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_idx'),
+            models.Index(fields=['status', 'created_at'], name='order_status_idx'),
+            models.Index(fields=['-created_at'], name='order_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} - {self.user.username}"
@@ -62,4 +69,45 @@ class CartItem(models.Model):
         db_table = "orders_cartitem"
     
     def __str__(self):
-        return f"{self.quantity}x {self.product.name}"
\ No newline at end of file
+        return f"{self.quantity}x {self.product.name}"
+
+
+class OrderStatusHistory(models.Model):
+    """Append-only log of order status changes"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_history')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['created_at', 'id']
+        db_table = "orders_orderstatushistory"
+        indexes = [
+            models.Index(fields=['order', 'created_at'], name='orderstatus_order_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status} -> {self.to_status}"
+
+class IdempotencyKey(models.Model):
+    """Stored result of a write request, replayed when the client retries with the same Idempotency-Key"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=50)
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)  # None while in flight
+    response_body = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = "orders_idempotencykey"
+        unique_together = ('user', 'key')
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id}:{self.key} ({self.endpoint})"
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Order, OrderItem, Cart, CartItem
+from .models import Order, OrderItem, Cart, CartItem, OrderStatusHistory
 from apps.products.serializers import ProductSerializer
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -44,4 +44,16 @@ class CartSerializer(serializers.ModelSerializer):
 class OrderCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
-        fields = ['shipping_address']
\ No newline at end of file
+        fields = ['shipping_address']
+
+class OrderStatusHistorySerializer(serializers.ModelSerializer):
+    changed_by_name = serializers.CharField(source='changed_by.username', read_only=True, default=None)
+    
+    class Meta:
+        model = OrderStatusHistory
+        fields = ['id', 'from_status', 'to_status', 'changed_by_name', 'note', 'created_at']
+
+class BulkTransitionSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    note = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
@@ -0,0 +1,47 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from apps.products import ranking
+from retailhive import events
+from .models import Cart, CartItem, OrderItem
+
+@receiver(post_save, sender=OrderItem)
+def rank_ordered_item(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ranking.record('order', instance.product_id, instance.quantity)
+
+@receiver(pre_save, sender=CartItem)
+def remember_cart_quantity(sender, instance, **kwargs):
+    instance._previous_quantity = 0
+    if instance.pk:
+        instance._previous_quantity = CartItem.objects.filter(
+            pk=instance.pk
+        ).values_list('quantity', flat=True).first() or 0
+
+@receiver(post_save, sender=CartItem)
+def rank_cart_add(sender, instance, raw=False, **kwargs):
+    # Only increases count as cart adds; lowering a quantity is not a signal of interest
+    added = instance.quantity - getattr(instance, '_previous_quantity', 0)
+    if added > 0 and not raw:
+        ranking.record('cart', instance.product_id, added)
+
+def cart_user_id(item):
+    if CartItem.cart.is_cached(item):
+        return item.cart.user_id
+    return Cart.objects.filter(pk=item.cart_id).values_list('user_id', flat=True).first()
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def publish_cart_change(sender, instance, raw=False, **kwargs):
+    """Tell the owner's open event streams (other tabs and devices) that the cart changed"""
+    if raw:
+        return
+    user_id = cart_user_id(instance)
+    if user_id is None:
+        return
+    data = {
+        'item': instance.pk,
+        'product': instance.product_id,
+        'quantity': 0 if kwargs.get('signal') is post_delete else instance.quantity,
+    }
+    transaction.on_commit(lambda: events.publish(f'user:{user_id}', 'cart', data))
@@ -0,0 +1,117 @@
+"""
+Order status transitions.
+
+Orders move pending -> processing -> shipped -> delivered, and can be
+cancelled until they ship. transition_orders() moves many orders at once
+in a single transaction: one locking read and one conditional UPDATE per
+batch of ids and source status, plus one bulk insert into the status
+history. Each UPDATE is guarded by the status the order was read with,
+so an order is never moved twice; orders whose current status doesn't
+allow the move are reported back instead of failing the whole batch.
+
+Cancelling puts the ordered quantities back in stock in the same
+transaction. Only orders the call actually moved are restocked, so
+retrying a cancellation, or two admins cancelling the same orders at
+once, never restocks an order twice. Orders placed before checkout
+reserved stock (stock_reserved is false) never took anything out of
+stock and are not restocked.
+
+Fulfilment queues are read oldest first per status with a keyset cursor
+on (status, created_at, id), which the order_status_idx index serves
+without scanning earlier pages.
+"""
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from apps.products.pagination import encode_cursor, decode_cursor
+from apps.products.inventory import restore_stock
+from .models import Order, OrderItem, OrderStatusHistory
+
+TRANSITIONS = {
+    'pending': ('processing', 'cancelled'),
+    'processing': ('shipped', 'cancelled'),
+    'shipped': ('delivered',),
+    'delivered': (),
+    'cancelled': (),
+}
+
+MAX_BULK_ORDERS = 10000
+# Ids per IN (...) clause, below SQLite's bound parameter limit
+ID_BATCH_SIZE = 900
+QUEUE_PAGE_SIZE = 50
+MAX_QUEUE_PAGE_SIZE = 500
+
+def batches(items, size=ID_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, ())
+
+def transition_orders(order_ids, status, user=None, note=''):
+    """
+    Move orders to `status` where allowed. Returns (moved, skipped): the
+    ids grouped by the status they left, and {id: reason} for the rest
+    """
+    if status not in TRANSITIONS:
+        raise ValueError(f'Unknown status: {status}')
+    ids = list(dict.fromkeys(order_ids))
+    if len(ids) > MAX_BULK_ORDERS:
+        raise ValueError(f'At most {MAX_BULK_ORDERS} orders can be moved per call')
+
+    now = timezone.now()
+    moved, skipped = {}, {}
+    with transaction.atomic():
+        current = {}
+        for batch in batches(ids):
+            current.update(Order.objects.select_for_update().filter(id__in=batch).values_list('id', 'status'))
+        for pk in ids:
+            old = current.get(pk)
+            if old is None:
+                skipped[pk] = 'not found'
+            elif old == status:
+                skipped[pk] = f'already {status}'
+            elif not can_transition(old, status):
+                skipped[pk] = f'cannot move from {old} to {status}'
+            else:
+                moved.setdefault(old, []).append(pk)
+
+        history = []
+        for source, pks in moved.items():
+            for batch in batches(pks):
+                Order.objects.filter(id__in=batch, status=source).update(status=status, updated_at=now)
+            history.extend(
+                OrderStatusHistory(order_id=pk, from_status=source, to_status=status, changed_by=user, note=note)
+                for pk in pks
+            )
+        OrderStatusHistory.objects.bulk_create(history, batch_size=ID_BATCH_SIZE)
+        if status == 'cancelled':
+            restock_orders([pk for pks in moved.values() for pk in pks])
+    return moved, skipped
+
+def restock_orders(order_ids):
+    """Return the items of those given orders that reserved stock to stock"""
+    quantities = {}
+    for batch in batches(order_ids):
+        for product_id, quantity in OrderItem.objects.filter(order_id__in=batch, order__stock_reserved=True).values(
+            'product_id'
+        ).annotate(total=Sum('quantity')).values_list('product_id', 'total'):
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+    restore_stock(quantities, reason='cancel')
+    return quantities
+
+def order_queue(status, cursor=None, limit=QUEUE_PAGE_SIZE):
+    """Return (orders, next_cursor) for the oldest orders in `status`"""
+    if status not in TRANSITIONS:
+        raise ValueError(f'Unknown status: {status}')
+    orders = Order.objects.filter(status=status).select_related('user').prefetch_related('items__product')
+    if cursor:
+        created_at, pk = decode_cursor(cursor, 'created_at')
+        orders = orders.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+
+    page = list(orders.order_by('created_at', 'id')[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1].created_at, page[-1].id)
+    return page, next_cursor
@@ -44,4 +44,260 @@ class CartAPITest(APITestCase):
     
     def test_get_cart_unauthenticated(self):
         response = self.client.get('/api/orders/cart/')
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class OrderStatusTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', is_staff=True)
+        self.customer = User.objects.create_user(username='customer', password='customerpass')
+        self.orders = [
+            Order.objects.create(user=self.customer, total_amount=10, shipping_address='1 Main St')
+            for _ in range(5)
+        ]
+        self.client.force_authenticate(self.admin)
+
+    def test_bulk_transition_validates_and_records_history(self):
+        from .models import OrderStatusHistory
+        ids = [order.id for order in self.orders]
+        Order.objects.filter(pk=ids[0]).update(status='shipped')
+        
+        response = self.client.post('/api/orders/admin/orders/bulk_transition/', {
+            'order_ids': ids + [999999], 'status': 'processing', 'note': 'batch 1',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(response.data['updated_ids']), ids[1:])
+        self.assertEqual({s['id'] for s in response.data['skipped']}, {ids[0], 999999})
+        self.assertEqual(Order.objects.filter(status='processing').count(), 4)
+        self.assertEqual(OrderStatusHistory.objects.filter(to_status='processing').count(), 4)
+        
+        # Retrying the same call moves nothing
+        response = self.client.post('/api/orders/admin/orders/bulk_transition/', {
+            'order_ids': ids, 'status': 'processing',
+        }, format='json')
+        self.assertEqual(response.data['updated'], 0)
+        
+        response = self.client.get(f'/api/orders/admin/orders/{ids[1]}/history/')
+        self.assertEqual([(h['from_status'], h['to_status'], h['changed_by_name']) for h in response.data],
+                         [('pending', 'processing', 'admin')])
+
+    def test_queue_pages_oldest_first(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'status': 'pending', 'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get('/api/orders/admin/orders/queue/', params)
+            seen += [order['id'] for order in response.data['results']]
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, [order.id for order in self.orders])
+
+    def test_customers_cannot_use_admin_endpoints(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get('/api/orders/admin/orders/queue/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class OrderCancellationTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', is_staff=True)
+        self.customer = User.objects.create_user(username='customer', password='customerpass')
+        self.category = Category.objects.create(name="Electronics")
+        self.phone = Product.objects.create(name="Phone", description="", price=100, category=self.category, stock_quantity=10)
+        self.cable = Product.objects.create(name="Cable", description="", price=5, category=self.category, stock_quantity=10)
+
+    def place_order(self, quantities):
+        cart, _ = Cart.objects.get_or_create(user=self.customer)
+        for product, quantity in quantities.items():
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/orders/orders/create_order/', {'shipping_address': '1 Main St'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def stock(self):
+        return [Product.objects.get(pk=p.pk).stock_quantity for p in (self.phone, self.cable)]
+
+    def test_placing_reserves_and_cancelling_restores_once(self):
+        order_id = self.place_order({self.phone: 2, self.cable: 3})
+        self.assertEqual(self.stock(), [8, 7])
+        
+        response = self.client.post(f'/api/orders/orders/{order_id}/cancel/', {'reason': 'Changed my mind'})
+        self.assertEqual(response.data['status'], 'cancelled')
+        self.assertEqual(self.stock(), [10, 10])
+        
+        response = self.client.post(f'/api/orders/orders/{order_id}/cancel/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.stock(), [10, 10])
+
+    def test_insufficient_stock_rolls_back(self):
+        cart = Cart.objects.create(user=self.customer)
+        CartItem.objects.create(cart=cart, product=self.phone, quantity=1)
+        CartItem.objects.create(cart=cart, product=self.cable, quantity=11)
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/orders/orders/create_order/', {'shipping_address': '1 Main St'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.stock(), [10, 10])
+        self.assertFalse(Order.objects.exists())
+
+    def test_bulk_cancel_is_idempotent(self):
+        ids = [self.place_order({self.phone: 1, self.cable: 2}) for _ in range(3)]
+        Order.objects.filter(pk=ids[2]).update(status='shipped')
+        self.assertEqual(self.stock(), [7, 4])
+        
+        self.client.force_authenticate(self.admin)
+        for _ in range(2):
+            response = self.client.post('/api/orders/admin/orders/bulk_cancel/', {'order_ids': ids}, format='json')
+        self.assertEqual(response.data['updated'], 0)
+        self.assertEqual(self.stock(), [9, 8])
+        self.assertEqual(Order.objects.filter(status='cancelled').count(), 2)
+
+    def test_orders_without_reserved_stock_are_not_restocked(self):
+        order_id = self.place_order({self.phone: 2})
+        Order.objects.filter(pk=order_id).update(stock_reserved=False)
+        self.client.post(f'/api/orders/orders/{order_id}/cancel/')
+        self.assertEqual(Order.objects.get(pk=order_id).status, 'cancelled')
+        self.assertEqual(self.stock(), [8, 10])
+
+class IdempotencyKeyTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='customer', password='customerpass')
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(name="Phone", description="", price=100, category=self.category, stock_quantity=10)
+        self.client.force_authenticate(self.user)
+
+    def add(self, key, quantity=1):
+        return self.client.post('/api/orders/cart/add/', {'product_id': self.product.id, 'quantity': quantity},
+                                format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_stored_response(self):
+        first = self.add('key-1')
+        retry = self.add('key-1')
+        self.assertEqual(retry.status_code, first.status_code)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(CartItem.objects.get().quantity, 1)
+
+        self.add('key-2')
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+
+    def test_checkout_retry_places_one_order(self):
+        self.add('add-1', quantity=2)
+        for _ in range(2):
+            response = self.client.post('/api/orders/orders/create_order/', {'shipping_address': '1 Main St'},
+                                        format='json', HTTP_IDEMPOTENCY_KEY='checkout-1')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock_quantity, 8)
+
+    def test_in_flight_and_mismatched_requests(self):
+        from .models import IdempotencyKey
+        from .idempotency import claim, request_fingerprint
+        record, created = claim(self.user, 'busy', 'add_to_cart', 'x' * 64)
+        self.assertTrue(created)
+        self.assertEqual(self.add('busy').status_code, status.HTTP_409_CONFLICT)
+
+        self.add('used')
+        self.assertEqual(self.add('used', quantity=5).status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        # Expired keys are reclaimed, and purged in bulk
+        from django.utils import timezone
+        from .idempotency import purge_expired
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.assertEqual(self.add('used', quantity=5).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(purge_expired(), 1)
+
+class LiveEventsTest(TestCase):
+    def setUp(self):
+        from retailhive.events import MemoryBroker, set_broker
+        self.user = User.objects.create_user(username='watcher', password='watcherpass')
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(name="Phone", description="", price=100, category=self.category, stock_quantity=10)
+        previous = set_broker(MemoryBroker())
+        self.addCleanup(set_broker, previous)
+
+    def test_broker_fans_out_with_bounded_queues(self):
+        import asyncio
+        from retailhive.events import MemoryBroker
+
+        async def scenario():
+            broker = MemoryBroker(queue_size=3, max_subscribers=2)
+            watcher = broker.subscribe(['product:1'])
+            other = broker.subscribe(['product:2'])
+            self.assertIsNone(broker.subscribe(['product:3']))
+
+            # Published from another thread, delivered on the subscriber's loop
+            await asyncio.to_thread(broker.publish, 'product:1', ('product', {'n': 0}))
+            self.assertEqual(await asyncio.wait_for(watcher.get(), 1), ('product', {'n': 0}))
+
+            # A slow reader loses the backlog and is told to resync instead of blocking writers
+            for n in range(1, 6):
+                broker.publish('product:1', ('product', {'n': n}))
+            await asyncio.sleep(0)
+            received = [watcher.queue.get_nowait() for _ in range(watcher.queue.qsize())]
+            self.assertEqual(received, [('resync', {'dropped': 3}), ('product', {'n': 4}), ('product', {'n': 5})])
+            self.assertTrue(other.queue.empty())
+
+            broker.unsubscribe(watcher)
+            broker.unsubscribe(watcher)
+            self.assertFalse(broker.has_subscribers('product:1'))
+            self.assertEqual(broker.stats(), {'subscribers': 1, 'channels': 1})
+
+        asyncio.run(scenario())
+
+    def test_stream_pushes_stock_and_cart_changes(self):
+        import asyncio
+        import json
+        from django.test import RequestFactory
+        from rest_framework.authtoken.models import Token
+        from apps.products.inventory import reserve_stock
+        from retailhive.authentication import CachedTokenAuthentication, token_cache
+        from .async_views import events
+
+        token = Token.objects.create(user=self.user)
+        CachedTokenAuthentication().load_credentials(token.key)   # no database access inside the loop
+        self.addCleanup(token_cache.clear)
+        factory = RequestFactory()
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        def parse(chunk):
+            lines = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n') if ': ' in line)
+            return lines.get('event'), json.loads(lines.get('data', 'null'))
+
+        self.assertEqual(loop.run_until_complete(events(factory.get('/api/orders/async/events/'))).status_code, 400)
+        with self.settings(EVENTS={'HEARTBEAT_SECONDS': 0.05, 'MAX_CONNECTION_SECONDS': 1}):
+            response = loop.run_until_complete(events(factory.get(
+                '/api/orders/async/events/', {'products': str(self.product.pk), 'token': token.key}
+            )))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(parse(loop.run_until_complete(anext(stream))), ('ready', {}))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock({self.product.pk: 2})
+        event, data = parse(loop.run_until_complete(anext(stream)))
+        self.assertEqual((event, data['product'], data['stock_quantity'], data['changes']), ('product', self.product.pk, 8, ['stock']))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item = CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=self.product, quantity=2)
+        self.assertEqual(parse(loop.run_until_complete(anext(stream))),
+                         ('cart', {'item': item.pk, 'product': self.product.pk, 'quantity': 2}))
+
+        async def drain():
+            return [chunk async for chunk in stream]
+
+        # Heartbeats until the stream ends, then the subscription is gone
+        self.assertIn(b': keepalive\n\n', loop.run_until_complete(drain()))
+        from retailhive.events import get_broker
+        self.assertEqual(get_broker().stats()['subscribers'], 0)
+
+    def test_event_streams_are_not_compressed(self):
+        from django.http import StreamingHttpResponse
+        from django.test import RequestFactory
+        from retailhive.middleware import CompressionMiddleware
+        response = StreamingHttpResponse(iter([b'data: {}\n\n']), content_type='text/event-stream')
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = CompressionMiddleware(lambda request: response).process_response(request, response)
+        self.assertFalse(response.has_header('Content-Encoding'))
@@ -1,13 +1,24 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import OrderViewSet, get_cart, add_to_cart, remove_from_cart
+from .views import OrderViewSet, get_cart, add_to_cart, remove_from_cart, cart_recommendations
+from .admin_views import AdminOrderViewSet
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'orders', OrderViewSet, basename='order')
 
+# Admin router
+admin_router = DefaultRouter()
+admin_router.register(r'orders', AdminOrderViewSet, basename='admin-order')
+
 urlpatterns = [
     path('', include(router.urls)),
+    path('admin/', include(admin_router.urls)),
+    path('async/cart/', async_views.cart, name='async_cart'),
+    path('async/orders/', async_views.orders, name='async_orders'),
+    path('async/events/', async_views.events, name='async_events'),
     path('cart/', get_cart, name='get_cart'),
     path('cart/add/', add_to_cart, name='add_to_cart'),
     path('cart/remove/<int:item_id>/', remove_from_cart, name='remove_from_cart'),
+    path('cart/recommendations/', cart_recommendations, name='cart_recommendations'),
 ]
\ No newline at end of file
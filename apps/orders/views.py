@@ -5,9 +5,16 @@ from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from .models import Order, Cart, CartItem, OrderItem
 from .serializers import OrderSerializer, CartSerializer, CartItemSerializer, OrderCreateSerializer
 from apps.products.models import Product
+from apps.products import ranking, recommendations
+from apps.products.serializers import ProductSerializer
+from apps.products.inventory import reserve_stock
+from .status import transition_orders
+from .idempotency import idempotent
 
 class OrderViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = OrderSerializer
@@ -15,16 +22,14 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     
     def get_queryset(self):
-        try:
-            # Get all orders and filter in Python
-            all_orders = list(Order.objects.all())
-            user_orders = [order for order in all_orders if order.user.id == self.request.user.id]
-            return user_orders
-        except Exception:
-            return []
+        return (
+            Order.objects.filter(user=self.request.user)
+            .select_related('user')
+            .prefetch_related('items__product')
+        )
     
     def list(self, request, *args, **kwargs):
-        """Override list to handle djongo issues"""
+        """List the current user's orders"""
         try:
             orders = self.get_queryset()
             serializer = self.get_serializer(orders, many=True)
@@ -33,20 +38,16 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
             return Response([])
     
     @action(detail=False, methods=['post'])
+    @idempotent('create_order')
     def create_order(self, request):
         serializer = OrderCreateSerializer(data=request.data)
         if serializer.is_valid():
             try:
                 # Get or create cart
-                all_carts = list(Cart.objects.all())
-                user_cart = next((cart for cart in all_carts if cart.user.id == request.user.id), None)
-                
-                if not user_cart:
-                    user_cart = Cart.objects.create(user=request.user)
+                user_cart = get_user_cart(request.user)
                 
                 # Get cart items
-                all_cart_items = list(CartItem.objects.all())
-                cart_items = [item for item in all_cart_items if item.cart.id == user_cart.id]
+                cart_items = list(CartItem.objects.filter(cart=user_cart).select_related('product'))
                 
                 if not cart_items:
                     return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
@@ -54,25 +55,38 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
                 # Calculate total
                 total_amount = sum(item.quantity * item.product.price for item in cart_items)
                 
-                # Create order
-                order = Order.objects.create(
-                    user=request.user,
-                    total_amount=total_amount,
-                    shipping_address=serializer.validated_data['shipping_address']
-                )
-                
-                # Create order items
-                for cart_item in cart_items:
-                    OrderItem.objects.create(
-                        order=order,
-                        product=cart_item.product,
-                        quantity=cart_item.quantity,
-                        price=cart_item.product.price
+                with transaction.atomic():
+                    # Reserve stock first; cancelling the order puts it back
+                    short = reserve_stock({item.product_id: item.quantity for item in cart_items})
+                    if short:
+                        transaction.set_rollback(True)
+                        return Response({'error': 'Insufficient stock', 'product_ids': short}, status=status.HTTP_400_BAD_REQUEST)
+                    
+                    # Create order
+                    order = Order.objects.create(
+                        user=request.user,
+                        total_amount=total_amount,
+                        shipping_address=serializer.validated_data['shipping_address'],
+                        stock_reserved=True
                     )
+                    
+                    # Create order items
+                    OrderItem.objects.bulk_create([
+                        OrderItem(
+                            order=order,
+                            product=cart_item.product,
+                            quantity=cart_item.quantity,
+                            price=cart_item.product.price
+                        )
+                        for cart_item in cart_items
+                    ])
+                    
+                    # Clear cart items
+                    CartItem.objects.filter(cart=user_cart).delete()
                 
-                # Clear cart items
-                for item in cart_items:
-                    item.delete()
+                # bulk_create sends no post_save, so feed the rankings directly
+                for cart_item in cart_items:
+                    ranking.record('order', cart_item.product_id, cart_item.quantity)
                 
                 # Send confirmation email
                 try:
@@ -90,17 +104,35 @@ class OrderViewSet(viewsets.ReadOnlyModelViewSet):
             except Exception as e:
                 return Response({'error': 'Failed to create order'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel one of your orders before it ships; its items go back in stock"""
+        order = self.get_object()
+        moved, skipped = transition_orders(
+            [order.pk], 'cancelled', user=request.user, note=str(request.data.get('reason', ''))[:255]
+        )
+        if skipped:
+            return Response({'error': f'Order {skipped[order.pk]}'}, status=status.HTTP_400_BAD_REQUEST)
+        order.refresh_from_db()
+        return Response(OrderSerializer(order).data)
+
+def get_user_cart(user):
+    """Get or create the cart for a user"""
+    cart, _ = Cart.objects.get_or_create(user=user)
+    return cart
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_cart(request):
     try:
         # Get or create cart
-        all_carts = list(Cart.objects.all())
-        user_cart = next((cart for cart in all_carts if cart.user.id == request.user.id), None)
-        
-        if not user_cart:
-            user_cart = Cart.objects.create(user=request.user)
+        user_cart = get_user_cart(request.user)
+        prefetch_related_objects(
+            [user_cart],
+            'items__product__category',
+            'items__product__reviews__user',
+        )
         
         serializer = CartSerializer(user_cart)
         return Response(serializer.data)
@@ -116,14 +148,11 @@ def get_cart(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('add_to_cart')
 def add_to_cart(request):
     try:
         # Get or create cart
-        all_carts = list(Cart.objects.all())
-        user_cart = next((cart for cart in all_carts if cart.user.id == request.user.id), None)
-        
-        if not user_cart:
-            user_cart = Cart.objects.create(user=request.user)
+        user_cart = get_user_cart(request.user)
         
         product_id = request.data.get('product_id')
         quantity = int(request.data.get('quantity', 1))
@@ -132,8 +161,7 @@ def add_to_cart(request):
             return Response({'error': 'Product ID is required'}, status=status.HTTP_400_BAD_REQUEST)
         
         # Get product
-        all_products = list(Product.objects.all())
-        product = next((p for p in all_products if p.id == int(product_id) and getattr(p, 'is_active', True)), None)
+        product = Product.objects.filter(pk=int(product_id), is_active=True).first()
         
         if not product:
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -142,8 +170,7 @@ def add_to_cart(request):
             return Response({'error': 'Insufficient stock'}, status=status.HTTP_400_BAD_REQUEST)
         
         # Check if item already in cart
-        all_cart_items = list(CartItem.objects.all())
-        existing_item = next((item for item in all_cart_items if item.cart.id == user_cart.id and item.product.id == product.id), None)
+        existing_item = CartItem.objects.filter(cart=user_cart, product=product).first()
         
         if existing_item:
             new_quantity = existing_item.quantity + quantity
@@ -165,18 +192,17 @@ def add_to_cart(request):
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
+@idempotent('remove_from_cart')
 def remove_from_cart(request, item_id):
     try:
         # Get user's cart
-        all_carts = list(Cart.objects.all())
-        user_cart = next((cart for cart in all_carts if cart.user.id == request.user.id), None)
+        user_cart = Cart.objects.filter(user=request.user).first()
         
         if not user_cart:
             return Response({'error': 'Cart not found'}, status=status.HTTP_404_NOT_FOUND)
         
         # Get cart item
-        all_cart_items = list(CartItem.objects.all())
-        cart_item = next((item for item in all_cart_items if item.id == int(item_id) and item.cart.id == user_cart.id), None)
+        cart_item = CartItem.objects.filter(pk=int(item_id), cart=user_cart).first()
         
         if not cart_item:
             return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -184,4 +210,29 @@ def remove_from_cart(request, item_id):
         cart_item.delete()
         return Response({'message': 'Item removed from cart'}, status=status.HTTP_200_OK)
     except Exception as e:
-        return Response({'error': 'Failed to remove item'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({'error': 'Failed to remove item'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cart_recommendations(request):
+    """Products frequently bought together with the items in the cart (?limit=)"""
+    try:
+        limit = int(request.query_params.get('limit', recommendations.DEFAULT_RECOMMENDATIONS))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, recommendations.MAX_RECOMMENDATIONS))
+    
+    user_cart = get_user_cart(request.user)
+    in_cart = CartItem.objects.filter(cart=user_cart).values_list('product_id', flat=True)
+    neighbors = recommendations.for_cart(list(in_cart), limit)
+    products = Product.objects.filter(is_active=True).select_related('category').prefetch_related(
+        'reviews__user'
+    ).in_bulk([pk for pk, _ in neighbors])
+    
+    results = []
+    for pk, score in neighbors:
+        if pk in products:
+            data = ProductSerializer(products[pk]).data
+            data['score'] = round(score, 4)
+            results.append(data)
+    return Response({'results': results})
@@ -2,10 +2,14 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, Count
+from django.db.models import Q
+from django.utils import timezone
 from .models import Product, Category
 from .serializers import ProductSerializer, ProductCreateSerializer
-from .permissions import IsAdminOrReadOnly
+from .permissions import IsAdmin, IsAdminOrReadOnly
+from .exports import export_response, ADMIN_DATASETS
+from .categories import recount_categories
+from . import catalog, changes, facets, ranking, suggest
 
 class AdminProductViewSet(viewsets.ModelViewSet):
     """
@@ -68,34 +72,43 @@ class AdminProductViewSet(viewsets.ModelViewSet):
         """Get dashboard statistics for admin"""
         from apps.orders.models import Order, OrderItem
         from apps.users.models import UserProfile
+        from retailhive.authentication import token_cache
+        from retailhive.fanout import fan_out, FanoutTimeout
         
-        total_products = Product.objects.count()
-        approved_products = Product.objects.filter(is_approved=True).count()
-        pending_products = Product.objects.filter(is_approved=False).count()
+        # Top selling products, read from the ranking service instead of counting order items
+        top_products = [product for product, _ in ranking.top_products(
+            'top_sellers', 5, queryset=Product.objects.select_related('category').prefetch_related('reviews__user')
+        )]
         
-        total_orders = Order.objects.count()
-        total_customers = UserProfile.objects.filter(role='customer').count()
-        total_retailers = UserProfile.objects.filter(role='retailer').count()
-        
-        # Top selling products
-        top_products = Product.objects.annotate(
-            order_count=Count('orderitem')
-        ).order_by('-order_count')[:5]
+        # The counts are independent, so run them concurrently
+        try:
+            stats = fan_out({
+                'total_products': Product.objects.count,
+                'approved_products': Product.objects.filter(is_approved=True).count,
+                'pending_products': Product.objects.filter(is_approved=False).count,
+                'total_orders': Order.objects.count,
+                'total_customers': UserProfile.objects.filter(role='customer').count,
+                'total_retailers': UserProfile.objects.filter(role='retailer').count,
+                'top_products': lambda: ProductSerializer(top_products, many=True).data,
+            }, site='admin_dashboard')
+        except FanoutTimeout:
+            return Response({'error': 'Dashboard statistics timed out'}, status=status.HTTP_504_GATEWAY_TIMEOUT)
         
         return Response({
             'products': {
-                'total': total_products,
-                'approved': approved_products,
-                'pending': pending_products,
+                'total': stats['total_products'],
+                'approved': stats['approved_products'],
+                'pending': stats['pending_products'],
             },
             'users': {
-                'customers': total_customers,
-                'retailers': total_retailers,
+                'customers': stats['total_customers'],
+                'retailers': stats['total_retailers'],
             },
             'orders': {
-                'total': total_orders,
+                'total': stats['total_orders'],
             },
-            'top_products': ProductSerializer(top_products, many=True).data
+            'top_products': stats['top_products'],
+            'auth_cache': token_cache.stats(),
         })
     
     @action(detail=False, methods=['get'])
@@ -121,7 +134,16 @@ class AdminProductViewSet(viewsets.ModelViewSet):
         if not product_ids:
             return Response({'error': 'product_ids is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        updated_count = Product.objects.filter(id__in=product_ids).update(is_approved=True)
+        products = Product.objects.filter(id__in=product_ids)
+        category_ids = set(products.values_list('category_id', flat=True))
+        changed_ids = list(products.filter(is_approved=False).values_list('id', flat=True))
+        # updated_at lets indexes loaded from an older snapshot catch up on the change
+        updated_count = products.update(is_approved=True, updated_at=timezone.now())
+        recount_categories(category_ids)
+        changes.record_products(changed_ids, ['approval'])
+        ranking.update_listings(changed_ids)
+        facets.mark_stale()
+        catalog.mark_stale()
         
         return Response({
             'message': f'{updated_count} products approved successfully',
@@ -135,12 +157,43 @@ class AdminProductViewSet(viewsets.ModelViewSet):
         if not product_ids:
             return Response({'error': 'product_ids is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        updated_count = Product.objects.filter(id__in=product_ids).update(
+        products = Product.objects.filter(id__in=product_ids)
+        category_ids = set(products.values_list('category_id', flat=True))
+        # Products grouped by which of the two flags this actually turns off
+        changed_ids = {}
+        for pk, is_approved, is_active in products.values_list('id', 'is_approved', 'is_active'):
+            changed = tuple(name for name, was_on in (('approval', is_approved), ('active', is_active)) if was_on)
+            changed_ids.setdefault(changed, []).append(pk)
+        updated_count = products.update(
             is_approved=False, 
-            is_active=False
+            is_active=False,
+            updated_at=timezone.now()
         )
+        recount_categories(category_ids)
+        for changed, pks in changed_ids.items():
+            changes.record_products(pks, changed)
+        # update() sends no signals, so take the products out of the suggestions and rankings here
+        for pks in changed_ids.values():
+            for pk in pks:
+                suggest.remove_item('product', pk)
+            ranking.update_listings(pks)
+        facets.mark_stale()
+        catalog.mark_stale()
         
         return Response({
             'message': f'{updated_count} products rejected successfully',
             'updated_count': updated_count
-        })
\ No newline at end of file
+        })
+    
+    # Unlike the other reads here, exports include every customer's orders and addresses
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsAdmin])
+    def export(self, request):
+        """Stream products, reviews, orders or order items as NDJSON or CSV"""
+        dataset = request.query_params.get('dataset', 'products')
+        fmt = request.query_params.get('export_format', 'ndjson')
+        if dataset not in ADMIN_DATASETS:
+            return Response({'error': f'dataset must be one of {ADMIN_DATASETS}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return export_response(dataset, fmt)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.products'
\ No newline at end of file
+    name = 'apps.products'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        # Patch djongo's connection handling before any database is opened
+        if any(db.get('ENGINE') == 'djongo' for db in settings.DATABASES.values()):
+            try:
+                import patch_djongo
+            except ImportError:
+                return
+            patch_djongo.apply()
@@ -0,0 +1,98 @@
+"""
+Async (ASGI) versions of the catalog read endpoints.
+
+These are plain Django async views on top of retailhive.async_db, so a
+single worker can overlap many database round trips. Responses have the
+same shape as the DRF ProductSerializer output.
+"""
+import asyncio
+from datetime import datetime, timezone
+from decimal import Decimal
+from django.http import JsonResponse
+from retailhive.async_db import get_store
+
+PRODUCTS = 'products_product'
+CATEGORIES = 'products_category'
+REVIEWS = 'products_productreview'
+USERS = 'auth_user'
+
+def json_value(value):
+    """Convert driver values (Decimal128, naive UTC datetimes) to DRF's JSON output"""
+    if hasattr(value, 'to_decimal'):
+        value = value.to_decimal()
+    if isinstance(value, Decimal):
+        return str(value.quantize(Decimal('0.01')))
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return value
+
+async def fetch_by_ids(store, collection, ids, projection=None):
+    if not ids:
+        return {}
+    docs = await store[collection].find({'id': {'$in': list(ids)}}, projection).to_list(None)
+    return {doc['id']: doc for doc in docs}
+
+async def serialize_products(store, products):
+    """Serialize product documents with category name, reviews and average rating"""
+    product_ids = [p['id'] for p in products]
+    category_ids = {p.get('category_id') for p in products}
+    categories, reviews = await asyncio.gather(
+        fetch_by_ids(store, CATEGORIES, category_ids, {'id': 1, 'name': 1}),
+        store[REVIEWS].find({'product_id': {'$in': product_ids}}).to_list(None) if product_ids else asyncio.sleep(0, []),
+    )
+    users = await fetch_by_ids(store, USERS, {r['user_id'] for r in reviews}, {'id': 1, 'username': 1})
+
+    reviews_by_product = {}
+    for review in reviews:
+        reviews_by_product.setdefault(review['product_id'], []).append({
+            'id': review['id'],
+            'rating': review['rating'],
+            'comment': review.get('comment', ''),
+            'created_at': json_value(review.get('created_at')),
+            'user_name': users.get(review['user_id'], {}).get('username'),
+        })
+
+    data = []
+    for product in products:
+        product_reviews = reviews_by_product.get(product['id'], [])
+        category = categories.get(product.get('category_id'), {})
+        data.append({
+            'id': product['id'],
+            'category_name': category.get('name'),
+            'reviews': product_reviews,
+            'average_rating': (
+                sum(r['rating'] for r in product_reviews) / len(product_reviews) if product_reviews else 0
+            ),
+            **{
+                key: json_value(value) for key, value in product.items()
+                if key not in ('_id', 'id', 'category_id', 'retailer_id')
+            },
+            'category': product.get('category_id'),
+            'retailer': product.get('retailer_id'),
+        })
+    return data
+
+async def product_list(request):
+    """GET active products"""
+    store = get_store()
+    products = await store[PRODUCTS].find({'is_active': True}).to_list(None)
+    return JsonResponse(await serialize_products(store, products), safe=False)
+
+async def product_search(request):
+    """GET active products whose name or description contains ?q="""
+    import re
+
+    store = get_store()
+    query = request.GET.get('q', '')
+    filter = {'is_active': True}
+    if query:
+        pattern = re.escape(query)
+        filter['$or'] = [
+            {'name': {'$regex': pattern, '$options': 'i'}},
+            {'description': {'$regex': pattern, '$options': 'i'}},
+        ]
+    products = await store[PRODUCTS].find(filter).to_list(None)
+    return JsonResponse(await serialize_products(store, products), safe=False)
@@ -0,0 +1,328 @@
+"""
+Pre-rendered catalog pages for anonymous product list requests.
+
+Every anonymous GET of the product list used to query the database and run
+ProductSerializer over the whole catalog, although the answer is the same
+for everyone. The catalog snapshot renders it once instead:
+  - the full list and PAGE_SIZE pages, for the whole catalog and for each
+    category subtree, keyed by (category id or None, page or None);
+  - each body as plain JSON plus gzip and, when the brotli package is
+    installed, brotli versions, all in one file under SNAPSHOT_DIR;
+  - an index of {key: (etag, {encoding: (offset, length)})} saved with
+    retailhive.snapshots next to it.
+Image URLs in the list are absolute, so a snapshot is built for the
+public API URL in BASE_URL and only serves requests to that host; other
+hosts get the database path. The request's Host header only chooses
+between the two and never ends up in a snapshot. Without BASE_URL there
+is no snapshot.
+Workers memory-map the file, so serving a page is a dict lookup and a
+slice of the mapping, and the pages are shared through the page cache by
+every worker on the host. Requests carrying If-None-Match get a 304.
+
+The bodies are byte-for-byte what the database path of the list endpoint
+returns, so anonymous and authenticated clients see the same JSON.
+
+Product, review and category signals and the bulk stock paths mark the
+snapshot stale. A stale snapshot is not served (the list falls back to
+the database, so a process always sees its own writes), and the next
+anonymous list request starts a rebuild on a background thread, at most
+once per MIN_REBUILD_INTERVAL seconds; no request waits for a build.
+Other workers pick up the new file within RELOAD_CHECK_INTERVAL seconds.
+MAX_AGE bounds staleness for changes made by other processes: an older
+snapshot is still served while a background rebuild replaces it, and
+build_catalog_snapshot rebuilds from cron. Inside a transaction nothing
+is rebuilt, because the build's connection could not see its writes.
+
+A snapshot records which database it was rendered from, and one built
+against another database (a leftover from a different environment or
+test run) is never loaded.
+"""
+import glob
+import gzip
+import hashlib
+import logging
+import mmap
+import os
+import threading
+import time
+import uuid
+from urllib.parse import urljoin
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from retailhive.fanout import in_transaction
+from retailhive.middleware import brotli, choose_encoding
+from retailhive.renderers import dumps
+from retailhive.snapshots import load_snapshot, save_snapshot, snapshot_mtime
+from .categories import path_ids
+from .models import Category, Product
+from .serializers import ProductSerializer
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_NAME = 'catalog'
+SNAPSHOT_VERSION = 2
+
+def get_config():
+    config = {
+        'PAGE_SIZE': 48,
+        'MIN_REBUILD_INTERVAL': 5,
+        'MAX_AGE': 600,
+        'RELOAD_CHECK_INTERVAL': 5,
+        'BROTLI_QUALITY': 9,
+        'BASE_URL': '',
+    }
+    config.update(getattr(settings, 'CATALOG_SNAPSHOT', {}))
+    return config
+
+def database_fingerprint():
+    """Identifies the database a snapshot is rendered from"""
+    db = connections['default'].settings_dict
+    identity = [db.get(key) for key in ('ENGINE', 'NAME', 'HOST', 'PORT', 'CLIENT')]
+    return hashlib.sha1(repr(identity).encode()).hexdigest()
+
+def catalog_queryset():
+    """The products the list endpoint returns, in list order"""
+    return Product.objects.select_related('category', 'retailer').prefetch_related(
+        'reviews__user'
+    ).filter(is_active=True).order_by('id')
+
+class BaseURLRequest:
+    """Just enough of a request for serializers to build absolute URLs against base_url"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def build_absolute_uri(self, location=None):
+        return urljoin(self.base_url, location or '/')
+
+def parse_params(params):
+    """(category id or None, page or None) from the list query string; ValueError if malformed"""
+    category = int(params['category']) if params.get('category') else None
+    page = int(params['page']) if params.get('page') else None
+    if page is not None and page < 1:
+        raise ValueError('page must be positive')
+    return category, page
+
+def page_envelope(count, page, page_size):
+    num_pages = max(1, -(-count // page_size))
+    return {'count': count, 'page': page, 'num_pages': num_pages}
+
+def render_bodies(items, page_size):
+    """{page or None: JSON bytes} for a list of rendered product JSON bytes"""
+    bodies = {None: b'[' + b','.join(items) + b']'}
+    envelope = page_envelope(len(items), 1, page_size)
+    for page in range(1, envelope['num_pages'] + 1):
+        envelope['page'] = page
+        head = dumps(envelope)[:-1]   # drop the closing brace
+        rows = items[(page - 1) * page_size:page * page_size]
+        bodies[page] = head + b',"results":[' + b','.join(rows) + b']}'
+    return bodies
+
+def encode(body, config):
+    encoded = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoded['br'] = brotli.compress(body, quality=config['BROTLI_QUALITY'])
+    return encoded
+
+def build_catalog(base_url, page_size=None):
+    """Render every catalog page for requests to base_url and write the snapshot; returns stats"""
+    config = get_config()
+    page_size = page_size or config['PAGE_SIZE']
+    base_url = base_url.rstrip('/') + '/'
+    context = {'request': BaseURLRequest(base_url)}
+    started = time.time()
+    paths = dict(Category.objects.values_list('id', 'path'))
+
+    # Render each product once; pages are joins of these
+    everything = []
+    by_category = {}
+    queryset = catalog_queryset()
+    for start in range(0, queryset.count() or 1, 1000):
+        products = list(queryset[start:start + 1000])
+        for product, data in zip(products, ProductSerializer(products, many=True, context=context).data):
+            item = dumps(data)
+            everything.append(item)
+            category_ids = path_ids(paths.get(product.category_id) or '') or [product.category_id]
+            for category_id in category_ids:
+                by_category.setdefault(category_id, []).append(item)
+
+    directory = settings.SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+    filename = f'{SNAPSHOT_NAME}-{uuid.uuid4().hex}.bin'
+    entries = {}
+    offset = 0
+    with open(os.path.join(directory, filename), 'wb') as f:
+        for category_id, items in [(None, everything), *by_category.items()]:
+            for page, body in render_bodies(items, page_size).items():
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                locations = {}
+                for encoding, data in encode(body, config).items():
+                    f.write(data)
+                    locations[encoding] = (offset, len(data))
+                    offset += len(data)
+                entries[category_id, page] = (etag, locations)
+
+    index = {
+        'file': filename, 'base_url': base_url, 'page_size': page_size, 'built_at': started, 'entries': entries,
+        'database': database_fingerprint(),
+    }
+    save_snapshot(SNAPSHOT_NAME, index, SNAPSHOT_VERSION)
+    remove_old_files(keep=filename)
+    return {'products': len(everything), 'pages': len(entries), 'bytes': offset, 'seconds': time.time() - started}
+
+def remove_old_files(keep):
+    """Delete superseded page files, keeping the newest previous one for workers still switching over"""
+    pattern = os.path.join(settings.SNAPSHOT_DIR, f'{SNAPSHOT_NAME}-*.bin')
+    old = sorted((path for path in glob.glob(pattern) if os.path.basename(path) != keep), key=os.path.getmtime)
+    for path in old[:-1]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+class CatalogSnapshot:
+    """A loaded snapshot: the page index plus a read-only mapping of the page file"""
+
+    def __init__(self, index, mapping, mtime):
+        self.base_url = index['base_url']
+        self.page_size = index['page_size']
+        self.built_at = index['built_at']
+        self.entries = index['entries']
+        self.mapping = mapping
+        self.mtime = mtime
+
+    @classmethod
+    def load(cls):
+        mtime = snapshot_mtime(SNAPSHOT_NAME)
+        loaded = load_snapshot(SNAPSHOT_NAME, SNAPSHOT_VERSION) if mtime else None
+        if loaded is None:
+            return None
+        index = loaded[0]
+        if index.get('database') != database_fingerprint():
+            return None
+        try:
+            with open(os.path.join(settings.SNAPSHOT_DIR, index['file']), 'rb') as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+        except (OSError, ValueError):
+            return None
+        return cls(index, mapping, mtime)
+
+    def body(self, key, encoding):
+        """(etag, encoding, bytes) for a page, plain if it wasn't built in `encoding`; None if there is no such page"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        etag, locations = entry
+        if encoding not in locations:
+            encoding = 'identity'
+        offset, length = locations[encoding]
+        return etag, encoding, self.mapping[offset:offset + length]
+
+_snapshot = None
+_stale_since = None      # time of the latest change not covered by a build, None if clean
+_building = False
+_last_build = 0
+_last_reload_check = 0
+_lock = threading.Lock()
+
+def mark_stale(**kwargs):
+    global _stale_since
+    # The latest change, so a build that started before it doesn't count as covering it
+    _stale_since = time.time()
+
+def reset_catalog():
+    """Forget the loaded snapshot and distrust any built before now"""
+    global _snapshot, _stale_since, _building, _last_build, _last_reload_check
+    with _lock:
+        _snapshot, _stale_since, _building, _last_build, _last_reload_check = None, time.time(), False, 0, 0
+
+def rebuild():
+    """Build the snapshot for BASE_URL and load it; returns the build stats, None if it failed"""
+    global _snapshot, _building, _last_reload_check
+    try:
+        stats = build_catalog(get_config()['BASE_URL'])
+        loaded = CatalogSnapshot.load()
+        with _lock:
+            _snapshot = loaded or _snapshot
+            _last_reload_check = time.time()
+        return stats
+    except Exception:
+        logger.exception('Catalog snapshot build failed')
+        return None
+    finally:
+        with _lock:
+            _building = False
+
+def rebuild_in_background():
+    try:
+        rebuild()
+    finally:
+        close_old_connections()
+
+def get_snapshot():
+    """
+    The current snapshot, or None while it is stale or missing; starts a
+    background rebuild (rate limited) when one is due
+    """
+    global _snapshot, _stale_since, _building, _last_build, _last_reload_check
+    config = get_config()
+    if not config['BASE_URL']:
+        return None
+
+    with _lock:
+        now = time.time()
+        reload = now - _last_reload_check >= config['RELOAD_CHECK_INTERVAL']
+        if reload:
+            _last_reload_check = now
+        current = _snapshot
+    # Loading reads the index from disk, so not under the lock
+    if reload and (current is None or snapshot_mtime(SNAPSHOT_NAME) != current.mtime):
+        loaded = CatalogSnapshot.load()
+        if loaded is not None:
+            with _lock:
+                _snapshot = loaded
+
+    with _lock:
+        current = _snapshot
+        # A snapshot built (by any process) after this process's last change covers it
+        if current is not None and _stale_since is not None and current.built_at > _stale_since:
+            _stale_since = None
+        fresh = current is not None and _stale_since is None
+        if fresh and now - current.built_at < config['MAX_AGE']:
+            return current
+        if _building or now - _last_build < config['MIN_REBUILD_INTERVAL'] or in_transaction():
+            return current if fresh else None
+        # Still stale until a snapshot built after the change is swapped in
+        _building, _last_build = True, now
+
+    threading.Thread(target=rebuild_in_background, name='catalog-rebuild', daemon=True).start()
+    # Past MAX_AGE but without local changes, the old pages serve until the new ones load
+    return current if fresh else None
+
+def serve(request, category, page):
+    """An HttpResponse for the page from the snapshot, or None to fall back to the database"""
+    snapshot = get_snapshot()
+    # The Host header only picks snapshot or database; the snapshot's URLs come from BASE_URL
+    if snapshot is None or request.build_absolute_uri('/') != snapshot.base_url:
+        return None
+    encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', '')) or 'identity'
+    found = snapshot.body((category, page), encoding)
+    if found is None:
+        if category is None or (page or 1) > 1:
+            return HttpResponse(b'{"error":"Page not found"}', status=404, content_type='application/json')
+        # A category with no products (or no such category): an empty list or first page
+        data = [] if page is None else {**page_envelope(0, 1, snapshot.page_size), 'results': []}
+        return HttpResponse(dumps(data), content_type='application/json')
+
+    etag, encoding, body = found
+    if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,127 @@
+"""
+Category tree maintenance.
+
+Categories form a tree through `parent`; each one also stores a
+materialized `path` of zero-padded ids from the root, so a subtree is a
+single `path__startswith` query and the ancestors can be read off the
+path without walking the tree.
+
+`product_count` (active, approved products in the category) and
+`subtree_product_count` (the same including descendants) are cached on
+the rows. Product signals keep them current with F() increments. Bulk
+paths that skip signals (queryset.update, bulk_create/bulk_update) call
+recount_categories() for the categories they touched.
+"""
+from django.db import transaction
+from django.db.models import F
+from .models import Category, Product
+
+PATH_ID_WIDTH = 8
+
+def path_ids(path):
+    return [int(part) for part in path.split('/') if part]
+
+def build_path(category):
+    prefix = category.parent.path if category.parent_id else ''
+    return f'{prefix}{category.pk:0{PATH_ID_WIDTH}d}/'
+
+def is_counted(is_active, is_approved):
+    return bool(is_active and is_approved)
+
+def adjust_product_count(category_id, delta):
+    """Add delta to a category's product count and to the subtree count of it and its ancestors"""
+    if not category_id or not delta:
+        return
+    path = Category.objects.filter(pk=category_id).values_list('path', flat=True).first()
+    if path is None:
+        return
+    with transaction.atomic():
+        Category.objects.filter(pk=category_id).update(product_count=F('product_count') + delta)
+        Category.objects.filter(pk__in=path_ids(path) or [category_id]).update(
+            subtree_product_count=F('subtree_product_count') + delta
+        )
+
+def move_category(category, old_path, new_path):
+    """Store a category's new path, rewrite its descendants' paths and move its subtree count"""
+    depth = new_path.count('/') - 1
+    with transaction.atomic():
+        Category.objects.filter(pk=category.pk).update(path=new_path, depth=depth)
+        category.path, category.depth = new_path, depth
+        if not old_path:
+            return
+
+        descendants = list(Category.objects.filter(path__startswith=old_path).exclude(pk=category.pk))
+        for descendant in descendants:
+            descendant.path = new_path + descendant.path[len(old_path):]
+            descendant.depth = descendant.path.count('/') - 1
+        Category.objects.bulk_update(descendants, ['path', 'depth'], batch_size=500)
+
+        subtree_count = Category.objects.filter(pk=category.pk).values_list(
+            'subtree_product_count', flat=True
+        ).first() or 0
+        if subtree_count:
+            Category.objects.filter(pk__in=path_ids(old_path)[:-1]).update(
+                subtree_product_count=F('subtree_product_count') - subtree_count
+            )
+            Category.objects.filter(pk__in=path_ids(new_path)[:-1]).update(
+                subtree_product_count=F('subtree_product_count') + subtree_count
+            )
+
+def recount_categories(category_ids=None):
+    """
+    Recount product_count (for the given categories, or all of them) and
+    recompute every subtree_product_count from the product counts.
+    """
+    products = Product.objects.filter(is_active=True, is_approved=True)
+    if category_ids is not None:
+        category_ids = [pk for pk in set(category_ids) if pk]
+        if not category_ids:
+            return 0
+        products = products.filter(category_id__in=category_ids)
+
+    counts = {}
+    for category_id in products.values_list('category_id', flat=True).iterator():
+        counts[category_id] = counts.get(category_id, 0) + 1
+
+    categories = list(Category.objects.only('id', 'path', 'product_count', 'subtree_product_count'))
+    recount = set(category_ids) if category_ids is not None else {c.pk for c in categories}
+    changed = set()
+    for category in categories:
+        if category.pk in recount and category.product_count != counts.get(category.pk, 0):
+            category.product_count = counts.get(category.pk, 0)
+            changed.add(category.pk)
+
+    by_id = {category.pk: category for category in categories}
+    subtree = dict.fromkeys(by_id, 0)
+    for category in categories:
+        for ancestor_id in path_ids(category.path) or [category.pk]:
+            if ancestor_id in subtree:
+                subtree[ancestor_id] += category.product_count
+    for pk, total in subtree.items():
+        if by_id[pk].subtree_product_count != total:
+            by_id[pk].subtree_product_count = total
+            changed.add(pk)
+
+    Category.objects.bulk_update(
+        [by_id[pk] for pk in changed], ['product_count', 'subtree_product_count'], batch_size=500
+    )
+    return len(changed)
+
+def rebuild_category_tree():
+    """Recompute every path and depth from the parent pointers, then all counts"""
+    categories = list(Category.objects.all())
+    by_id = {category.pk: category for category in categories}
+
+    def resolve(category, seen=()):
+        if category.pk in seen:
+            raise ValueError(f'Category {category.pk} is part of a parent cycle')
+        parent = by_id.get(category.parent_id)
+        prefix = resolve(parent, seen + (category.pk,)) if parent else ''
+        return f'{prefix}{category.pk:0{PATH_ID_WIDTH}d}/'
+
+    for category in categories:
+        category.path = resolve(category)
+        category.depth = category.path.count('/') - 1
+    Category.objects.bulk_update(categories, ['path', 'depth'], batch_size=500)
+    recount_categories()
+    return len(categories)
@@ -0,0 +1,167 @@
+"""
+Change feed of product mutations, so consumers sync incrementally.
+
+The search cluster, cache warmers and the React client used to poll the
+full product list to find out what changed. ProductChange is an
+append-only log instead: creating a product, changing its price or stock,
+approving or rejecting it, (de)activating it and deleting it each append
+an entry, and the auto id is the sequence number. Every entry carries the
+product's tracked values (price, stock, is_active, is_approved) after the
+change, so a consumer never needs to look at older entries of the same
+product. A consumer keeps the last sequence it applied and asks for
+?since=<seq>; entries come back in sequence order, a batch at a time,
+with the cursor for the next batch.
+
+Ids are taken when a row is inserted but become visible when its
+transaction commits, so a higher id can be visible before a lower one.
+Only entries older than SETTLE_SECONDS are returned, which gives the
+writing transaction (a checkout, a bulk update) time to commit before a
+cursor moves past its entries.
+
+Product signals record single saves and deletes. The bulk paths (stock
+updates, imports, admin approval, reconciliation) write with update() or
+bulk_update(), which send no signals, so they call record_products()
+with the ids they touched.
+
+compact() deletes entries older than RETENTION_DAYS that a later entry of
+the same product supersedes; replaying the compacted log still ends in
+the same state. The last entry of a deleted product goes too once it is
+old, and the highest such sequence is recorded as the compaction point.
+A consumer whose cursor is below it may have missed a delete and gets
+410 Gone, meaning resync from the full list. since=0 replays the whole
+compacted log, which is how a new consumer starts; a consumer that has
+just read the full list instead starts from current_sequence().
+
+Once the writes commit, entries are also pushed as 'product' events to
+live event streams watching those products (retailhive.events).
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from retailhive import events
+from .models import Product, ProductChange, ProductChangeCompaction
+from .serializers import ProductChangeSerializer
+
+CHANGE_BATCH_SIZE = 500
+
+# Product field -> change name
+TRACKED_FIELDS = {
+    'price': 'price',
+    'stock_quantity': 'stock',
+    'is_approved': 'approval',
+    'is_active': 'active',
+}
+
+def get_config():
+    config = {
+        'BATCH_SIZE': 500,
+        'MAX_BATCH_SIZE': 5000,
+        'SETTLE_SECONDS': 2,
+        'RETENTION_DAYS': 7,
+    }
+    config.update(getattr(settings, 'CHANGE_FEED', {}))
+    return config
+
+def changed_fields(previous, product):
+    """Change names for the tracked fields that differ between a {field: value} dict and a product"""
+    return [
+        name for field, name in TRACKED_FIELDS.items()
+        if previous[field] != Product._meta.get_field(field).to_python(getattr(product, field))
+    ]
+
+def entry_for(product, changes):
+    return ProductChange(
+        product_id=product.pk,
+        changes=','.join(changes),
+        **{field: getattr(product, field) for field in TRACKED_FIELDS},
+    )
+
+def publish_entries(entries):
+    """Send entries to event streams watching their products once the transaction commits"""
+    def send():
+        broker = events.get_broker()
+        for entry in entries:
+            channel = f'product:{entry.product_id}'
+            if broker.has_subscribers(channel):
+                broker.publish(channel, ('product', ProductChangeSerializer(entry).data))
+    transaction.on_commit(send)
+
+def record_product(product, changes):
+    """Append one entry for a saved product"""
+    if changes:
+        entry = entry_for(product, changes)
+        entry.save()
+        publish_entries([entry])
+
+def record_deleted(product_id):
+    publish_entries([ProductChange.objects.create(product_id=product_id, changes='deleted')])
+
+def record_products(product_ids, changes, batch_size=CHANGE_BATCH_SIZE):
+    """Append an entry with the current values for each product written by a bulk path"""
+    product_ids = list(product_ids)
+    if not product_ids or not changes:
+        return
+    for start in range(0, len(product_ids), batch_size):
+        products = Product.objects.filter(pk__in=product_ids[start:start + batch_size]).only('pk', *TRACKED_FIELDS)
+        entries = [entry_for(product, changes) for product in products]
+        ProductChange.objects.bulk_create(entries, batch_size=batch_size)
+        publish_entries(entries)
+
+def compaction_point():
+    return ProductChangeCompaction.objects.aggregate(point=Max('through'))['point'] or 0
+
+def settled_before():
+    return timezone.now() - timedelta(seconds=get_config()['SETTLE_SECONDS'])
+
+def current_sequence():
+    """The cursor to follow the feed from after reading the current product list"""
+    return ProductChange.objects.filter(created_at__lte=settled_before()).aggregate(seq=Max('id'))['seq'] or 0
+
+def changes_since(since, limit=None):
+    """
+    (entries, next cursor, more) for up to `limit` settled entries after
+    sequence `since`; ValueError when the cursor is below the compaction point
+    """
+    config = get_config()
+    if 0 < since < compaction_point():
+        raise ValueError('since is older than the compacted change log; resync from the product list')
+    limit = min(limit or config['BATCH_SIZE'], config['MAX_BATCH_SIZE'])
+    entries = list(ProductChange.objects.filter(id__gt=since, created_at__lte=settled_before()).order_by('id')[:limit + 1])
+    more = len(entries) > limit
+    entries = entries[:limit]
+    return entries, entries[-1].id if entries else since, more
+
+def compact(retention_days=None, batch_size=CHANGE_BATCH_SIZE):
+    """Delete superseded entries and old deletes older than the retention; returns (removed, compaction point)"""
+    retention_days = get_config()['RETENTION_DAYS'] if retention_days is None else retention_days
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    # Walking old entries newest first, the first one seen for a product is
+    # its last entry unless the product also has a newer one past the cutoff
+    seen = set(ProductChange.objects.filter(created_at__gte=cutoff).values_list('product_id', flat=True).iterator())
+    doomed = []
+    through = 0
+    old = ProductChange.objects.filter(created_at__lt=cutoff).order_by('-id')
+    for pk, product_id, changes in old.values_list('id', 'product_id', 'changes').iterator():
+        if product_id in seen:
+            doomed.append(pk)
+            continue
+        seen.add(product_id)
+        if changes == 'deleted':
+            doomed.append(pk)
+            through = max(through, pk)
+
+    for start in range(0, len(doomed), batch_size):
+        ProductChange.objects.filter(pk__in=doomed[start:start + batch_size]).delete()
+    if doomed:
+        ProductChangeCompaction.objects.create(through=max(through, compaction_point()), removed=len(doomed))
+    return len(doomed), compaction_point()
+
+def record_baselines(batch_size=CHANGE_BATCH_SIZE):
+    """Give every product without an entry a 'baseline' one, so since=0 covers products older than the feed"""
+    logged = set(ProductChange.objects.values_list('product_id', flat=True).iterator())
+    missing = [pk for pk in Product.objects.values_list('id', flat=True).iterator() if pk not in logged]
+    record_products(missing, ['baseline'], batch_size)
+    return len(missing)
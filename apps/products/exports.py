@@ -0,0 +1,104 @@
+"""
+Streaming NDJSON/CSV exports of products, reviews and orders.
+
+Rows are read with server-side cursors (QuerySet.iterator) and encoded a
+batch at a time, so memory stays flat however large the dataset is.
+"""
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from django.http import StreamingHttpResponse
+from .models import Product, ProductReview
+
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+PRODUCT_FIELDS = [
+    'id', 'sku', 'name', 'description', 'price', 'category_id', 'stock_quantity',
+    'is_active', 'is_approved', 'retailer_id', 'image', 'created_at', 'updated_at',
+]
+REVIEW_FIELDS = ['id', 'product_id', 'user_id', 'rating', 'comment', 'created_at']
+ORDER_FIELDS = ['id', 'user_id', 'status', 'total_amount', 'shipping_address', 'created_at', 'updated_at']
+ORDER_ITEM_FIELDS = ['id', 'order_id', 'product_id', 'quantity', 'price']
+
+RETAILER_DATASETS = ['products', 'reviews', 'order_items']
+ADMIN_DATASETS = ['products', 'reviews', 'orders', 'order_items']
+
+class Echo:
+    """File-like object whose write() just returns the value (for csv.writer)"""
+
+    def write(self, value):
+        return value
+
+def get_export_queryset(dataset, retailer=None):
+    """Return (queryset, fields) for a dataset, limited to a retailer's products if given"""
+    from apps.orders.models import Order, OrderItem
+
+    products = Product.objects.all()
+    if retailer is not None:
+        products = products.filter(retailer=retailer)
+
+    if dataset == 'products':
+        return products, PRODUCT_FIELDS
+    if dataset == 'reviews':
+        reviews = ProductReview.objects.all()
+        if retailer is not None:
+            reviews = reviews.filter(product_id__in=products.values_list('id', flat=True))
+        return reviews, REVIEW_FIELDS
+    if dataset == 'orders' and retailer is None:
+        return Order.objects.all(), ORDER_FIELDS
+    if dataset == 'order_items':
+        items = OrderItem.objects.all()
+        if retailer is not None:
+            items = items.filter(product_id__in=products.values_list('id', flat=True))
+        return items, ORDER_ITEM_FIELDS
+    raise ValueError(f'Unknown dataset: {dataset}')
+
+def encode_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def iter_rows(queryset, fields, batch_size=EXPORT_BATCH_SIZE):
+    """Yield lists of at most batch_size value tuples, in primary key order"""
+    batch = []
+    for row in queryset.order_by('pk').values_list(*fields).iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def stream_export(queryset, fields, fmt, batch_size=EXPORT_BATCH_SIZE):
+    """Yield encoded chunks (one per batch) of an export"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown format: {fmt}')
+
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        for batch in iter_rows(queryset, fields, batch_size):
+            yield ''.join(writer.writerow([encode_value(v) for v in row]) for row in batch)
+    else:
+        for batch in iter_rows(queryset, fields, batch_size):
+            yield ''.join(
+                json.dumps(dict(zip(fields, row)), default=encode_value) + '\n'
+                for row in batch
+            )
+
+def export_response(dataset, fmt, retailer=None):
+    """Build a StreamingHttpResponse for an export, raising ValueError on bad input"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Unknown format: {fmt}')
+    queryset, fields = get_export_queryset(dataset, retailer=retailer)
+    response = StreamingHttpResponse(stream_export(queryset, fields, fmt), content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
@@ -0,0 +1,273 @@
+"""
+Faceted filtering for the product list.
+
+FacetIndex holds one bitset per facet value (category, price bucket,
+minimum rating, in stock) over the active products, with Python ints as
+the bitsets. Bit i stands for the i-th product, newest first. Filtering
+is then a handful of AND/OR operations on ints, and every facet count is
+a popcount, with no scan of the product table per request.
+
+Counts are disjunctive: each facet is counted with the other facets'
+filters applied but not its own, so the shopper sees how many products
+each alternative would give.
+
+The index is built from three small queries. It is marked stale by
+product, review-summary and category signals, and the next query starts
+a rebuild, at most once per FACET_INDEX['MIN_REBUILD_INTERVAL'] seconds.
+MAX_AGE bounds staleness in other worker processes, which don't see
+this process's signals.
+
+Rebuilds run on a background thread, and queries keep using the previous
+index until the new one is swapped in, so no request waits for a build.
+Only the very first query of a process builds inline, since there is
+nothing to serve yet. Inside a transaction the rebuild also runs inline:
+another connection could not see its uncommitted writes.
+"""
+import threading
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from retailhive.fanout import in_transaction
+from .models import Category, Product, ProductRatingSummary
+
+FACET_PAGE_SIZE = 24
+MAX_FACET_PAGE_SIZE = 100
+
+def get_config():
+    config = {
+        'PRICE_BUCKETS': [0, 25, 50, 100, 250, 500, 1000],
+        'MIN_REBUILD_INTERVAL': 5,
+        'MAX_AGE': 60,
+    }
+    config.update(getattr(settings, 'FACET_INDEX', {}))
+    return config
+
+def bit_count(bits):
+    # int.bit_count() is Python 3.10+
+    return bits.bit_count() if hasattr(bits, 'bit_count') else bin(bits).count('1')
+
+def iter_bits(bits):
+    """Yield the positions of the set bits, lowest first"""
+    digits = bin(bits)[:1:-1]
+    position = digits.find('1')
+    while position != -1:
+        yield position
+        position = digits.find('1', position + 1)
+
+class BitsetBuilder:
+    """Collects positions per key in bytearrays and turns them into ints at the end"""
+
+    def __init__(self, size):
+        self.size = size // 8 + 1
+        self.flags = {}
+
+    def add(self, key, position):
+        flags = self.flags.get(key)
+        if flags is None:
+            flags = self.flags[key] = bytearray(self.size)
+        flags[position >> 3] |= 1 << (position & 7)
+
+    def build(self):
+        return {key: int.from_bytes(flags, 'little') for key, flags in self.flags.items()}
+
+def price_buckets(edges):
+    """[(key, min, max)] with max None for the open top bucket"""
+    buckets = []
+    for i, low in enumerate(edges):
+        high = edges[i + 1] if i + 1 < len(edges) else None
+        buckets.append((f'{low}-{high}' if high is not None else f'{low}+', low, high))
+    return buckets
+
+class FacetIndex:
+    """Bitsets over the active products for each facet value"""
+
+    RATING_LEVELS = [4, 3, 2, 1]
+
+    def __init__(self, price_edges):
+        self.built_at = time.monotonic()
+        self.buckets = price_buckets(price_edges)
+        self.ids = []
+        self.positions = {}
+        self.categories = {}     # category id -> bits of products directly in it
+        self.subtrees = {}       # category id -> bits of products in it or below
+        self.category_names = {}
+        self.prices = {key: 0 for key, _, _ in self.buckets}
+        self.ratings = {level: 0 for level in self.RATING_LEVELS}
+        self.in_stock = 0
+        self.all = 0
+
+    @classmethod
+    def build(cls, price_edges):
+        index = cls(price_edges)
+        averages = {
+            summary.product_id: summary.average
+            for summary in ProductRatingSummary.objects.all()
+        }
+        rows = list(Product.objects.filter(is_active=True).order_by('-created_at', '-id').values_list(
+            'id', 'category_id', 'price', 'stock_quantity'
+        ))
+        bits = BitsetBuilder(len(rows))
+        for position, (pk, category_id, price, stock) in enumerate(rows):
+            index.ids.append(pk)
+            bits.add('all', position)
+            bits.add(('category', category_id), position)
+            bits.add(('price', index.price_key(price)), position)
+            average = averages.get(pk, 0)
+            for level in cls.RATING_LEVELS:
+                if average >= level:
+                    bits.add(('rating', level), position)
+            if stock > 0:
+                bits.add('in_stock', position)
+        index.positions = {pk: position for position, pk in enumerate(index.ids)}
+
+        bitsets = {'category': index.categories, 'price': index.prices, 'rating': index.ratings}
+        for key, value in bits.build().items():
+            if key == 'all':
+                index.all = value
+            elif key == 'in_stock':
+                index.in_stock = value
+            else:
+                bitsets[key[0]][key[1]] = value
+
+        for category_id, name, path in Category.objects.values_list('id', 'name', 'path'):
+            index.category_names[category_id] = name
+            category_bits = index.categories.get(category_id, 0)
+            for ancestor in [int(part) for part in path.split('/') if part] or [category_id]:
+                index.subtrees[ancestor] = index.subtrees.get(ancestor, 0) | category_bits
+        return index
+
+    def price_key(self, price):
+        price = Decimal(price)
+        for key, low, high in reversed(self.buckets):
+            if price >= low:
+                return key
+        return self.buckets[0][0]
+
+    def union(self, bitsets, keys):
+        bits = 0
+        for key in keys:
+            bits |= bitsets.get(key, 0)
+        return bits
+
+    def query(self, categories=(), prices=(), min_rating=None, in_stock=False, restrict=None,
+              offset=0, limit=FACET_PAGE_SIZE):
+        """Return (matching count, page of product ids, facet counts)"""
+        base = self.all if restrict is None else self.all & restrict
+        filters = {
+            'category': self.union(self.subtrees, categories) if categories else None,
+            'price': self.union(self.prices, prices) if prices else None,
+            'rating': self.ratings.get(min_rating, 0) if min_rating else None,
+            'in_stock': self.in_stock if in_stock else None,
+        }
+
+        def matching(excluding=None):
+            bits = base
+            for name, value in filters.items():
+                if name != excluding and value is not None:
+                    bits &= value
+            return bits
+
+        matches = matching()
+        # offset counts matching products, not bit positions
+        positions = []
+        for i, position in enumerate(iter_bits(matches)):
+            if i >= offset + limit:
+                break
+            if i >= offset:
+                positions.append(position)
+
+        without_category = matching('category')
+        without_price = matching('price')
+        without_rating = matching('rating')
+        facets = {
+            'category': [
+                {'id': pk, 'name': name, 'count': bit_count(without_category & self.subtrees.get(pk, 0))}
+                for pk, name in self.category_names.items()
+            ],
+            'price': [
+                {'key': key, 'min': low, 'max': high, 'count': bit_count(without_price & self.prices[key])}
+                for key, low, high in self.buckets
+            ],
+            'rating': [
+                {'min': level, 'count': bit_count(without_rating & self.ratings[level])}
+                for level in self.RATING_LEVELS
+            ],
+            'in_stock': bit_count(matching('in_stock') & self.in_stock),
+        }
+        return bit_count(matches), [self.ids[p] for p in positions], facets
+
+    def bits_for_ids(self, ids):
+        bits = BitsetBuilder(len(self.ids))
+        for pk in ids:
+            position = self.positions.get(pk)
+            if position is not None:
+                bits.add('ids', position)
+        return bits.build().get('ids', 0)
+
+_index = None
+_stale = True
+_building = False
+_lock = threading.Lock()
+# Held while the first index of the process is built, so it is built once
+_first_build_lock = threading.Lock()
+
+def mark_stale(**kwargs):
+    global _stale
+    _stale = True
+
+def rebuild():
+    """Build a new index and swap it in; queries use the previous one until then"""
+    global _index, _building
+    try:
+        index = FacetIndex.build(get_config()['PRICE_BUCKETS'])
+        with _lock:
+            _index = index
+    finally:
+        with _lock:
+            _building = False
+
+def rebuild_in_background():
+    try:
+        rebuild()
+    finally:
+        close_old_connections()
+
+def get_index():
+    """Return the current FacetIndex, starting a rebuild if it is stale (rate limited) or too old"""
+    global _stale, _building
+    config = get_config()
+    if _index is None:
+        with _first_build_lock:
+            if _index is None:
+                with _lock:
+                    _stale, _building = False, True
+                rebuild()
+        return _index
+
+    with _lock:
+        index = _index
+        age = time.monotonic() - index.built_at
+        due = age >= config['MAX_AGE'] or (_stale and age >= config['MIN_REBUILD_INTERVAL'])
+        if not due or _building:
+            return index
+        _stale, _building = False, True
+
+    if in_transaction():
+        rebuild()
+        return _index
+    threading.Thread(target=rebuild_in_background, name='facet-rebuild', daemon=True).start()
+    return index
+
+def reset_index():
+    global _index, _stale
+    with _lock:
+        _index, _stale = None, True
+
+def search_bits(index, query):
+    """Bits of the indexed products whose name or description contains query"""
+    ids = Product.objects.filter(is_active=True).filter(
+        Q(name__icontains=query) | Q(description__icontains=query)
+    ).values_list('id', flat=True)
+    return index.bits_for_ids(ids)
@@ -0,0 +1,251 @@
+"""
+Bulk product import for retailers.
+
+Rows are parsed and validated one at a time from a CSV or NDJSON stream and
+written in batches: one query to find the retailer's existing SKUs, one
+bulk_create for new products and one bulk_update for the rest. Imported
+products start unapproved; category counts are recounted at the end for
+listed products that changed category.
+
+A stream that can't be read on (bytes that aren't UTF-8, malformed CSV)
+stops the import at that line: the rows before it are still imported and
+the summary says where it stopped.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.utils import timezone
+from .models import Product, Category
+from .categories import recount_categories
+from .inventory import record_adjustments
+from . import catalog, changes, facets
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_FORMATS = ['csv', 'ndjson']
+
+# Per-row errors listed in the summary; the failed count is always exact
+MAX_REPORTED_ERRORS = 1000
+
+# bulk_update builds one CASE per field, which gets slow with very large batches
+UPDATE_BATCH_SIZE = 100
+
+url_validator = URLValidator()
+
+class ImportFormatError(ValueError):
+    """The stream can't be parsed past `line`"""
+
+    def __init__(self, line, message):
+        super().__init__(f'Line {line}: {message}')
+        self.line = line
+
+class CategoryResolver:
+    """Resolves category names (case-insensitive) or ids to category ids, loading categories once"""
+
+    def __init__(self):
+        self.by_name = {}
+        self.ids = set()
+        for category_id, name in Category.objects.values_list('id', 'name'):
+            self.by_name.setdefault(name.strip().lower(), category_id)
+            self.ids.add(category_id)
+
+    def resolve(self, value):
+        if value is None:
+            return None
+        if isinstance(value, int) or (isinstance(value, str) and value.strip().isdigit()):
+            category_id = int(value)
+            if category_id in self.ids:
+                return category_id
+        return self.by_name.get(str(value).strip().lower())
+
+def iter_lines(source):
+    """Decode an iterable of byte/str lines (uploaded file, request stream or text file)"""
+    for number, line in enumerate(source, start=1):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode('utf-8')
+            except UnicodeDecodeError:
+                raise ImportFormatError(number, 'Not valid UTF-8')
+        if number == 1:
+            line = line.lstrip('\ufeff')
+        yield line
+
+def parse_rows(source, fmt):
+    """Yield (row number, dict or None, error) for each record of the stream"""
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f'Unknown format: {fmt}')
+
+    lines = iter_lines(source)
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        try:
+            for row in reader:
+                yield reader.line_num, row, None
+        except csv.Error as e:
+            # DictReader.line_num only moves once a row parses; the csv reader's is at the bad line
+            raise ImportFormatError(reader.reader.line_num, f'Malformed CSV: {e}')
+        return
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield number, None, 'Each line must be a JSON object'
+            continue
+        yield number, row, None
+
+def validate_row(row, categories):
+    """Return (cleaned values, errors) for one import row"""
+    errors = {}
+    cleaned = {}
+
+    sku = str(row.get('sku') or '').strip()
+    if not sku:
+        errors['sku'] = 'This field is required.'
+    elif len(sku) > 64:
+        errors['sku'] = 'Ensure this field has no more than 64 characters.'
+    cleaned['sku'] = sku
+
+    name = str(row.get('name') or '').strip()
+    if not name:
+        errors['name'] = 'This field is required.'
+    elif len(name) > 200:
+        errors['name'] = 'Ensure this field has no more than 200 characters.'
+    cleaned['name'] = name
+
+    cleaned['description'] = str(row.get('description') or '')
+
+    try:
+        price = Decimal(str(row.get('price', '')).strip())
+        if not price.is_finite() or price < 0 or price >= Decimal('100000000'):
+            raise InvalidOperation
+        cleaned['price'] = price.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        errors['price'] = 'A valid price is required.'
+
+    category_id = categories.resolve(row.get('category') or row.get('category_id'))
+    if category_id is None:
+        errors['category'] = f'Unknown category "{row.get("category") or row.get("category_id") or ""}".'
+    cleaned['category_id'] = category_id
+
+    image = str(row.get('image') or '').strip()
+    if image:
+        try:
+            url_validator(image)
+        except ValidationError:
+            errors['image'] = 'Enter a valid URL.'
+    cleaned['image'] = image
+
+    stock = row.get('stock_quantity')
+    try:
+        stock = int(stock) if stock not in (None, '') else 0
+        if stock < 0:
+            raise ValueError
+        cleaned['stock_quantity'] = stock
+    except (TypeError, ValueError):
+        errors['stock_quantity'] = 'A non-negative integer is required.'
+
+    return cleaned, errors
+
+def write_batch(retailer, batch, moved_categories):
+    """Upsert a batch of {sku: cleaned row} keyed on the retailer's SKU"""
+    existing = {
+        product.sku: product
+        for product in Product.objects.filter(retailer=retailer, sku__in=list(batch))
+    }
+    now = timezone.now()
+    to_create = []
+    # Products grouped by the set of fields that actually changed, so each
+    # bulk_update only rewrites those columns
+    to_update = {}
+    unchanged = 0
+    for sku, values in batch.items():
+        product = existing.get(sku)
+        if product is None:
+            to_create.append(Product(retailer=retailer, is_approved=False, **values))
+            continue
+        changed = tuple(field for field, value in values.items() if getattr(product, field) != value)
+        if not changed:
+            unchanged += 1
+            continue
+        if 'category_id' in changed and product.is_active and product.is_approved:
+            moved_categories.update((product.category_id, values['category_id']))
+        for field in changed:
+            setattr(product, field, values[field])
+        product.updated_at = now
+        to_update.setdefault(changed, []).append(product)
+
+    stock_sets = {}
+    if to_create:
+        Product.objects.bulk_create(to_create, batch_size=IMPORT_BATCH_SIZE)
+        if any(product.pk is None for product in to_create):
+            # Backends that can't return ids from bulk inserts
+            created_ids = dict(Product.objects.filter(
+                retailer=retailer, sku__in=[product.sku for product in to_create]
+            ).values_list('sku', 'id'))
+            for product in to_create:
+                product.pk = created_ids.get(product.sku)
+        stock_sets.update((product.pk, product.stock_quantity) for product in to_create if product.pk)
+        changes.record_products([product.pk for product in to_create if product.pk], ['created'])
+    for changed, products in to_update.items():
+        fields = [field.replace('category_id', 'category') for field in changed] + ['updated_at']
+        Product.objects.bulk_update(products, fields, batch_size=UPDATE_BATCH_SIZE)
+        if 'stock_quantity' in changed:
+            stock_sets.update((product.pk, product.stock_quantity) for product in products)
+        changes.record_products(
+            [product.pk for product in products],
+            [name for field, name in changes.TRACKED_FIELDS.items() if field in changed],
+        )
+    record_adjustments(stock_sets, 'set', 'import')
+    return len(to_create), len(batch) - len(to_create) - unchanged, unchanged
+
+def import_products(source, fmt, retailer, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import products from a CSV/NDJSON line stream, returning a summary with
+    per-row errors, plus 'error' and 'line' when the stream was unreadable
+    """
+    categories = CategoryResolver()
+    summary = {'created': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'errors': []}
+    batch = {}
+    moved_categories = set()
+
+    def flush():
+        created, updated, unchanged = write_batch(retailer, batch, moved_categories)
+        summary['created'] += created
+        summary['updated'] += updated
+        summary['unchanged'] += unchanged
+        batch.clear()
+
+    try:
+        for number, row, error in parse_rows(source, fmt):
+            if error:
+                cleaned, errors = None, {'row': error}
+            else:
+                cleaned, errors = validate_row(row, categories)
+            if errors:
+                summary['failed'] += 1
+                if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                    summary['errors'].append({'row': number, 'errors': errors})
+                continue
+            # A SKU repeated within a batch keeps its last row
+            batch[cleaned['sku']] = cleaned
+            if len(batch) >= batch_size:
+                flush()
+    except ImportFormatError as e:
+        summary['error'] = str(e)
+        summary['line'] = e.line
+
+    if batch:
+        flush()
+    if moved_categories:
+        recount_categories(moved_categories)
+    if summary['created'] or summary['updated']:
+        facets.mark_stale()
+        catalog.mark_stale()
+    return summary
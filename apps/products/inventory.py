@@ -0,0 +1,193 @@
+"""
+Bulk stock updates for retailers.
+
+Items name a product by id or SKU and carry either an absolute quantity or
+a delta. Products are resolved with one query per batch, restricted to the
+caller's own products; absolute quantities are written with one
+bulk_update per batch and positive deltas as F() increments grouped by
+delta value, so each write is atomic in the database. A negative delta is
+one update per product guarded by stock_quantity >= -delta, and its row
+count says whether there was enough stock.
+
+A product may appear only once per request: the first item for it is
+applied and later ones are rejected as 'duplicate', so every result
+describes exactly one write.
+
+Orders reserve stock when they are placed (reserve_stock) and give it
+back when they are cancelled (restore_stock). Every change except the
+order reservations, which the order items already record, is also
+logged as a StockAdjustment for reconciliation, and every change is
+appended to the product change feed (changes.py).
+"""
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Product, StockAdjustment
+from . import catalog, changes, facets
+
+STOCK_BATCH_SIZE = 500
+MAX_STOCK_ITEMS = 10000
+
+def parse_int(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError
+    return int(value)
+
+def validate_item(item):
+    """Return (cleaned item, error message)"""
+    if not isinstance(item, dict):
+        return None, 'Each item must be an object'
+    if ('id' in item) == ('sku' in item):
+        return None, 'Give exactly one of id or sku'
+    if ('quantity' in item) == ('delta' in item):
+        return None, 'Give exactly one of quantity or delta'
+    try:
+        cleaned = {'id': parse_int(item['id'])} if 'id' in item else {'sku': str(item['sku']).strip()}
+        if 'quantity' in item:
+            cleaned['quantity'] = parse_int(item['quantity'])
+            if cleaned['quantity'] < 0:
+                return None, 'quantity must not be negative'
+        else:
+            cleaned['delta'] = parse_int(item['delta'])
+    except (TypeError, ValueError):
+        return None, 'id, quantity and delta must be integers'
+    return cleaned, None
+
+def apply_stock_updates(retailer, items, batch_size=STOCK_BATCH_SIZE):
+    """Apply stock changes to the retailer's products, returning one result per item"""
+    results = [None] * len(items)
+    seen = set()
+    valid = []
+    for index, item in enumerate(items):
+        cleaned, error = validate_item(item)
+        if error:
+            results[index] = {'index': index, 'status': 'invalid', 'error': error}
+        else:
+            valid.append((index, cleaned))
+
+    for start in range(0, len(valid), batch_size):
+        for index, result in apply_batch(retailer, valid[start:start + batch_size], seen):
+            results[index] = result
+    if valid:
+        facets.mark_stale()
+        catalog.mark_stale()
+    return results
+
+def apply_batch(retailer, batch, seen):
+    """Apply one batch of validated items; `seen` collects product ids across batches to reject duplicates"""
+    ids = {item['id'] for _, item in batch if 'id' in item}
+    skus = {item['sku'] for _, item in batch if 'sku' in item}
+    stock = {}
+    by_sku = {}
+    for pk, sku, quantity in Product.objects.filter(retailer=retailer).filter(
+        Q(pk__in=ids) | Q(sku__in=skus)
+    ).values_list('id', 'sku', 'stock_quantity'):
+        stock[pk] = quantity
+        if sku:
+            by_sku[sku] = pk
+
+    # One item per product, in request order
+    plans = {}
+    duplicates = set()
+    item_products = []
+    for index, item in batch:
+        pk = item['id'] if 'id' in item else by_sku.get(item['sku'])
+        if pk not in stock:
+            item_products.append((index, item, None))
+            continue
+        if pk in seen:
+            duplicates.add(index)
+        else:
+            seen.add(pk)
+            plans[pk] = item
+        item_products.append((index, item, pk))
+
+    now = timezone.now()
+    rejected = set()
+    with transaction.atomic():
+        to_set = []
+        deltas = {}
+        for pk, item in plans.items():
+            if 'quantity' in item:
+                to_set.append(Product(pk=pk, stock_quantity=item['quantity'], updated_at=now))
+            elif item['delta'] > 0:
+                deltas.setdefault(item['delta'], []).append(pk)
+            elif item['delta'] < 0:
+                # Only decrement a row that still has enough stock
+                taken = Product.objects.filter(pk=pk, stock_quantity__gte=-item['delta']).update(
+                    stock_quantity=F('stock_quantity') + item['delta'], updated_at=now
+                )
+                if not taken:
+                    rejected.add(pk)
+
+        taken = {pk: item['delta'] for pk, item in plans.items() if item.get('delta', 0) < 0 and pk not in rejected}
+        record_adjustments(taken, 'delta', 'bulk_update')
+
+        if to_set:
+            Product.objects.bulk_update(to_set, ['stock_quantity', 'updated_at'])
+            record_adjustments({p.pk: p.stock_quantity for p in to_set}, 'set', 'bulk_update')
+
+        for delta, pks in deltas.items():
+            Product.objects.filter(pk__in=pks).update(stock_quantity=F('stock_quantity') + delta, updated_at=now)
+            record_adjustments({pk: delta for pk in pks}, 'delta', 'bulk_update')
+        changes.record_products(set(plans) - rejected, ['stock'])
+
+    final = dict(Product.objects.filter(pk__in=list(plans)).values_list('id', 'stock_quantity'))
+    for index, item, pk in item_products:
+        result = {'index': index, **{k: item[k] for k in ('id', 'sku') if k in item}}
+        if pk is None:
+            result.update(status='not_found', error='No such product among your products')
+        elif index in duplicates:
+            result.update(id=pk, status='duplicate', error='Product already updated by an earlier item in this request')
+        elif pk in rejected:
+            result.update(id=pk, status='insufficient_stock', stock_quantity=final.get(pk))
+        else:
+            result.update(id=pk, status='updated', stock_quantity=final.get(pk))
+        yield index, result
+
+def reserve_stock(quantities):
+    """
+    Take {product id: quantity} out of stock, each only if enough is left.
+    Returns the ids that were short; call inside a transaction and roll
+    back if any were
+    """
+    now = timezone.now()
+    short = []
+    for pk, quantity in quantities.items():
+        taken = Product.objects.filter(pk=pk, stock_quantity__gte=quantity).update(
+            stock_quantity=F('stock_quantity') - quantity, updated_at=now
+        )
+        if not taken:
+            short.append(pk)
+    changes.record_products(set(quantities) - set(short), ['stock'])
+    if quantities:
+        facets.mark_stale()
+        catalog.mark_stale()
+    return short
+
+def restore_stock(quantities, reason='restock', batch_size=STOCK_BATCH_SIZE):
+    """Put {product id: quantity} back in stock with one F() increment per quantity value and batch"""
+    by_quantity = {}
+    for pk, quantity in quantities.items():
+        if quantity > 0:
+            by_quantity.setdefault(quantity, []).append(pk)
+    now = timezone.now()
+    for quantity, pks in by_quantity.items():
+        for start in range(0, len(pks), batch_size):
+            Product.objects.filter(pk__in=pks[start:start + batch_size]).update(
+                stock_quantity=F('stock_quantity') + quantity, updated_at=now
+            )
+    record_adjustments({pk: q for pk, q in quantities.items() if q > 0}, 'delta', reason)
+    changes.record_products([pk for pk, q in quantities.items() if q > 0], ['stock'])
+    if by_quantity:
+        facets.mark_stale()
+        catalog.mark_stale()
+
+def record_adjustments(changes, kind, reason):
+    """Log {product id: quantity} as 'set' or 'delta' stock adjustments in one bulk insert"""
+    StockAdjustment.objects.bulk_create([
+        StockAdjustment(product_id=pk, kind=kind, quantity=quantity, reason=reason)
+        for pk, quantity in changes.items()
+    ], batch_size=STOCK_BATCH_SIZE)
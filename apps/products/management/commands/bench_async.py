@@ -0,0 +1,100 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.authtoken.models import Token
+from retailhive.async_db import MemoryStore, set_store
+from retailhive.authentication import token_cache
+from apps.products import async_views as product_views
+from apps.orders import async_views as order_views
+
+BENCH_TOKEN = 'bench-async-token'
+
+def seed_store(store, products=50):
+    """Fill a MemoryStore with a small synthetic catalog, cart and order history"""
+    now = datetime(2024, 1, 1)
+    store['auth_user'].docs = [{'id': 1, 'username': 'bench'}]
+    store['products_category'].docs = [{'id': i, 'name': f'Category {i}'} for i in range(1, 6)]
+    store['products_product'].docs = [
+        {
+            'id': i, 'name': f'Product {i}', 'sku': f'SKU-{i}', 'description': 'Benchmark product',
+            'price': Decimal('9.99'), 'category_id': i % 5 + 1, 'retailer_id': 1, 'image': '',
+            'stock_quantity': 100, 'is_active': True, 'is_approved': True,
+            'created_at': now + timedelta(minutes=i), 'updated_at': now,
+        }
+        for i in range(1, products + 1)
+    ]
+    store['products_productreview'].docs = [
+        {'id': i, 'product_id': i % products + 1, 'user_id': 1, 'rating': i % 5 + 1, 'comment': '', 'created_at': now}
+        for i in range(1, products * 2 + 1)
+    ]
+    store['orders_cart'].docs = [{'id': 1, 'user_id': 1, 'created_at': now}]
+    store['orders_cartitem'].docs = [{'id': i, 'cart_id': 1, 'product_id': i, 'quantity': 1} for i in range(1, 4)]
+    store['orders_order'].docs = [
+        {'id': i, 'user_id': 1, 'status': 'pending', 'total_amount': Decimal('19.98'),
+         'shipping_address': 'Bench St', 'created_at': now + timedelta(days=i)}
+        for i in range(1, 11)
+    ]
+    store['orders_orderitem'].docs = [
+        {'id': i, 'order_id': i % 10 + 1, 'product_id': i, 'quantity': 2, 'price': Decimal('9.99')}
+        for i in range(1, 21)
+    ]
+
+class Command(BaseCommand):
+    help = 'Compare sequential vs concurrent requests/sec of the async views under injected DB latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency-ms', type=float, default=20)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=50)
+
+    def handle(self, *args, **options):
+        store = MemoryStore(latency_ms=options['latency_ms'])
+        seed_store(store)
+        previous = set_store(store)
+
+        # Serve the benchmark token from the auth cache so no SQL/Mongo access is needed
+        user = User(pk=1, username='bench', is_active=True)
+        token_cache.set(BENCH_TOKEN, user, Token(key=BENCH_TOKEN, user=user), 'customer')
+
+        factory = RequestFactory()
+        auth = {'HTTP_AUTHORIZATION': f'Token {BENCH_TOKEN}'}
+        endpoints = [
+            ('catalog', product_views.product_list, factory.get('/api/products/async/products/')),
+            ('search', product_views.product_search, factory.get('/api/products/async/products/search/', {'q': 'product 1'})),
+            ('cart', order_views.cart, factory.get('/api/orders/async/cart/', **auth)),
+            ('orders', order_views.orders, factory.get('/api/orders/async/orders/', **auth)),
+        ]
+
+        self.stdout.write(
+            f'🚀 {options["requests"]} requests per endpoint, '
+            f'{options["latency_ms"]:g}ms per DB call, concurrency {options["concurrency"]}'
+        )
+        try:
+            for name, view, request in endpoints:
+                sequential = asyncio.run(self.run(view, request, options['requests'], 1))
+                concurrent = asyncio.run(self.run(view, request, options['requests'], options['concurrency']))
+                self.stdout.write(
+                    f'  {name:<8} sequential {sequential:8.1f} req/s   '
+                    f'concurrent {concurrent:8.1f} req/s   ({concurrent / sequential:.1f}x)'
+                )
+        finally:
+            token_cache.invalidate(BENCH_TOKEN)
+            set_store(previous)
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark complete'))
+
+    async def run(self, view, request, total, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                response = await view(request)
+                assert response.status_code == 200, response.content
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return total / (time.perf_counter() - started)
@@ -0,0 +1,96 @@
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from retailhive import renderers, middleware
+from retailhive.renderers import FastJSONRenderer
+
+def product_list_payload(products):
+    """Shaped like ProductSerializer(many=True).data: decimals and datetimes as strings, nested reviews"""
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            'id': i, 'category_name': f'Category {i % 12}', 'average_rating': 3.75,
+            'reviews': [
+                {'id': i * 10 + r, 'rating': r + 2, 'comment': 'Works as described, would buy again',
+                 'created_at': (now + timedelta(hours=r)).isoformat().replace('+00:00', 'Z'), 'user_name': f'user{r}'}
+                for r in range(3)
+            ],
+            'name': f'Product {i}', 'sku': f'SKU-{i:06d}', 'description': 'A sturdy everyday product ' * 4,
+            'price': f'{i % 500 + 0.99:.2f}', 'image': None, 'stock_quantity': i % 40,
+            'is_active': True, 'is_approved': True,
+            'created_at': (now + timedelta(minutes=i)).isoformat().replace('+00:00', 'Z'),
+            'updated_at': now.isoformat().replace('+00:00', 'Z'),
+            'category': i % 12 + 1, 'retailer': 1,
+        }
+        for i in range(1, products + 1)
+    ]
+
+def order_history_payload(orders):
+    """Shaped like OrderSerializer(many=True).data, where total_price is a raw Decimal"""
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            'id': i, 'user_name': 'bench', 'status': 'delivered', 'total_amount': '59.97',
+            'shipping_address': '1 Bench Street, Springfield',
+            'created_at': (now + timedelta(days=i)).isoformat().replace('+00:00', 'Z'),
+            'items': [
+                {'id': i * 10 + n, 'product': n + 1, 'product_name': f'Product {n + 1}',
+                 'quantity': 1, 'price': '19.99', 'total_price': Decimal('19.99')}
+                for n in range(3)
+            ],
+        }
+        for i in range(1, orders + 1)
+    ]
+
+class Command(BaseCommand):
+    help = 'Compare JSON renderers and response compression on product list and order history payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--orders', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            self.stdout.write(self.style.WARNING('⚠️  orjson is not installed, FastJSONRenderer falls back to JSONRenderer'))
+
+        payloads = [
+            ('product list', product_list_payload(options['products'])),
+            ('order history', order_history_payload(options['orders'])),
+        ]
+        repeat = options['repeat']
+        self.stdout.write(f'🚀 Best of {repeat} runs per renderer and encoding')
+
+        for name, data in payloads:
+            default_time, body = self.best_of(lambda: JSONRenderer().render(data), repeat)
+            fast_time, fast_body = self.best_of(lambda: FastJSONRenderer().render(data), repeat)
+            self.stdout.write(f'  {name}: {len(body) / 1024:.0f} KB')
+            self.stdout.write(
+                f'    render   JSONRenderer {default_time * 1000:7.2f} ms   '
+                f'FastJSONRenderer {fast_time * 1000:7.2f} ms   ({default_time / fast_time:.1f}x)'
+            )
+            if fast_body != body:
+                self.stdout.write(self.style.WARNING('    ⚠️  renderers produced different bytes'))
+
+            encodings = [('gzip', lambda: middleware.compress(body, 'gzip'))]
+            if middleware.brotli is not None:
+                encodings.append(('br', lambda: middleware.compress(body, 'br')))
+            for encoding, run in encodings:
+                seconds, compressed = self.best_of(run, repeat)
+                self.stdout.write(
+                    f'    {encoding:<8} {len(compressed) / 1024:7.1f} KB ({len(compressed) / len(body):.0%})   '
+                    f'{seconds * 1000:7.2f} ms'
+                )
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark complete'))
+
+    def best_of(self, run, repeat):
+        best, result = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = run()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
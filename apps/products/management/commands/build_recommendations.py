@@ -0,0 +1,37 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.products.recommendations import build_recommendations, save_recommendations, np
+
+class Command(BaseCommand):
+    help = 'Count products bought together in past orders and save the top neighbours of each product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, help='Neighbours kept per product')
+        parser.add_argument('--min-count', type=int, help='Orders two products must share to be neighbours')
+        parser.add_argument('--max-basket', type=int, help='Skip orders with more distinct products than this')
+        parser.add_argument('--chunk-size', type=int, help='Order items counted per chunk')
+        parser.add_argument('--shards', type=int, help='Passes over the order items; more passes use less memory')
+        parser.add_argument('--no-numpy', action='store_true', help='Use the pure Python counter')
+
+    def handle(self, *args, **options):
+        if np is None and not options['no_numpy']:
+            self.stdout.write(self.style.WARNING('⚠️  NumPy is not installed, using the pure Python counter'))
+
+        started = time.perf_counter()
+        neighbors, stats = build_recommendations(
+            top_n=options['top_n'],
+            min_count=options['min_count'],
+            max_basket=options['max_basket'],
+            chunk_size=options['chunk_size'],
+            shards=options['shards'],
+            use_numpy=False if options['no_numpy'] else None,
+        )
+        built = time.perf_counter() - started
+        path = save_recommendations(neighbors)
+
+        self.stdout.write(
+            f"📦 {stats['order_items']} order items, {stats['shards']} shard(s), "
+            f"{'NumPy' if stats['numpy'] else 'pure Python'} counter"
+        )
+        self.stdout.write(f"🔗 {stats['products']} products with neighbours, built in {built:.2f}s")
+        self.stdout.write(self.style.SUCCESS(f'✅ Snapshot saved to {path}'))
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.products.suggest import SuggestIndex, save_index_snapshot
+
+class Command(BaseCommand):
+    help = 'Build the search suggestion index from the database and save a snapshot for fast startup'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = SuggestIndex.build()
+        built = time.perf_counter() - started
+        path = save_index_snapshot(index)
+
+        # Time a few typical lookups
+        prefixes = ['a', 'ph', 'pho', 'lap', 'book', 'zz']
+        started = time.perf_counter()
+        for _ in range(1000):
+            for prefix in prefixes:
+                index.suggest(prefix)
+        per_lookup = (time.perf_counter() - started) / (1000 * len(prefixes)) * 1e6
+
+        self.stdout.write(f'📦 {len(index.items)} items, {len(index.keys)} keys, built in {built:.2f}s')
+        self.stdout.write(f'⚡ {per_lookup:.1f}µs per lookup')
+        self.stdout.write(self.style.SUCCESS(f'✅ Snapshot saved to {path}'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from apps.products.changes import compact, record_baselines, get_config
+
+class Command(BaseCommand):
+    help = 'Compact the product change feed, dropping superseded entries and old deletes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, help='Keep every entry younger than this (default CHANGE_FEED RETENTION_DAYS)')
+        parser.add_argument('--baseline', action='store_true', help='First give products that have no entry a baseline one')
+
+    def handle(self, *args, **options):
+        if options['baseline']:
+            self.stdout.write(f'📦 Recorded baselines for {record_baselines()} products')
+
+        retention_days = options['retention_days']
+        if retention_days is None:
+            retention_days = get_config()['RETENTION_DAYS']
+        removed, point = compact(retention_days)
+        self.stdout.write(f'🧹 Removed {removed} entries older than {retention_days} days')
+        self.stdout.write(self.style.SUCCESS(f'✅ Change feed compacted through #{point}'))
@@ -0,0 +1,124 @@
+from contextlib import contextmanager
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections
+
+# Copied by default; dependency order is worked out by sort_models()
+DEFAULT_APPS = ['auth.User', 'authtoken', 'users', 'products', 'orders']
+
+class Command(BaseCommand):
+    help = 'Copy users, products and orders between database backends in bulk batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default='default', help='Database alias to read from')
+        parser.add_argument('--target', default='mirror', help='Database alias to write to')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per read/write batch')
+        parser.add_argument('--flush', action='store_true', help='Delete existing rows in the target first')
+        parser.add_argument('labels', nargs='*', help='app labels or app.Model (default: all shop data)')
+
+    def handle(self, *args, **options):
+        source, target = options['source'], options['target']
+        for alias in (source, target):
+            if alias not in connections.databases:
+                raise CommandError(f'Unknown database alias "{alias}" (set DB_MIRROR to enable "mirror")')
+        if source == target:
+            raise CommandError('Source and target must be different databases')
+
+        models = sort_models(collect_models(options['labels'] or DEFAULT_APPS))
+
+        if options['flush']:
+            for model in reversed(models):
+                model._base_manager.using(target).all().delete()
+                self.stdout.write(f'🧹 Flushed {model._meta.label} on {target}')
+
+        for model in models:
+            copied = copy_model(model, source, target, options['batch_size'])
+            reset_sequence(model, target)
+            self.stdout.write(f'✅ {model._meta.label}: {copied} rows copied')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Copied {len(models)} models from {source} to {target}'))
+
+def collect_models(labels):
+    models = []
+    for label in labels:
+        if '.' in label:
+            try:
+                models.append(apps.get_model(label))
+            except (LookupError, ValueError):
+                raise CommandError(f'Unknown model "{label}"')
+            continue
+        try:
+            models.extend(apps.get_app_config(label).get_models())
+        except LookupError:
+            # Optional apps (e.g. users) may not be installed everywhere
+            continue
+    return [m for m in models if m._meta.managed and not m._meta.proxy]
+
+def sort_models(models):
+    """Order models so every foreign key target is copied before the model itself"""
+    remaining = list(dict.fromkeys(models))
+    ordered = []
+    while remaining:
+        for model in remaining:
+            deps = {
+                field.related_model for field in model._meta.concrete_fields
+                if field.is_relation and field.related_model is not model
+            }
+            if not deps.intersection(remaining):
+                ordered.append(model)
+                remaining.remove(model)
+                break
+        else:
+            raise CommandError('Circular foreign keys between: ' + ', '.join(m._meta.label for m in remaining))
+    return ordered
+
+@contextmanager
+def preserved_timestamps(model):
+    """Stop auto_now/auto_now_add from overwriting copied timestamps"""
+    fields = [f for f in model._meta.concrete_fields if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)]
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+def copy_model(model, source, target, batch_size):
+    """Stream rows in primary key order and bulk insert them batch by batch"""
+    queryset = model._base_manager.using(source).order_by('pk')
+    copied = 0
+    last_pk = None
+    with preserved_timestamps(model):
+        while True:
+            batch_qs = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            batch = list(batch_qs[:batch_size])
+            if not batch:
+                break
+            for obj in batch:
+                obj._state.db = target
+                obj._state.adding = True
+            model._base_manager.using(target).bulk_create(batch, batch_size=batch_size)
+            copied += len(batch)
+            last_pk = batch[-1].pk
+    return copied
+
+def reset_sequence(model, alias):
+    """Move the target's id counter past the copied primary keys"""
+    connection = connections[alias]
+    if connection.vendor == 'djongo':
+        max_pk = model._base_manager.using(alias).order_by('-pk').values_list('pk', flat=True).first()
+        if max_pk is not None:
+            connection.ensure_connection()
+            connection.connection['__schema__'].update_one(
+                {'name': model._meta.db_table, 'auto': {'$exists': True}},
+                {'$max': {'auto.seq': max_pk}}
+            )
+        return
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
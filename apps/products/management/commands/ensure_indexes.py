@@ -0,0 +1,112 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+# Apps whose Meta.indexes are mirrored onto the Mongo collections
+INDEXED_APPS = ['products', 'orders']
+
+# Representative queries checked with --explain: (collection, filter, sort)
+EXPLAIN_QUERIES = [
+    ('products_product', {'category_id': 1, 'is_active': True, 'is_approved': True}, [('created_at', -1)]),
+    ('products_product', {'retailer_id': 1, 'is_approved': False}, None),
+    ('products_productreview', {'product_id': 1}, [('created_at', -1)]),
+    ('orders_order', {'user_id': 1}, [('created_at', -1)]),
+    ('orders_order', {'status': 'pending'}, [('created_at', 1)]),
+    ('orders_orderitem', {'order_id': 1}, None),
+    ('orders_cartitem', {'cart_id': 1}, None),
+]
+
+class Command(BaseCommand):
+    help = 'Create or verify the declared model indexes on the database collections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to work on')
+        parser.add_argument('--check', action='store_true', help='Only report missing indexes')
+        parser.add_argument('--explain', action='store_true', help='Print the query plan of the catalog and per-user lookups')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        specs = index_specs()
+        missing = 0
+
+        if connection.vendor == 'djongo':
+            connection.ensure_connection()
+            db = connection.connection
+            for table, name, keys, partial in specs:
+                existing = db[table].index_information()
+                if name in existing:
+                    self.stdout.write(f'✅ {table}.{name}')
+                elif options['check']:
+                    missing += 1
+                    self.stdout.write(self.style.WARNING(f'⚠️ Missing {table}.{name} {keys}'))
+                else:
+                    extra = {'partialFilterExpression': partial} if partial else {}
+                    db[table].create_index(keys, name=name, background=True, **extra)
+                    self.stdout.write(f'✅ Created {table}.{name} {keys}')
+            if options['explain']:
+                self.explain_mongo(db)
+        else:
+            # SQL backends create Meta.indexes with migrate; just verify them
+            with connection.cursor() as cursor:
+                for table, name, keys, partial in specs:
+                    constraints = connection.introspection.get_constraints(cursor, table)
+                    if name in constraints or any(c['index'] and c['columns'] == [k for k, _ in keys] for c in constraints.values()):
+                        self.stdout.write(f'✅ {table}.{name}')
+                    else:
+                        missing += 1
+                        self.stdout.write(self.style.WARNING(f'⚠️ Missing {table}.{name} (run migrate --run-syncdb)'))
+
+        if missing:
+            raise CommandError(f'{missing} indexes missing')
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(specs)} indexes in place'))
+
+    def explain_mongo(self, db):
+        for table, query, sort in EXPLAIN_QUERIES:
+            cursor = db[table].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            plan = cursor.explain()['queryPlanner']['winningPlan']
+            stages = plan_stages(plan)
+            label = 'COLLSCAN' if 'COLLSCAN' in stages else 'IXSCAN'
+            style = self.style.WARNING if label == 'COLLSCAN' else self.style.SUCCESS
+            self.stdout.write(style(f'{label} {table} {query} -> {" > ".join(stages)}'))
+
+def index_specs():
+    """Return (table, name, [(column, direction)], partial filter) for every declared index and foreign key"""
+    specs = []
+    for label in INDEXED_APPS:
+        for model in apps.get_app_config(label).get_models():
+            table = model._meta.db_table
+            for index in model._meta.indexes:
+                keys = []
+                for field_name in index.fields:
+                    direction = -1 if field_name.startswith('-') else 1
+                    column = model._meta.get_field(field_name.lstrip('-')).column
+                    keys.append((column, direction))
+                specs.append((table, index.name, keys, partial_filter(model, index.condition)))
+            covered = {keys[0][0] for spec_table, _, keys, partial in specs if spec_table == table and not partial}
+            for field in model._meta.concrete_fields:
+                if field.is_relation and field.column not in covered:
+                    specs.append((table, f'{table}_{field.column}_idx', [(field.column, 1)], None))
+    return specs
+
+def partial_filter(model, condition):
+    """Translate a simple Index.condition (AND of field=value) to a partialFilterExpression"""
+    if condition is None:
+        return None
+    if condition.connector != 'AND' or condition.negated:
+        raise CommandError(f'Unsupported index condition on {model._meta.label}: {condition}')
+    expression = {}
+    for child in condition.children:
+        if not isinstance(child, tuple) or '__' in child[0]:
+            raise CommandError(f'Unsupported index condition on {model._meta.label}: {condition}')
+        expression[model._meta.get_field(child[0]).column] = child[1]
+    return expression
+
+def plan_stages(plan):
+    stages = [plan.get('stage', '?')]
+    child = plan.get('inputStage')
+    while child:
+        stages.append(child.get('stage', '?'))
+        child = child.get('inputStage')
+    return stages
@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from apps.products.exports import get_export_queryset, stream_export, ADMIN_DATASETS, EXPORT_FORMATS, EXPORT_BATCH_SIZE
+
+class Command(BaseCommand):
+    help = 'Stream products, reviews, orders or order items to an NDJSON/CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=ADMIN_DATASETS)
+        parser.add_argument('--format', dest='fmt', choices=list(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--output', help='File to write (default: <dataset>.<format>)')
+        parser.add_argument('--retailer', help='Only export data for this retailer username')
+        parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        dataset, fmt = options['dataset'], options['fmt']
+        output = options['output'] or f'{dataset}.{fmt}'
+
+        retailer = None
+        if options['retailer']:
+            try:
+                retailer = User.objects.get(username=options['retailer'])
+            except User.DoesNotExist:
+                raise CommandError(f'Unknown retailer "{options["retailer"]}"')
+
+        try:
+            queryset, fields = get_export_queryset(dataset, retailer=retailer)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        chunks = 0
+        with open(output, 'w', newline='', encoding='utf-8') as f:
+            for chunk in stream_export(queryset, fields, fmt, options['batch_size']):
+                f.write(chunk)
+                chunks += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Exported {dataset} to {output} ({chunks} chunks)'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from retailhive.importtime import profile_startup, total_ms, by_package, deferred_imports, get_config
+
+class Command(BaseCommand):
+    help = 'Profile the imports of a cold worker start (python -X importtime) and check them against the budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Packages to list, slowest first')
+        parser.add_argument('--budget-ms', type=float, help='Fail when the imports take longer (default STARTUP IMPORT_BUDGET_MS)')
+        parser.add_argument('--check', action='store_true', help='Exit with an error when over budget or a deferred module was imported')
+
+    def handle(self, *args, **options):
+        budget = options['budget_ms'] or get_config()['IMPORT_BUDGET_MS']
+        try:
+            rows = profile_startup()
+        except RuntimeError as e:
+            raise CommandError(f'Startup failed: {e}')
+
+        total = total_ms(rows)
+        self.stdout.write(f'📦 {len(rows)} modules imported in {total:.1f} ms (budget {budget:.0f} ms)')
+        for package, own, count in by_package(rows)[:options['top']]:
+            self.stdout.write(f'  {own:8.1f} ms  {package} ({count} modules)')
+
+        problems = []
+        if total > budget:
+            problems.append(f'imports took {total:.1f} ms, over the {budget:.0f} ms budget')
+        deferred = deferred_imports(rows)
+        if deferred:
+            problems.append(f"deferred modules imported at startup: {', '.join(deferred)}")
+
+        for problem in problems:
+            self.stdout.write(self.style.WARNING(f'⚠️  {problem}'))
+        if problems and options['check']:
+            raise CommandError('; '.join(problems))
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('✅ Startup imports within budget'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.products.categories import rebuild_category_tree, recount_categories
+
+class Command(BaseCommand):
+    help = 'Rebuild category paths from the parent pointers and recount cached product counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counts-only', action='store_true', help='Only recount product counts')
+
+    def handle(self, *args, **options):
+        if options['counts_only']:
+            changed = recount_categories()
+            self.stdout.write(self.style.SUCCESS(f'✅ Recounted products, {changed} categories changed'))
+            return
+        try:
+            total = rebuild_category_tree()
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt paths and counts for {total} categories'))
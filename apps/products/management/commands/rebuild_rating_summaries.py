@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from apps.products.signals import rebuild_rating_summaries
+
+class Command(BaseCommand):
+    help = 'Recount product rating summaries from the reviews (backfill or repair)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', nargs='*', type=int, help='Only these products (default: all)')
+
+    def handle(self, *args, **options):
+        count = rebuild_rating_summaries(options['product_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt rating summaries for {count} products'))
@@ -0,0 +1,47 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.products.reconcile import reconcile, apply_corrections, record_baselines, np, RECONCILE_CHUNK_SIZE
+
+class Command(BaseCommand):
+    help = 'Compare product stock with the stock expected from adjustments and orders, optionally correcting it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apply', action='store_true', help='Write the expected stock to mismatched products')
+        parser.add_argument('--init', action='store_true', help='Record current stock as the baseline of products without one')
+        parser.add_argument('--chunk-size', type=int, default=RECONCILE_CHUNK_SIZE, help='Rows aggregated per chunk')
+        parser.add_argument('--show', type=int, default=20, help='Mismatches to list')
+        parser.add_argument('--no-numpy', action='store_true', help='Use the pure Python aggregation')
+
+    def handle(self, *args, **options):
+        if options['init']:
+            count = record_baselines()
+            self.stdout.write(self.style.SUCCESS(f'✅ Recorded baselines for {count} products'))
+
+        if np is None and not options['no_numpy']:
+            self.stdout.write(self.style.WARNING('⚠️  NumPy is not installed, using the pure Python aggregation'))
+        started = time.perf_counter()
+        mismatches, stats = reconcile(
+            chunk_size=options['chunk_size'],
+            use_numpy=False if options['no_numpy'] else None,
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"📦 {stats['order_items']} order items and {stats['adjustments']} adjustments in {elapsed:.2f}s"
+        )
+        self.stdout.write(f"🔍 {stats['checked']} of {stats['products']} products have a baseline")
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('✅ Stock matches for every product with a baseline'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'⚠️  {len(mismatches)} products differ'))
+        worst = sorted(mismatches.items(), key=lambda item: -abs(item[1][1] - item[1][0]))
+        for pk, (current, expected) in worst[:options['show']]:
+            self.stdout.write(f'   #{pk}: stock {current}, expected {expected} ({expected - current:+d})')
+
+        if options['apply']:
+            corrected = apply_corrections(mismatches)
+            skipped = len(mismatches) - len(corrected)
+            self.stdout.write(self.style.SUCCESS(f'✅ Corrected {len(corrected)} products'))
+            if skipped:
+                self.stdout.write(self.style.WARNING(f'⚠️  {skipped} changed during the run and were left alone'))
@@ -1,20 +1,52 @@
-from djongo import models
+from django.db import models
 from django.contrib.auth.models import User
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
+    parent = models.ForeignKey('self', on_delete=models.PROTECT, related_name='children', null=True, blank=True)
+    path = models.CharField(max_length=255, blank=True, default='', editable=False)  # Zero-padded ids from the root, e.g. "00000001/00000004/"
+    depth = models.PositiveIntegerField(default=0, editable=False)
+    product_count = models.PositiveIntegerField(default=0, editable=False)  # Active, approved products in this category
+    subtree_product_count = models.PositiveIntegerField(default=0, editable=False)  # ... in this category and its descendants
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         verbose_name_plural = "Categories"
         db_table = "products_category"
+        indexes = [
+            models.Index(fields=['path'], name='category_path_idx'),
+        ]
     
     def __str__(self):
         return self.name
+    
+    MAINTAINED_FIELDS = ('path', 'depth', 'product_count', 'subtree_product_count')
+    
+    def save(self, *args, **kwargs):
+        from .categories import build_path, move_category
+        
+        old_path = ''
+        if self.pk and not self._state.adding:
+            old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first() or ''
+            if self.parent_id and old_path and self.parent.path.startswith(old_path):
+                raise ValueError('A category cannot be moved under itself or its descendants')
+            # The tree fields and counts are maintained with targeted updates; never
+            # overwrite them with possibly stale values from this instance
+            if kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in self.MAINTAINED_FIELDS
+                ]
+        super().save(*args, **kwargs)
+        
+        path = build_path(self)
+        if path != old_path:
+            move_category(self, old_path, path)
 
 class Product(models.Model):
     name = models.CharField(max_length=200)
+    sku = models.CharField(max_length=64, blank=True, default='')  # Retailer's own stock keeping unit
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
@@ -28,6 +60,17 @@ class Product(models.Model):
     
     class Meta:
         db_table = "products_product"
+        indexes = [
+            # Storefront listing: active, approved products per category, newest first
+            models.Index(
+                fields=['category', '-created_at'],
+                name='product_catalog_idx',
+                condition=models.Q(is_active=True, is_approved=True),
+            ),
+            models.Index(fields=['retailer', 'is_approved'], name='product_retailer_idx'),
+            models.Index(fields=['retailer', 'sku'], name='product_sku_idx'),
+            models.Index(fields=['is_approved', '-created_at'], name='product_approval_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -52,6 +95,107 @@ class ProductReview(models.Model):
     
     class Meta:
         db_table = "products_productreview"
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_idx'),
+            models.Index(fields=['user', 'product'], name='review_user_idx'),
+            models.Index(fields=['product', '-rating', '-id'], name='review_rating_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.product.name} - {self.rating} stars'
+
+class ProductRatingSummary(models.Model):
+    """Per-product review counts by star rating, maintained by review signals"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    count_1 = models.PositiveIntegerField(default=0)
+    count_2 = models.PositiveIntegerField(default=0)
+    count_3 = models.PositiveIntegerField(default=0)
+    count_4 = models.PositiveIntegerField(default=0)
+    count_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = "products_productratingsummary"
+    
+    def __str__(self):
+        return f'{self.product_id} - {self.count} reviews'
+    
+    @property
+    def histogram(self):
+        return {str(i): getattr(self, f'count_{i}') for i in range(1, 6)}
+    
+    @property
+    def count(self):
+        return sum(self.histogram.values())
+    
+    @property
+    def average(self):
+        count = self.count
+        if count:
+            return sum(int(rating) * n for rating, n in self.histogram.items()) / count
+        return 0
+
+class StockAdjustment(models.Model):
+    """
+    Append-only log of stock changes other than orders: 'set' records an
+    absolute quantity, 'delta' a signed change. Order items account for the
+    stock taken by checkout, so expected stock can be rebuilt from the last
+    'set' of each product (see reconcile.py)
+    """
+    KIND_CHOICES = [
+        ('set', 'Set'),
+        ('delta', 'Delta'),
+    ]
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_adjustments')
+    kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+    quantity = models.IntegerField()
+    reason = models.CharField(max_length=20, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = "products_stockadjustment"
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='stockadj_product_idx'),
+            models.Index(fields=['kind', 'created_at'], name='stockadj_kind_idx'),
+        ]
+    
+    def __str__(self):
+        sign = '=' if self.kind == 'set' else ('+' if self.quantity >= 0 else '')
+        return f'{self.product_id}: {sign}{self.quantity} ({self.reason})'
+
+class ProductChange(models.Model):
+    """
+    Append-only feed of product mutations for incremental sync. The id is
+    the sequence number consumers read from (see changes.py); each entry
+    carries the tracked values after the change, empty for a delete
+    """
+    product_id = models.BigIntegerField()  # Not a foreign key: entries outlive deleted products
+    changes = models.CharField(max_length=64)  # Comma separated, e.g. "price,stock"
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    stock_quantity = models.IntegerField(null=True)
+    is_active = models.BooleanField(null=True)
+    is_approved = models.BooleanField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = "products_productchange"
+        indexes = [
+            models.Index(fields=['created_at'], name='productchange_created_idx'),
+            models.Index(fields=['product_id', 'created_at'], name='productchange_product_idx'),
+        ]
+    
+    def __str__(self):
+        return f'#{self.id} {self.product_id}: {self.changes}'
+
+class ProductChangeCompaction(models.Model):
+    """A compaction run; consumers behind `through` may have missed a deleted product"""
+    through = models.BigIntegerField(default=0)
+    removed = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = "products_productchangecompaction"
     
     def __str__(self):
-        return f'{self.product.name} - {self.rating} stars'
\ No newline at end of file
+        return f'Compacted {self.removed} through #{self.through}'
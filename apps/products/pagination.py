@@ -0,0 +1,67 @@
+"""
+Keyset (cursor) pagination for product reviews.
+
+Each page is read with an index seek on (product, sort key, id) and a
+LIMIT, so fetching any page costs the same however many reviews the
+product has. The cursor is an opaque token holding the sort key and id
+of the last review on the previous page.
+"""
+import base64
+import json
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from .models import ProductReview
+
+REVIEW_PAGE_SIZE = 10
+MAX_REVIEW_PAGE_SIZE = 100
+
+# sort name -> (key field, descending)
+REVIEW_SORTS = {
+    'recent': ('created_at', True),
+    'highest': ('rating', True),
+    'lowest': ('rating', False),
+}
+
+def encode_cursor(key, pk):
+    raw = json.dumps([key.isoformat() if hasattr(key, 'isoformat') else key, pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, field):
+    """Return (key, id) from a cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        key, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+    if field == 'created_at':
+        key = parse_datetime(key) if isinstance(key, str) else None
+    if key is None or isinstance(key, bool) or not isinstance(pk, int):
+        raise ValueError('Invalid cursor')
+    return key, pk
+
+def parse_page_size(value, default=REVIEW_PAGE_SIZE):
+    try:
+        return max(1, min(int(value), MAX_REVIEW_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return default
+
+def review_page(product_id, sort='recent', cursor=None, page_size=REVIEW_PAGE_SIZE):
+    """Return (reviews, next_cursor) for one page of a product's reviews"""
+    if sort not in REVIEW_SORTS:
+        raise ValueError(f'sort must be one of {list(REVIEW_SORTS)}')
+    field, descending = REVIEW_SORTS[sort]
+    prefix = '-' if descending else ''
+
+    reviews = ProductReview.objects.filter(product_id=product_id).select_related('user')
+    if cursor:
+        key, pk = decode_cursor(cursor, field)
+        op = 'lt' if descending else 'gt'
+        reviews = reviews.filter(Q(**{f'{field}__{op}': key}) | Q(**{field: key, f'id__{op}': pk}))
+
+    page = list(reviews.order_by(prefix + field, prefix + 'id')[:page_size + 1])
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        last = page[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return page, next_cursor
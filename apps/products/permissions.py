@@ -1,5 +1,32 @@
+from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import permissions
 
+# Attribute used to memoise the role on the (per-request) user object
+ROLE_CACHE_ATTR = '_cached_role'
+_MISSING = object()
+
+def get_user_role(user):
+    """
+    Return the user's profile role, or None if they have no profile.
+    The profile is loaded at most once per user object, i.e. once per request.
+    """
+    if user is None or not user.is_authenticated:
+        return None
+    role = getattr(user, ROLE_CACHE_ATTR, _MISSING)
+    if role is _MISSING:
+        try:
+            role = user.userprofile.role
+        except (ObjectDoesNotExist, AttributeError):
+            role = None
+        setattr(user, ROLE_CACHE_ATTR, role)
+    return role
+
+def is_admin(user):
+    return bool(user and user.is_authenticated and (user.is_staff or get_user_role(user) == 'admin'))
+
+def is_retailer(user):
+    return get_user_role(user) == 'retailer'
+
 class IsRetailerOrReadOnly(permissions.BasePermission):
     """
     Custom permission to only allow retailers to edit their own products.
@@ -15,10 +42,7 @@ class IsRetailerOrReadOnly(permissions.BasePermission):
             return False
             
         # Check if user is retailer or admin
-        if hasattr(request.user, 'userprofile'):
-            return request.user.userprofile.role in ['retailer', 'admin']
-        
-        return False
+        return get_user_role(request.user) in ['retailer', 'admin']
     
     def has_object_permission(self, request, view, obj):
         # Read permissions for any request
@@ -26,11 +50,11 @@ class IsRetailerOrReadOnly(permissions.BasePermission):
             return True
         
         # Admin can edit any product
-        if request.user.is_staff or (hasattr(request.user, 'userprofile') and request.user.userprofile.role == 'admin'):
+        if is_admin(request.user):
             return True
         
         # Retailers can only edit their own products
-        return obj.retailer == request.user
+        return obj.retailer_id == request.user.id
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     """
@@ -43,7 +67,15 @@ class IsAdminOrReadOnly(permissions.BasePermission):
             return True
         
         # Write permissions only for admin users
-        return request.user.is_staff or (hasattr(request.user, 'userprofile') and request.user.userprofile.role == 'admin')
+        return is_admin(request.user)
+
+class IsAdmin(permissions.BasePermission):
+    """
+    Only admins, for reads as well as writes.
+    """
+    
+    def has_permission(self, request, view):
+        return is_admin(request.user)
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """
@@ -56,4 +88,4 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
             return True
         
         # Write permissions only to the owner of the object
-        return obj.user == request.user
\ No newline at end of file
+        return obj.user_id == request.user.id
\ No newline at end of file
@@ -0,0 +1,290 @@
+"""
+Time-decayed popularity rankings ("top sellers" and "trending").
+
+Each board keeps one score per product: a sum of event weights that
+decays exponentially with the board's half-life. A decayed sum would
+normally need every score rewritten as time passes. Instead each event
+adds w * exp(rate * (t - t0)) for a fixed origin t0. All scores scale by
+the same factor over time, so their order never changes and only the
+scores touched by an event are written. The origin is moved forward
+(rebase) before the exponent can overflow.
+
+Scores are kept in sorted lists of (-score, product id): one per
+category plus one overall. An event moves one entry with bisect, and a
+top-K read is a slice, or a heapq.merge over a category's subtree. Only
+listed products (active and approved) appear in the lists.
+
+Events come from signals (order items, cart adds, reviews) and from the
+bulk order path. Listings follow product signals, and the admin bulk
+approve/reject paths, which send none, call update_listings(); rebuild_rankings recomputes the boards from the
+database history and saves a snapshot. Each worker loads the newest
+snapshot when it starts and again after the command rewrites it, then
+keeps applying its own events on top.
+"""
+import heapq
+import math
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from itertools import islice
+from django.conf import settings
+from retailhive.snapshots import load_snapshot, save_snapshot, snapshot_mtime
+from .models import Category, Product, ProductReview
+from .categories import is_counted
+
+SNAPSHOT_NAME = 'rankings'
+SNAPSHOT_VERSION = 1
+DEFAULT_TOP_K = 10
+MAX_TOP_K = 100
+
+# Rebase the origin once exp() of the offset exceeds e**50
+REBASE_EXPONENT = 50
+
+def get_config():
+    config = {
+        'BOARDS': {
+            'top_sellers': {'half_life_hours': 24 * 30, 'weights': {'order': 1.0}},
+            'trending': {'half_life_hours': 24, 'weights': {'order': 3.0, 'cart': 1.0, 'review': 2.0}},
+        },
+        'RELOAD_CHECK_INTERVAL': 30,
+    }
+    config.update(getattr(settings, 'RANKING', {}))
+    return config
+
+class RankingBoard:
+    def __init__(self, half_life_hours, weights, t0=None):
+        self.rate = math.log(2) / (half_life_hours * 3600)
+        self.weights = weights
+        self.t0 = time.time() if t0 is None else t0
+        self.raw = {}        # product id -> score relative to t0
+        self.lists = {}      # category id -> sorted [(-raw, product id)]
+        self.overall = []
+
+    def add(self, product_id, weight, at, listing):
+        """Add a weighted event at time `at` for a product listed in `listing` (category id or None)"""
+        exponent = self.rate * (at - self.t0)
+        if exponent > REBASE_EXPONENT:
+            self.rebase(at)
+            exponent = 0
+        old = self.raw.get(product_id)
+        new = (old or 0) + weight * math.exp(exponent)
+        self.raw[product_id] = new
+        if listing is not None:
+            if old is not None:
+                self.unlist(product_id, listing, old)
+            self.list(product_id, listing, new)
+
+    def list(self, product_id, category_id, raw):
+        insort(self.overall, (-raw, product_id))
+        insort(self.lists.setdefault(category_id, []), (-raw, product_id))
+
+    def unlist(self, product_id, category_id, raw):
+        for entries in (self.overall, self.lists.get(category_id, [])):
+            position = bisect_left(entries, (-raw, product_id))
+            if position < len(entries) and entries[position] == (-raw, product_id):
+                del entries[position]
+
+    def relist(self, product_id, old_listing, new_listing):
+        raw = self.raw.get(product_id)
+        if raw is None or old_listing == new_listing:
+            return
+        if old_listing is not None:
+            self.unlist(product_id, old_listing, raw)
+        if new_listing is not None:
+            self.list(product_id, new_listing, raw)
+
+    def rebase(self, at):
+        factor = math.exp(-self.rate * (at - self.t0))
+        self.t0 = at
+        self.raw = {pk: raw * factor for pk, raw in self.raw.items()}
+        self.overall = [(score * factor, pk) for score, pk in self.overall]
+        self.lists = {
+            category_id: [(score * factor, pk) for score, pk in entries]
+            for category_id, entries in self.lists.items()
+        }
+
+    def top(self, k, category_ids=None, now=None):
+        """Top k (product id, current score) overall or within the given categories"""
+        if category_ids is None:
+            entries = self.overall[:k]
+        else:
+            lists = [self.lists[c] for c in category_ids if self.lists.get(c)]
+            entries = list(islice(heapq.merge(*lists), k))
+        now = time.time() if now is None else now
+        decay = math.exp(-self.rate * (now - self.t0))
+        return [(pk, -score * decay) for score, pk in entries]
+
+class RankingService:
+    def __init__(self, boards=None, t0=None):
+        config = boards or get_config()['BOARDS']
+        self.boards = {
+            name: RankingBoard(board['half_life_hours'], board['weights'], t0)
+            for name, board in config.items()
+        }
+        self.listings = {}   # product id -> category id if listed, else None
+        self.loaded_at = time.time()
+        self.lock = threading.RLock()
+
+    def listing_for(self, product_id):
+        if product_id not in self.listings:
+            row = Product.objects.filter(pk=product_id).values_list(
+                'category_id', 'is_active', 'is_approved'
+            ).first()
+            self.listings[product_id] = row[0] if row and is_counted(*row[1:]) else None
+        return self.listings[product_id]
+
+    def record(self, event, product_id, quantity=1, at=None):
+        """Apply one event (order, cart or review) to every board that weights it"""
+        at = time.time() if at is None else at
+        with self.lock:
+            listing = self.listing_for(product_id)
+            for board in self.boards.values():
+                weight = board.weights.get(event)
+                if weight:
+                    board.add(product_id, weight * quantity, at, listing)
+
+    def update_listing(self, product_id, category_id, listed):
+        new_listing = category_id if listed else None
+        with self.lock:
+            old_listing = self.listings.get(product_id)
+            self.listings[product_id] = new_listing
+            for board in self.boards.values():
+                board.relist(product_id, old_listing, new_listing)
+
+    def remove_product(self, product_id):
+        with self.lock:
+            self.update_listing(product_id, None, False)
+            self.listings.pop(product_id, None)
+            for board in self.boards.values():
+                board.raw.pop(product_id, None)
+
+    def top(self, board, k=DEFAULT_TOP_K, category_ids=None):
+        with self.lock:
+            return self.boards[board].top(k, category_ids)
+
+    @classmethod
+    def build(cls, since_days=None):
+        """Recompute all boards from order, cart and review history"""
+        from apps.orders.models import Order, OrderItem, Cart, CartItem
+
+        service = cls()
+        # Events older than 20 half-lives of the slowest board weigh under a millionth
+        slowest = min(board.rate for board in service.boards.values())
+        window = since_days * 86400 if since_days else 20 * math.log(2) / slowest
+        since = datetime.fromtimestamp(time.time() - window, tz=timezone.utc)
+
+        for pk, category_id, is_active, is_approved in Product.objects.values_list(
+            'id', 'category_id', 'is_active', 'is_approved'
+        ).iterator():
+            service.listings[pk] = category_id if is_counted(is_active, is_approved) else None
+
+        def after(field):
+            return {f'{field}__gte': since}
+
+        orders = dict(Order.objects.filter(**after('created_at')).exclude(
+            status='cancelled'
+        ).values_list('id', 'created_at'))
+        for product_id, order_id, quantity in OrderItem.objects.filter(
+            order_id__in=list(orders)
+        ).values_list('product_id', 'order_id', 'quantity').iterator():
+            service.record('order', product_id, quantity, orders[order_id].timestamp())
+
+        carts = dict(Cart.objects.filter(**after('updated_at')).values_list('id', 'updated_at'))
+        for product_id, cart_id, quantity in CartItem.objects.filter(
+            cart_id__in=list(carts)
+        ).values_list('product_id', 'cart_id', 'quantity').iterator():
+            service.record('cart', product_id, quantity, carts[cart_id].timestamp())
+
+        for product_id, created_at in ProductReview.objects.filter(**after('created_at')).values_list(
+            'product_id', 'created_at'
+        ).iterator():
+            service.record('review', product_id, 1, created_at.timestamp())
+        return service
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'listings': dict(self.listings),
+                'boards': {name: (board.t0, dict(board.raw)) for name, board in self.boards.items()},
+            }
+
+    @classmethod
+    def from_snapshot(cls, data):
+        service = cls()
+        service.listings = data['listings']
+        for name, (t0, raw) in data['boards'].items():
+            board = service.boards.get(name)
+            if board is None:
+                continue
+            board.t0, board.raw = t0, raw
+            entries = sorted((-score, pk) for pk, score in raw.items() if service.listings.get(pk) is not None)
+            board.overall = entries
+            for score, pk in entries:
+                board.lists.setdefault(service.listings[pk], []).append((score, pk))
+        return service
+
+_service = None
+_service_lock = threading.Lock()
+_last_reload_check = 0
+
+def get_ranking_service():
+    """Return the process ranking service, loading a newer snapshot or building it if needed"""
+    global _service, _last_reload_check
+    with _service_lock:
+        now = time.time()
+        if _service is not None and now - _last_reload_check < get_config()['RELOAD_CHECK_INTERVAL']:
+            return _service
+        _last_reload_check = now
+        mtime = snapshot_mtime(SNAPSHOT_NAME)
+        if _service is not None and (mtime is None or mtime <= _service.loaded_at):
+            return _service
+        loaded = load_snapshot(SNAPSHOT_NAME, SNAPSHOT_VERSION) if mtime else None
+        if loaded is not None:
+            _service = RankingService.from_snapshot(loaded[0])
+        elif _service is None:
+            _service = RankingService.build()
+        return _service
+
+def save_rankings_snapshot(service):
+    return save_snapshot(SNAPSHOT_NAME, service.snapshot(), SNAPSHOT_VERSION)
+
+def reset_ranking_service(service=None):
+    global _service, _last_reload_check
+    with _service_lock:
+        _service, _last_reload_check = service, 0
+
+def record(event, product_id, quantity=1):
+    """Feed an event to the live service; a no-op until the service is first used"""
+    if _service is not None:
+        _service.record(event, product_id, quantity)
+
+def update_listing(product):
+    if _service is not None:
+        _service.update_listing(product.pk, product.category_id, is_counted(product.is_active, product.is_approved))
+
+def update_listings(product_ids):
+    """update_listing() for products written with update(), which sends no signals"""
+    product_ids = list(product_ids)
+    if _service is not None and product_ids:
+        for product in Product.objects.filter(pk__in=product_ids).only('id', 'category_id', 'is_active', 'is_approved'):
+            update_listing(product)
+
+def remove_product(product_id):
+    if _service is not None:
+        _service.remove_product(product_id)
+
+def subtree_ids(category_id):
+    path = Category.objects.filter(pk=category_id).values_list('path', flat=True).first()
+    if path is None:
+        return []
+    return list(Category.objects.filter(path__startswith=path).values_list('id', flat=True))
+
+def top_products(board, limit=DEFAULT_TOP_K, category_id=None, queryset=None):
+    """[(product, score)] for the top `limit` listed products, best first"""
+    category_ids = subtree_ids(category_id) if category_id is not None else None
+    ranked = get_ranking_service().top(board, limit, category_ids)
+    # The boards can lag behind a product being hidden; never show one that is
+    queryset = (queryset if queryset is not None else Product.objects.all()).filter(is_active=True, is_approved=True)
+    products = queryset.in_bulk([pk for pk, _ in ranked])
+    return [(products[pk], score) for pk, score in ranked if pk in products]
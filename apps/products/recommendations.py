@@ -0,0 +1,265 @@
+"""
+"Frequently bought together" recommendations.
+
+The offline build (manage.py build_recommendations) streams order items
+sorted by order, so each order's products form a basket. It counts how
+often each pair of products shares a basket. Each product keeps its TOP_N
+neighbours, scored by cosine similarity:
+count / sqrt(orders with A * orders with B). This stops best sellers
+from being everyone's neighbour. The result is saved as a snapshot of
+{product id: [(neighbour id, score)]}. Serving a product is then one
+dict lookup, and serving a cart merges one short list per cart item.
+
+Memory is bounded in two ways:
+  - Order items are read in chunks that never split an order.
+  - Pair counts are kept for one shard of products at a time
+    (product index % shards). Each shard is one more pass over the order
+    items, so memory is about (distinct pairs / shards) rather than all
+    pairs.
+
+Baskets larger than MAX_BASKET items are skipped, because they add
+size**2 pairs but say little about what goes together.
+
+NumPy is optional. With it, pairs are generated and counted per chunk as
+arrays (np.unique / np.bincount). Without it, a pure Python Counter is
+used, which gives the same result but is much slower on large histories.
+"""
+import heapq
+import math
+import threading
+import time
+from collections import Counter
+from itertools import combinations
+from django.conf import settings
+from retailhive.snapshots import load_snapshot, save_snapshot, snapshot_mtime
+from retailhive.lazy import optional_module
+from .models import Product
+
+# Imported on first use; only the offline build needs it
+np = optional_module('numpy')
+
+SNAPSHOT_NAME = 'recommendations'
+SNAPSHOT_VERSION = 1
+DEFAULT_RECOMMENDATIONS = 8
+MAX_RECOMMENDATIONS = 50
+
+# Merge the per-chunk pair counts once this many are pending
+MERGE_THRESHOLD = 5_000_000
+
+def get_config():
+    config = {
+        'TOP_N': 20,
+        'MIN_COUNT': 2,
+        'MAX_BASKET': 50,
+        'CHUNK_SIZE': 200_000,
+        'SHARDS': 1,
+        'RELOAD_CHECK_INTERVAL': 30,
+    }
+    config.update(getattr(settings, 'RECOMMENDATIONS', {}))
+    return config
+
+def iter_chunks(chunk_size):
+    """Yield (order ids, product ids) lists of about chunk_size items, sorted by order and never splitting one"""
+    from apps.orders.models import OrderItem
+
+    rows = OrderItem.objects.exclude(order__status='cancelled').order_by('order_id').values_list(
+        'order_id', 'product_id'
+    ).iterator(chunk_size=min(chunk_size, 10000))
+    orders, products = [], []
+    for order_id, product_id in rows:
+        if len(orders) >= chunk_size and order_id != orders[-1]:
+            yield orders, products
+            orders, products = [], []
+        orders.append(order_id)
+        products.append(product_id)
+    if orders:
+        yield orders, products
+
+class NumpyCounter:
+    """Pair counts for one shard as sorted unique int64 keys (a * size + b) and counts"""
+
+    def __init__(self, size, shard, shards, max_basket):
+        self.size, self.shard, self.shards, self.max_basket = size, shard, shards, max_basket
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.pending = []
+        self.pending_size = 0
+        self.degrees = np.zeros(size, dtype=np.int64)
+
+    def add_chunk(self, orders, products):
+        size = self.size
+        _, o = np.unique(np.asarray(orders, dtype=np.int64), return_inverse=True)
+        p = np.asarray(products, dtype=np.int64)
+        # One row per (order, product), still sorted by order
+        rows = np.unique(o.astype(np.int64) * size + p)
+        o, p = rows // size, rows % size
+        self.degrees += np.bincount(p, minlength=size)
+
+        starts = np.flatnonzero(np.r_[True, o[1:] != o[:-1]])
+        sizes = np.diff(np.r_[starts, len(o)])
+        keep = np.repeat((sizes > 1) & (sizes <= self.max_basket), sizes)
+        o, p = o[keep], p[keep]
+
+        # Products k rows apart in the same order form a pair; since rows are
+        # sorted by order, no pairs at distance k means none further apart
+        left, right = [], []
+        for k in range(1, self.max_basket):
+            same = o[:-k] == o[k:]
+            if not same.any():
+                break
+            a, b = p[:-k][same], p[k:][same]
+            left += [a, b]
+            right += [b, a]
+        if not left:
+            return
+        a, b = np.concatenate(left), np.concatenate(right)
+        mine = a % self.shards == self.shard
+        keys, counts = np.unique(a[mine] * size + b[mine], return_counts=True)
+        self.pending.append((keys, counts))
+        self.pending_size += len(keys)
+        if self.pending_size > MERGE_THRESHOLD:
+            self.merge()
+
+    def merge(self):
+        if not self.pending:
+            return
+        keys = np.concatenate([self.keys] + [keys for keys, _ in self.pending])
+        counts = np.concatenate([self.counts] + [counts for _, counts in self.pending])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts).astype(np.int64)
+        self.pending, self.pending_size = [], 0
+
+    def top_neighbors(self, degrees, top_n, min_count):
+        """{row: [(column, score)]} keeping each row's top_n columns"""
+        self.merge()
+        keep = self.counts >= min_count
+        keys, counts = self.keys[keep], self.counts[keep]
+        rows, cols = keys // self.size, keys % self.size
+        scores = counts / np.sqrt(degrees[rows] * degrees[cols].astype(np.float64))
+        order = np.lexsort((cols, -scores, rows))
+        rows, cols, scores = rows[order], cols[order], scores[order]
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if len(rows) else np.empty(0, dtype=np.int64)
+        rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+        keep = rank < top_n
+        neighbors = {}
+        for row, col, score in zip(rows[keep].tolist(), cols[keep].tolist(), scores[keep].tolist()):
+            neighbors.setdefault(row, []).append((col, score))
+        return neighbors
+
+class PythonCounter:
+    """Pure Python fallback with the same interface as NumpyCounter"""
+
+    def __init__(self, size, shard, shards, max_basket):
+        self.shard, self.shards, self.max_basket = shard, shards, max_basket
+        self.pairs = Counter()
+        self.degrees = [0] * size
+
+    def add_chunk(self, orders, products):
+        baskets = {}
+        for order_id, product in zip(orders, products):
+            baskets.setdefault(order_id, set()).add(product)
+        for basket in baskets.values():
+            for product in basket:
+                self.degrees[product] += 1
+            if len(basket) > self.max_basket:
+                continue
+            for a, b in combinations(basket, 2):
+                if a % self.shards == self.shard:
+                    self.pairs[a, b] += 1
+                if b % self.shards == self.shard:
+                    self.pairs[b, a] += 1
+
+    def top_neighbors(self, degrees, top_n, min_count):
+        rows = {}
+        for (a, b), count in self.pairs.items():
+            if count >= min_count:
+                rows.setdefault(a, []).append((b, count / math.sqrt(degrees[a] * degrees[b])))
+        return {
+            row: heapq.nsmallest(top_n, candidates, key=lambda item: (-item[1], item[0]))
+            for row, candidates in rows.items()
+        }
+
+def build_recommendations(top_n=None, min_count=None, max_basket=None, chunk_size=None, shards=None,
+                          use_numpy=None):
+    """Return ({product id: [(neighbour id, score)]}, stats) from the order history"""
+    config = get_config()
+    top_n = top_n or config['TOP_N']
+    min_count = min_count or config['MIN_COUNT']
+    max_basket = max_basket or config['MAX_BASKET']
+    chunk_size = chunk_size or config['CHUNK_SIZE']
+    shards = shards or config['SHARDS']
+    use_numpy = np is not None if use_numpy is None else use_numpy
+    counter_class = NumpyCounter if use_numpy else PythonCounter
+
+    # Dense product indexes; sorted, so index order is id order
+    ids = sorted(Product.objects.values_list('id', flat=True))
+    if use_numpy:
+        id_array = np.asarray(ids, dtype=np.int64)
+
+        def to_index(products):
+            return np.searchsorted(id_array, np.asarray(products, dtype=np.int64))
+    else:
+        positions = {pk: i for i, pk in enumerate(ids)}
+
+        def to_index(products):
+            return [positions[pk] for pk in products]
+
+    neighbors = {}
+    degrees = None
+    items = 0
+    for shard in range(shards):
+        counter = counter_class(len(ids), shard, shards, max_basket)
+        for orders, products in iter_chunks(chunk_size):
+            counter.add_chunk(orders, to_index(products))
+            if shard == 0:
+                items += len(orders)
+        if degrees is None:
+            degrees = counter.degrees
+        for row, columns in counter.top_neighbors(degrees, top_n, min_count).items():
+            neighbors[ids[row]] = [(ids[col], round(score, 4)) for col, score in columns]
+
+    stats = {'order_items': items, 'products': len(neighbors), 'shards': shards, 'numpy': use_numpy}
+    return neighbors, stats
+
+_neighbors = None
+_loaded_mtime = None
+_last_reload_check = 0
+_lock = threading.Lock()
+
+def get_neighbors():
+    """The latest saved neighbour lists, reloaded when build_recommendations rewrites the snapshot"""
+    global _neighbors, _loaded_mtime, _last_reload_check
+    with _lock:
+        now = time.time()
+        if _neighbors is not None and now - _last_reload_check < get_config()['RELOAD_CHECK_INTERVAL']:
+            return _neighbors
+        _last_reload_check = now
+        mtime = snapshot_mtime(SNAPSHOT_NAME)
+        if _neighbors is None or mtime != _loaded_mtime:
+            loaded = load_snapshot(SNAPSHOT_NAME, SNAPSHOT_VERSION) if mtime else None
+            _neighbors = loaded[0] if loaded else {}
+            _loaded_mtime = mtime
+        return _neighbors
+
+def save_recommendations(neighbors):
+    return save_snapshot(SNAPSHOT_NAME, neighbors, SNAPSHOT_VERSION)
+
+def reset_recommendations():
+    global _neighbors, _loaded_mtime, _last_reload_check
+    with _lock:
+        _neighbors, _loaded_mtime, _last_reload_check = None, None, 0
+
+def for_product(product_id, limit=DEFAULT_RECOMMENDATIONS):
+    """[(product id, score)] bought together with one product"""
+    return get_neighbors().get(product_id, [])[:limit]
+
+def for_cart(product_ids, limit=DEFAULT_RECOMMENDATIONS):
+    """[(product id, score)] bought together with a cart, summing scores over its items"""
+    neighbors = get_neighbors()
+    in_cart = set(product_ids)
+    scores = Counter()
+    for product_id in in_cart:
+        for neighbor, score in neighbors.get(product_id, []):
+            if neighbor not in in_cart:
+                scores[neighbor] += score
+    return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
@@ -0,0 +1,176 @@
+"""
+Stock reconciliation.
+
+A product's expected stock is built from three things:
+  - its last 'set' StockAdjustment (the baseline),
+  - plus the 'delta' adjustments after it (bulk updates, cancellations),
+  - minus the units ordered after it (orders reserve stock when placed).
+Products with no 'set' adjustment have no known baseline and are
+skipped. `reconcile_stock --init` records their current stock as one.
+
+reconcile() streams three queries in chunks:
+  1. the 'set' adjustments in time order, to find each baseline;
+  2. the deltas;
+  3. the order items.
+Per-chunk sums go into arrays with one slot per product, using
+np.bincount when NumPy is installed and plain Python otherwise. Memory
+therefore depends on the number of products, not on the number of order
+items. Only events up to the moment the run starts are counted, and
+stock is read at that moment too.
+
+Corrections are written as UPDATEs grouped by (current, expected)
+quantity and guarded by the current one, so a product whose stock
+changed during the run is left alone. Each corrected product gets a new 'set' baseline.
+"""
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from retailhive.lazy import optional_module
+from .models import Product, StockAdjustment
+from .inventory import record_adjustments, STOCK_BATCH_SIZE
+from . import catalog, changes, facets
+
+# Imported on first use; only the reconciliation job needs it
+np = optional_module('numpy')
+
+RECONCILE_CHUNK_SIZE = 100_000
+
+def iter_chunks(queryset, fields, chunk_size):
+    """Yield lists of up to chunk_size value tuples, streaming from the database"""
+    chunk = []
+    for row in queryset.values_list(*fields).iterator(chunk_size=min(chunk_size, 10000)):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class NumpyTally:
+    """Baselines and running sums per product index, as arrays"""
+
+    def __init__(self, size):
+        self.size = size
+        self.baseline = np.zeros(size, dtype=np.int64)
+        self.baseline_at = np.full(size, -np.inf)
+        self.has_baseline = np.zeros(size, dtype=bool)
+        self.change = np.zeros(size, dtype=np.int64)
+
+    def set_baselines(self, index, at, values):
+        """Record baselines from a chunk of 'set' events in time order (the last one per product wins)"""
+        index, at, values = np.asarray(index), np.asarray(at), np.asarray(values, dtype=np.int64)
+        _, first_from_end = np.unique(index[::-1], return_index=True)
+        last = len(index) - 1 - first_from_end
+        self.baseline[index[last]] = values[last]
+        self.baseline_at[index[last]] = at[last]
+        self.has_baseline[index[last]] = True
+
+    def add(self, index, at, values):
+        """Add signed quantities for the events after each product's baseline"""
+        index, at, values = np.asarray(index), np.asarray(at), np.asarray(values, dtype=np.int64)
+        after = at > self.baseline_at[index]
+        self.change += np.bincount(index[after], weights=values[after], minlength=self.size).astype(np.int64)
+
+    def expected(self):
+        """{index: expected stock} for the products with a baseline"""
+        rows = np.flatnonzero(self.has_baseline)
+        return dict(zip(rows.tolist(), (self.baseline[rows] + self.change[rows]).tolist()))
+
+class PythonTally:
+    """Pure Python fallback with the same interface as NumpyTally"""
+
+    def __init__(self, size):
+        self.baselines = {}   # index -> (at, quantity)
+        self.change = [0] * size
+
+    def set_baselines(self, index, at, values):
+        for i, when, value in zip(index, at, values):
+            self.baselines[i] = (when, value)
+
+    def add(self, index, at, values):
+        for i, when, value in zip(index, at, values):
+            baseline = self.baselines.get(i)
+            if baseline is None or when > baseline[0]:
+                self.change[i] += value
+
+    def expected(self):
+        return {i: quantity + self.change[i] for i, (_, quantity) in self.baselines.items()}
+
+def reconcile(chunk_size=RECONCILE_CHUNK_SIZE, use_numpy=None):
+    """Return ({product id: (current stock, expected stock)} for mismatches, stats)"""
+    from apps.orders.models import OrderItem
+
+    use_numpy = np is not None if use_numpy is None else use_numpy
+    cutoff = timezone.now()
+    stock = dict(Product.objects.order_by('id').values_list('id', 'stock_quantity'))
+    ids = list(stock)
+    if use_numpy:
+        id_array = np.asarray(ids, dtype=np.int64)
+
+        def to_index(product_ids):
+            return np.searchsorted(id_array, np.asarray(product_ids, dtype=np.int64))
+    else:
+        positions = {pk: i for i, pk in enumerate(ids)}
+
+        def to_index(product_ids):
+            return [positions[pk] for pk in product_ids]
+    tally = (NumpyTally if use_numpy else PythonTally)(len(ids))
+    stats = {'products': len(ids), 'adjustments': 0, 'order_items': 0, 'numpy': use_numpy}
+
+    # Events up to the cutoff can only name products that existed then, and so were read above
+    adjustments = StockAdjustment.objects.filter(created_at__lte=cutoff)
+    for chunk in iter_chunks(adjustments.filter(kind='set').order_by('created_at', 'id'),
+                             ['product_id', 'created_at', 'quantity'], chunk_size):
+        product_ids, at, values = zip(*chunk)
+        tally.set_baselines(to_index(product_ids), [t.timestamp() for t in at], values)
+        stats['adjustments'] += len(chunk)
+
+    for chunk in iter_chunks(adjustments.filter(kind='delta'), ['product_id', 'created_at', 'quantity'], chunk_size):
+        product_ids, at, values = zip(*chunk)
+        tally.add(to_index(product_ids), [t.timestamp() for t in at], values)
+        stats['adjustments'] += len(chunk)
+
+    order_items = OrderItem.objects.filter(order__created_at__lte=cutoff)
+    for chunk in iter_chunks(order_items, ['product_id', 'order__created_at', 'quantity'], chunk_size):
+        product_ids, at, quantities = zip(*chunk)
+        tally.add(to_index(product_ids), [t.timestamp() for t in at], [-q for q in quantities])
+        stats['order_items'] += len(chunk)
+
+    expected = tally.expected()
+    stats['checked'] = len(expected)
+    mismatches = {
+        ids[i]: (stock[ids[i]], quantity)
+        for i, quantity in expected.items()
+        if stock[ids[i]] != quantity
+    }
+    return mismatches, stats
+
+def apply_corrections(mismatches, batch_size=STOCK_BATCH_SIZE):
+    """Set each product to its expected stock (0 if oversold) unless its stock changed meanwhile"""
+    groups = {}
+    for pk, (current, expected) in mismatches.items():
+        groups.setdefault((current, max(expected, 0)), []).append(pk)
+
+    corrected = {}
+    now = timezone.now()
+    for (current, target), pks in groups.items():
+        for start in range(0, len(pks), batch_size):
+            batch = pks[start:start + batch_size]
+            Product.objects.filter(pk__in=batch, stock_quantity=current).update(stock_quantity=target, updated_at=now)
+            corrected.update(
+                (pk, target) for pk in Product.objects.filter(pk__in=batch, stock_quantity=target).values_list('id', flat=True)
+            )
+    record_adjustments(corrected, 'set', 'reconcile')
+    changes.record_products(corrected, ['stock'])
+    if corrected:
+        facets.mark_stale()
+        catalog.mark_stale()
+    return corrected
+
+def record_baselines(batch_size=STOCK_BATCH_SIZE):
+    """Record the current stock as a 'set' baseline for products that have none"""
+    missing = Product.objects.filter(~Exists(StockAdjustment.objects.filter(product=OuterRef('pk'), kind='set')))
+    count = 0
+    for chunk in iter_chunks(missing, ['id', 'stock_quantity'], batch_size):
+        record_adjustments(dict(chunk), 'set', 'baseline')
+        count += len(chunk)
+    return count
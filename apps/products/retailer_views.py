@@ -5,7 +5,10 @@ from rest_framework.permissions import IsAuthenticated
 from django.db.models import Q
 from .models import Product, Category
 from .serializers import ProductSerializer, ProductCreateSerializer
-from .permissions import IsRetailerOrReadOnly
+from .permissions import IsRetailerOrReadOnly, is_retailer
+from .exports import export_response, RETAILER_DATASETS
+from .imports import import_products, IMPORT_FORMATS
+from .inventory import apply_stock_updates, MAX_STOCK_ITEMS
 
 class RetailerProductViewSet(viewsets.ModelViewSet):
     """
@@ -16,7 +19,7 @@ class RetailerProductViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         # Retailers can only see their own products
-        if hasattr(self.request.user, 'userprofile') and self.request.user.userprofile.role == 'retailer':
+        if is_retailer(self.request.user):
             return Product.objects.filter(retailer=self.request.user)
         return Product.objects.none()
     
@@ -52,31 +55,108 @@ class RetailerProductViewSet(viewsets.ModelViewSet):
         if new_stock is not None:
             try:
                 product.stock_quantity = int(new_stock)
-                product.save()
+                product.save(update_fields=['stock_quantity', 'updated_at'])
                 return Response({'message': 'Stock updated successfully', 'stock_quantity': product.stock_quantity})
             except ValueError:
                 return Response({'error': 'Invalid stock quantity'}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({'error': 'Stock quantity is required'}, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the retailer's products, reviews or order items as NDJSON or CSV"""
+        dataset = request.query_params.get('dataset', 'products')
+        fmt = request.query_params.get('export_format', 'ndjson')
+        if dataset not in RETAILER_DATASETS:
+            return Response({'error': f'dataset must be one of {RETAILER_DATASETS}'}, status=status.HTTP_400_BAD_REQUEST)
+        if not is_retailer(request.user):
+            return Response({'error': 'Only retailers can export'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            return export_response(dataset, fmt, retailer=request.user)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'])
+    def bulk_import(self, request):
+        """Create or update products from a CSV/NDJSON upload, keyed on SKU"""
+        if not is_retailer(request.user):
+            return Response({'error': 'Only retailers can import products'}, status=status.HTTP_403_FORBIDDEN)
+        
+        fmt = request.query_params.get('import_format')
+        if request.content_type.startswith('multipart/form-data'):
+            source = request.FILES.get('file')
+            if source is None:
+                return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+            fmt = fmt or source.name.rsplit('.', 1)[-1].lower()
+        else:
+            # Raw CSV/NDJSON body, read line by line without buffering it in request.data
+            source = request._request
+            fmt = fmt or ('csv' if 'csv' in request.content_type else 'ndjson')
+        
+        if fmt not in IMPORT_FORMATS:
+            return Response({'error': f'import_format must be one of {IMPORT_FORMATS}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        summary = import_products(source, fmt, request.user)
+        if 'error' in summary:
+            # Rows before the unreadable line were imported; the summary counts them
+            return Response(summary, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['post'])
+    def bulk_update_stock(self, request):
+        """Set or adjust stock for many products: {"items": [{"id"|"sku": ..., "quantity"|"delta": ...}]}"""
+        if not is_retailer(request.user):
+            return Response({'error': 'Only retailers can update stock'}, status=status.HTTP_403_FORBIDDEN)
+        
+        items = request.data.get('items') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'items must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_STOCK_ITEMS:
+            return Response({'error': f'At most {MAX_STOCK_ITEMS} items per request'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = apply_stock_updates(request.user, items)
+        updated = sum(1 for r in results if r['status'] == 'updated')
+        return Response({
+            'updated_count': updated,
+            'failed_count': len(results) - updated,
+            'results': results,
+        })
+    
     @action(detail=False, methods=['get'])
     def sales_summary(self, request):
         """Get sales summary for retailer's products"""
         from apps.orders.models import OrderItem
+        from retailhive.fanout import fan_out, FanoutTimeout
         
         retailer_products = self.get_queryset()
-        total_sales = 0
-        total_orders = 0
         
-        for product in retailer_products:
-            order_items = OrderItem.objects.filter(product=product)
-            total_orders += order_items.count()
-            total_sales += sum(item.quantity * item.price for item in order_items)
+        def sales():
+            product_ids = list(retailer_products.values_list('id', flat=True))
+            order_items = OrderItem.objects.filter(product_id__in=product_ids).values_list('quantity', 'price')
+            total_sales = 0
+            total_orders = 0
+            
+            for quantity, price in order_items:
+                total_orders += 1
+                total_sales += quantity * price
+            return total_sales, total_orders
+        
+        # The sales scan and the product counts are independent
+        try:
+            stats = fan_out({
+                'sales': sales,
+                'total_products': retailer_products.count,
+                'approved_products': retailer_products.filter(is_approved=True).count,
+                'pending_products': retailer_products.filter(is_approved=False).count,
+            }, site='sales_summary')
+        except FanoutTimeout:
+            return Response({'error': 'Sales summary timed out'}, status=status.HTTP_504_GATEWAY_TIMEOUT)
+        total_sales, total_orders = stats['sales']
         
         return Response({
-            'total_products': retailer_products.count(),
+            'total_products': stats['total_products'],
             'total_sales': total_sales,
             'total_orders': total_orders,
-            'approved_products': retailer_products.filter(is_approved=True).count(),
-            'pending_products': retailer_products.filter(is_approved=False).count(),
+            'approved_products': stats['approved_products'],
+            'pending_products': stats['pending_products'],
         })
\ No newline at end of file
@@ -1,10 +1,12 @@
 from rest_framework import serializers
-from .models import Product, Category, ProductReview
+from .models import Product, Category, ProductReview, ProductRatingSummary, ProductChange
+from .pagination import review_page
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
+        read_only_fields = ['path', 'depth', 'product_count', 'subtree_product_count']
 
 class ProductReviewSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.username', read_only=True)
@@ -28,7 +30,61 @@ class ProductSerializer(serializers.ModelSerializer):
             return sum(review.rating for review in reviews) / len(reviews)
         return 0
 
+class RatingSummarySerializer(serializers.ModelSerializer):
+    count = serializers.ReadOnlyField()
+    average = serializers.ReadOnlyField()
+    histogram = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = ProductRatingSummary
+        fields = ['count', 'average', 'histogram']
+
+class ProductDetailSerializer(ProductSerializer):
+    """
+    Product detail with a rating summary and only the first page of reviews;
+    the rest are fetched from the keyset-paginated reviews endpoint.
+    """
+    reviews = serializers.SerializerMethodField()
+    reviews_next_cursor = serializers.SerializerMethodField()
+    rating_summary = serializers.SerializerMethodField()
+    
+    def get_summary(self, obj):
+        try:
+            return obj.rating_summary
+        except ProductRatingSummary.DoesNotExist:
+            return ProductRatingSummary(product=obj)
+    
+    def get_first_page(self, obj):
+        if not hasattr(obj, '_first_review_page'):
+            obj._first_review_page = review_page(obj.pk)
+        return obj._first_review_page
+    
+    def get_reviews(self, obj):
+        reviews, _ = self.get_first_page(obj)
+        return ProductReviewSerializer(reviews, many=True).data
+    
+    def get_reviews_next_cursor(self, obj):
+        return self.get_first_page(obj)[1]
+    
+    def get_rating_summary(self, obj):
+        return RatingSummarySerializer(self.get_summary(obj)).data
+    
+    def get_average_rating(self, obj):
+        return self.get_summary(obj).average
+
 class ProductCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = ['name', 'description', 'price', 'category', 'image', 'stock_quantity']
\ No newline at end of file
+        fields = ['name', 'sku', 'description', 'price', 'category', 'image', 'stock_quantity']
+
+class ProductChangeSerializer(serializers.ModelSerializer):
+    seq = serializers.IntegerField(source='id', read_only=True)
+    product = serializers.IntegerField(source='product_id', read_only=True)
+    changes = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ProductChange
+        fields = ['seq', 'product', 'changes', 'price', 'stock_quantity', 'is_active', 'is_approved', 'created_at']
+    
+    def get_changes(self, obj):
+        return obj.changes.split(',')
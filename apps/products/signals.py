@@ -0,0 +1,157 @@
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Category, Product, ProductReview, ProductRatingSummary, StockAdjustment
+from .categories import adjust_product_count, is_counted
+from . import catalog, changes, facets, ranking, suggest
+
+def adjust_rating_count(product_id, rating, delta):
+    """Add delta to the product's count for one star rating"""
+    field = f'count_{rating}'
+    summaries = ProductRatingSummary.objects.filter(product_id=product_id)
+    if delta > 0:
+        ProductRatingSummary.objects.get_or_create(product_id=product_id)
+    else:
+        # Never go below zero, and don't resurrect a summary deleted with its product
+        summaries = summaries.filter(**{f'{field}__gte': -delta})
+    summaries.update(**{field: F(field) + delta})
+
+def rebuild_rating_summaries(product_ids=None):
+    """Recount the summaries from the reviews, e.g. after bulk writes or a backfill"""
+    products = Product.objects.all()
+    reviews = ProductReview.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+        reviews = reviews.filter(product_id__in=product_ids)
+
+    counts = {pk: [0] * 5 for pk in products.values_list('id', flat=True)}
+    for product_id, rating in reviews.values_list('product_id', 'rating').iterator():
+        if product_id in counts and 1 <= rating <= 5:
+            counts[product_id][rating - 1] += 1
+
+    fields = [f'count_{i}' for i in range(1, 6)]
+    summaries = [
+        ProductRatingSummary(product_id=pk, **dict(zip(fields, values)))
+        for pk, values in counts.items()
+    ]
+    existing = set(ProductRatingSummary.objects.filter(
+        product_id__in=list(counts)
+    ).values_list('product_id', flat=True))
+    ProductRatingSummary.objects.bulk_create([s for s in summaries if s.product_id not in existing], batch_size=500)
+    ProductRatingSummary.objects.bulk_update([s for s in summaries if s.product_id in existing], fields, batch_size=500)
+    return len(summaries)
+
+@receiver(pre_save, sender=ProductReview)
+def remember_previous_rating(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = ProductReview.objects.filter(
+            pk=instance.pk
+        ).values_list('product_id', 'rating').first()
+
+@receiver(post_save, sender=ProductReview)
+def count_saved_review(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_rating', None)
+    current = (instance.product_id, instance.rating)
+    if previous == current:
+        return
+    if previous is not None:
+        adjust_rating_count(*previous, -1)
+    adjust_rating_count(*current, 1)
+
+@receiver(post_delete, sender=ProductReview)
+def count_deleted_review(sender, instance, **kwargs):
+    adjust_rating_count(instance.product_id, instance.rating, -1)
+
+@receiver(pre_save, sender=Product)
+def remember_previous_listing(sender, instance, **kwargs):
+    instance._previous_listing = None
+    if instance.pk:
+        instance._previous_listing = Product.objects.filter(
+            pk=instance.pk
+        ).values_list('category_id', 'is_active', 'is_approved', 'stock_quantity', 'price').first()
+
+@receiver(post_save, sender=Product)
+def count_saved_product(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_listing', None)
+    old_category = previous[0] if previous and is_counted(*previous[1:3]) else None
+    new_category = instance.category_id if is_counted(instance.is_active, instance.is_approved) else None
+    if old_category != new_category:
+        adjust_product_count(old_category, -1)
+        adjust_product_count(new_category, 1)
+
+@receiver(post_delete, sender=Product)
+def count_deleted_product(sender, instance, **kwargs):
+    if is_counted(instance.is_active, instance.is_approved):
+        adjust_product_count(instance.category_id, -1)
+
+# Any change to listed products, ratings or categories invalidates the facet index
+for model in (Product, ProductReview, Category):
+    post_save.connect(facets.mark_stale, sender=model, dispatch_uid=f'facets_stale_save_{model.__name__}')
+    post_delete.connect(facets.mark_stale, sender=model, dispatch_uid=f'facets_stale_delete_{model.__name__}')
+
+# ...and the pre-rendered catalog pages, which embed reviews and category names
+for model in (Product, ProductReview, Category):
+    post_save.connect(catalog.mark_stale, sender=model, dispatch_uid=f'catalog_stale_save_{model.__name__}')
+    post_delete.connect(catalog.mark_stale, sender=model, dispatch_uid=f'catalog_stale_delete_{model.__name__}')
+
+@receiver(post_save, sender=Product)
+def suggest_saved_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        suggest.update_product(instance)
+
+@receiver(post_delete, sender=Product)
+def suggest_deleted_product(sender, instance, **kwargs):
+    suggest.remove_item('product', instance.pk)
+
+@receiver(post_save, sender=Category)
+def suggest_saved_category(sender, instance, raw=False, **kwargs):
+    if not raw:
+        suggest.update_category(instance)
+
+@receiver(post_delete, sender=Category)
+def suggest_deleted_category(sender, instance, **kwargs):
+    suggest.remove_item('category', instance.pk)
+
+@receiver(post_save, sender=ProductReview)
+def rank_new_review(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ranking.record('review', instance.product_id)
+
+@receiver(post_save, sender=Product)
+def rank_saved_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        ranking.update_listing(instance)
+
+@receiver(post_delete, sender=Product)
+def rank_deleted_product(sender, instance, **kwargs):
+    ranking.remove_product(instance.pk)
+
+@receiver(post_save, sender=Product)
+def log_stock_set(sender, instance, created, raw=False, **kwargs):
+    """Saving a product with a new stock quantity is a 'set' adjustment"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_listing', None)
+    if created or (previous and previous[3] != instance.stock_quantity):
+        StockAdjustment.objects.create(product=instance, kind='set', quantity=instance.stock_quantity, reason='edit')
+
+@receiver(post_save, sender=Product)
+def record_saved_product(sender, instance, created, raw=False, **kwargs):
+    """Append saves that touch the tracked fields to the change feed"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_listing', None)
+    if created:
+        changes.record_product(instance, ['created'])
+    elif previous:
+        fields = ('is_active', 'is_approved', 'stock_quantity', 'price')
+        changes.record_product(instance, changes.changed_fields(dict(zip(fields, previous[1:])), instance))
+
+@receiver(post_delete, sender=Product)
+def record_deleted_product(sender, instance, **kwargs):
+    changes.record_deleted(instance.pk)
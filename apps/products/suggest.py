@@ -0,0 +1,279 @@
+"""
+Search-box suggestions from an in-memory sorted array.
+
+Every active product name and category name is indexed under each of its
+word starts, so "ph" matches "Phone case" and "Cheap phone". The keys
+live in one sorted list of (key, kind, id) tuples. A lookup is a bisect
+to the first key >= the prefix followed by a scan while keys still match.
+The best-weighted matches win, where weight is units sold for a product
+and the subtree product count for a category.
+
+Short or very common prefixes can match a large part of the catalog.
+A second bisect gives the size of the matching range without scanning
+it. Ranges over SCAN_LIMIT keys are answered from a cache of top
+results. The cache is precomputed for one- and two-character prefixes
+and filled lazily for longer ones. When an item changes, the cached
+prefixes of its keys are recomputed (short ones) or dropped.
+
+Product and category signals update the index in place; a full build
+runs the first time the index is needed, or when it is older than
+SUGGEST['MAX_AGE']. Only the first build of a process runs on the
+request thread. Later ones run on a background thread while the current
+index keeps answering, and the in-place updates made meanwhile are
+replayed onto the new index before it is swapped in. Inside a
+transaction the rebuild runs inline, since another connection could not
+see its writes. A snapshot written by build_suggest_index lets a
+new worker load the index instead of querying the whole catalog, then
+catch up on products changed since the snapshot (deletions in other
+processes are only picked up by the next full build).
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Sum
+from retailhive.fanout import in_transaction
+from retailhive.snapshots import load_snapshot, save_snapshot
+from .models import Category, Product
+
+SNAPSHOT_NAME = 'suggest'
+SNAPSHOT_VERSION = 1
+MAX_SUGGESTIONS = 20
+DEFAULT_SUGGESTIONS = 8
+
+# Prefixes up to this length get their top results precomputed
+CACHED_PREFIX_LENGTH = 2
+# Matching ranges longer than this are served from the top-results cache
+SCAN_LIMIT = 256
+# Word starts indexed per name ("a b c" -> "a b c", "b c", "c")
+MAX_WORD_STARTS = 6
+
+WORD_RE = re.compile(r'\w+')
+
+def get_config():
+    config = {'MAX_AGE': 3600, 'SNAPSHOT_MAX_AGE': 86400}
+    config.update(getattr(settings, 'SUGGEST', {}))
+    return config
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation/whitespace"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(WORD_RE.findall(text.lower()))
+
+def index_keys(text):
+    words = normalize(text).split(' ')
+    return sorted({' '.join(words[i:]) for i in range(min(len(words), MAX_WORD_STARTS)) if words[i]})
+
+class SuggestIndex:
+    def __init__(self):
+        self.keys = []      # sorted (key, kind, id)
+        self.items = {}     # (kind, id) -> [text, weight, keys]
+        self.top = {}       # prefix -> best (kind, id) list, for large ranges
+        self.built_at = time.monotonic()
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_items(cls, items):
+        """Build from {(kind, id): (text, weight)}"""
+        index = cls()
+        keys = []
+        for item, (text, weight) in items.items():
+            item_keys = index_keys(text)
+            index.items[item] = [text, weight, item_keys]
+            keys.extend((key,) + item for key in item_keys)
+        keys.sort()
+        index.keys = keys
+        index.warm()
+        return index
+
+    @classmethod
+    def build(cls):
+        """Full build from the database"""
+        from apps.orders.models import OrderItem
+        
+        sales = {}
+        for product_id, sold in OrderItem.objects.values('product_id').annotate(
+            sold=Sum('quantity')
+        ).values_list('product_id', 'sold'):
+            sales[product_id] = sold or 0
+
+        items = {}
+        for pk, name in Product.objects.filter(is_active=True).values_list('id', 'name').iterator():
+            items[('product', pk)] = (name, sales.get(pk, 0))
+        for pk, name, count in Category.objects.values_list('id', 'name', 'subtree_product_count'):
+            items[('category', pk)] = (name, count)
+        return cls.from_items(items)
+
+    def suggest(self, prefix, limit=DEFAULT_SUGGESTIONS):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self.lock:
+            low, high = self.key_range(prefix)
+            if high - low <= SCAN_LIMIT:
+                best = self.rank({key[1:] for key in self.keys[low:high]}, limit)
+            else:
+                best = self.top.get(prefix)
+                if best is None:
+                    best = self.top[prefix] = self.best_matches(prefix, MAX_SUGGESTIONS)
+                best = best[:limit]
+            return [
+                {'text': self.items[item][0], 'kind': item[0], 'id': item[1]}
+                for item in best
+            ]
+
+    def warm(self):
+        """Precompute the top results of every short prefix in one pass over the keys"""
+        groups = {}
+        for key, kind, pk in self.keys:
+            for length in range(1, min(len(key), CACHED_PREFIX_LENGTH) + 1):
+                groups.setdefault(key[:length], set()).add((kind, pk))
+        self.top = {prefix: self.rank(items, MAX_SUGGESTIONS) for prefix, items in groups.items()}
+
+    def rank(self, items, limit):
+        return heapq.nlargest(limit, items, key=lambda item: (self.items[item][1], -item[1]))
+
+    def key_range(self, prefix):
+        """Positions [low, high) of the keys starting with prefix"""
+        return bisect_left(self.keys, (prefix,)), bisect_left(self.keys, (prefix + '\U0010ffff',))
+
+    def best_matches(self, prefix, limit):
+        low, high = self.key_range(prefix)
+        return self.rank({key[1:] for key in self.keys[low:high]}, limit)
+
+    def update(self, kind, pk, text=None, weight=None):
+        """Add, rename or reweight an item; text=None removes it"""
+        item = (kind, pk)
+        with self.lock:
+            current = self.items.get(item)
+            if current is not None:
+                if text == current[0] and (weight is None or weight == current[1]):
+                    return
+                if weight is None:
+                    weight = current[1]
+                for key in current[2]:
+                    position = bisect_left(self.keys, (key,) + item)
+                    if position < len(self.keys) and self.keys[position] == (key,) + item:
+                        del self.keys[position]
+                del self.items[item]
+                self.refresh_prefixes(current[2])
+            if text is None:
+                return
+            keys = index_keys(text)
+            self.items[item] = [text, weight or 0, keys]
+            for key in keys:
+                insort(self.keys, (key,) + item)
+            self.refresh_prefixes(keys)
+
+    def refresh_prefixes(self, keys):
+        prefixes = {key[:length] for key in keys for length in range(1, len(key) + 1)}
+        for prefix in prefixes:
+            if len(prefix) <= CACHED_PREFIX_LENGTH:
+                self.top[prefix] = self.best_matches(prefix, MAX_SUGGESTIONS)
+            else:
+                self.top.pop(prefix, None)
+
+    def snapshot(self):
+        with self.lock:
+            return {item: (text, weight) for item, (text, weight, _) in self.items.items()}
+
+_index = None
+_pending = None      # updates made while a rebuild runs, replayed onto the new index
+_index_lock = threading.Lock()
+# Held while the first index of the process is loaded or built, so it happens once
+_first_build_lock = threading.Lock()
+
+def rebuild():
+    """Build a new index and swap it in; the current one answers until then"""
+    global _index, _pending
+    try:
+        index = SuggestIndex.build()
+        with _index_lock:
+            for update in _pending or ():
+                index.update(*update)
+            _index = index
+    finally:
+        with _index_lock:
+            _pending = None
+
+def rebuild_in_background():
+    try:
+        rebuild()
+    finally:
+        close_old_connections()
+
+def get_suggest_index():
+    """Return the suggestion index, loading the snapshot or building it on first use"""
+    global _index, _pending
+    config = get_config()
+    if _index is None:
+        with _first_build_lock:
+            if _index is None:
+                index = load_index_snapshot(config['SNAPSHOT_MAX_AGE']) or SuggestIndex.build()
+                with _index_lock:
+                    _index = index
+        return _index
+
+    with _index_lock:
+        index = _index
+        if _pending is not None or time.monotonic() - index.built_at < config['MAX_AGE']:
+            return index
+        _pending = []
+
+    if in_transaction():
+        rebuild()
+        return _index
+    threading.Thread(target=rebuild_in_background, name='suggest-rebuild', daemon=True).start()
+    return index
+
+def apply_update(kind, pk, text=None, weight=None):
+    """Update the live index, and the one being rebuilt if any"""
+    with _index_lock:
+        index = _index
+        if _pending is not None:
+            _pending.append((kind, pk, text, weight))
+    if index is not None:
+        index.update(kind, pk, text, weight)
+
+def load_index_snapshot(max_age):
+    loaded = load_snapshot(SNAPSHOT_NAME, SNAPSHOT_VERSION, max_age=max_age)
+    if loaded is None:
+        return None
+    items, built_at = loaded
+    index = SuggestIndex.from_items(items)
+
+    # Catch up on products and categories changed since the snapshot was taken
+    since = datetime.fromtimestamp(built_at, tz=timezone.utc)
+    for pk, name, is_active in Product.objects.filter(updated_at__gte=since).values_list('id', 'name', 'is_active'):
+        index.update('product', pk, name if is_active else None)
+    live = set()
+    for pk, name, count in Category.objects.values_list('id', 'name', 'subtree_product_count'):
+        live.add(pk)
+        index.update('category', pk, name, count)
+    for kind, pk in list(index.items):
+        if kind == 'category' and pk not in live:
+            index.update('category', pk, None)
+    return index
+
+def save_index_snapshot(index):
+    return save_snapshot(SNAPSHOT_NAME, index.snapshot(), SNAPSHOT_VERSION)
+
+def reset_suggest_index(index=None):
+    global _index, _pending
+    with _index_lock:
+        _index, _pending = index, None
+
+def update_product(product):
+    apply_update('product', product.pk, product.name if product.is_active else None)
+
+def remove_item(kind, pk):
+    apply_update(kind, pk, None)
+
+def update_category(category):
+    apply_update('category', category.pk, category.name)
@@ -1,8 +1,11 @@
-from django.test import TestCase
+from unittest import skipUnless
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.db import connection
 from django.contrib.auth.models import User
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import Product, Category
+from django.db.models import F
+from .models import Product, Category, ProductReview, ProductRatingSummary
 
 class ProductModelTest(TestCase):
     def setUp(self):
@@ -33,4 +36,1008 @@ class ProductAPITest(APITestCase):
     
     def test_get_products(self):
         response = self.client.get('/api/products/products/')
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+@skipUnless(connection.vendor == 'sqlite', 'query plans are checked against SQLite')
+class IndexPlanTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.category = Category.objects.create(name="Electronics")
+    
+    def test_catalog_filter_uses_index(self):
+        plan = Product.objects.filter(
+            is_active=True, is_approved=True, category=self.category
+        ).order_by('-created_at').explain()
+        self.assertIn('product_catalog_idx', plan)
+    
+    def test_per_user_lookups_use_indexes(self):
+        from apps.orders.models import Order
+        for queryset in [
+            Product.objects.filter(retailer=self.user, is_approved=False),
+            Order.objects.filter(user=self.user),
+        ]:
+            plan = queryset.explain()
+            self.assertIn('USING', plan)
+            self.assertNotIn('SCAN', plan.replace('SCAN CONSTANT', ''))
+
+class ExportAPITest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass', is_staff=True)
+        self.category = Category.objects.create(name="Electronics")
+        for i in range(3):
+            Product.objects.create(
+                name=f"Product {i}",
+                description="Test Description",
+                price=9.99,
+                category=self.category,
+                stock_quantity=i
+            )
+    
+    def test_export_products_csv(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/products/admin/products/export/', {'dataset': 'products', 'export_format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('id,sku,name'))
+    
+    def test_export_rejects_unknown_dataset(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/products/admin/products/export/', {'dataset': 'users'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_export_requires_admin(self):
+        customer = User.objects.create_user(username='customer', password='testpass')
+        self.client.force_authenticate(customer)
+        for dataset in ['orders', 'products']:
+            response = self.client.get('/api/products/admin/products/export/', {'dataset': dataset})
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class BulkImportTest(TestCase):
+    def setUp(self):
+        self.retailer = User.objects.create_user(username='retailer', password='testpass')
+        self.category = Category.objects.create(name="Electronics")
+    
+    def test_import_upserts_on_sku_and_reports_errors(self):
+        from .imports import import_products
+        rows = [
+            'sku,name,description,price,category,stock_quantity',
+            'A-1,Phone,Nice phone,199.99,electronics,5',
+            'A-2,Cable,,4.50,Electronics,100',
+            'A-3,Broken,,abc,Toys,1',
+        ]
+        summary = import_products(rows, 'csv', self.retailer, batch_size=2)
+        self.assertEqual((summary['created'], summary['updated'], summary['failed']), (2, 0, 1))
+        self.assertEqual(summary['errors'][0]['row'], 4)
+        self.assertEqual(set(summary['errors'][0]['errors']), {'price', 'category'})
+        
+        summary = import_products(['{"sku": "A-1", "name": "Phone", "price": "149", "category": "%d"}' % self.category.id], 'ndjson', self.retailer)
+        self.assertEqual(summary['updated'], 1)
+        self.assertEqual(Product.objects.get(retailer=self.retailer, sku='A-1').price, 149)
+        self.assertEqual(Product.objects.filter(retailer=self.retailer).count(), 2)
+
+    def test_unchanged_rows_are_not_counted_as_updated(self):
+        from .imports import import_products
+        rows = ['sku,name,price,category', 'A-1,Phone,10,electronics', 'A-2,Cable,5,electronics']
+        import_products(rows, 'csv', self.retailer)
+        rows[2] = 'A-2,Cable,6,electronics'
+        summary = import_products(rows, 'csv', self.retailer)
+        self.assertEqual((summary['created'], summary['updated'], summary['unchanged']), (0, 1, 1))
+
+    def test_unreadable_stream_stops_with_line_number(self):
+        from rest_framework.test import APIClient
+        from .imports import import_products
+        summary = import_products([b'sku,name,price,category\n', b'A-1,Phone,10,electronics\n', b'A-2,\xff,5,electronics\n'], 'csv', self.retailer)
+        self.assertEqual((summary['created'], summary['line']), (1, 3))
+        summary = import_products(['sku,name,price,category', 'A-3,%s,5,electronics' % ('x' * 200000)], 'csv', self.retailer)
+        self.assertEqual(summary['line'], 2)
+
+        client = APIClient()
+        self.retailer._cached_role = 'retailer'
+        client.force_authenticate(self.retailer)
+        response = client.post(
+            '/api/products/retailer/products/bulk_import/', b'sku,name,price,category\nA-4,\xff,5,electronics\n',
+            content_type='text/csv'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['line'], 2)
+
+class BulkStockUpdateTest(TestCase):
+    def setUp(self):
+        self.retailer = User.objects.create_user(username='retailer', password='testpass')
+        self.other = User.objects.create_user(username='other', password='testpass')
+        self.category = Category.objects.create(name="Electronics")
+        self.mine = Product.objects.create(
+            name="Mine", description="", price=1, category=self.category,
+            stock_quantity=5, retailer=self.retailer, sku='M-1'
+        )
+        self.theirs = Product.objects.create(
+            name="Theirs", description="", price=1, category=self.category,
+            stock_quantity=5, retailer=self.other
+        )
+    
+    def test_set_delta_and_ownership(self):
+        from .inventory import apply_stock_updates
+        results = apply_stock_updates(self.retailer, [
+            {'sku': 'M-1', 'delta': 3},
+            {'id': self.theirs.id, 'quantity': 0},
+            {'id': self.mine.id, 'delta': -100},
+            {'id': 'x', 'quantity': 1},
+        ])
+        self.assertEqual([r['status'] for r in results], ['updated', 'not_found', 'duplicate', 'invalid'])
+        self.assertEqual(results[0]['stock_quantity'], 8)
+        
+        results = apply_stock_updates(self.retailer, [{'sku': 'M-1', 'delta': -100}])
+        self.assertEqual((results[0]['status'], results[0]['stock_quantity']), ('insufficient_stock', 8))
+        results = apply_stock_updates(self.retailer, [{'id': self.mine.id, 'delta': -2}])
+        self.assertEqual(results[0]['stock_quantity'], 6)
+        results = apply_stock_updates(self.retailer, [{'id': self.mine.id, 'quantity': 42}])
+        self.assertEqual(results[0]['status'], 'updated')
+        self.mine.refresh_from_db()
+        self.theirs.refresh_from_db()
+        self.assertEqual((self.mine.stock_quantity, self.theirs.stock_quantity), (42, 5))
+
+class RoleResolverTest(TestCase):
+    def test_role_is_loaded_once_per_user_object(self):
+        from .permissions import get_user_role, is_admin, is_retailer
+        user = User.objects.create_user(username='noprofile', password='testpass')
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_user_role(user))
+            self.assertFalse(is_retailer(user))
+            self.assertFalse(is_admin(user))
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(
+            name="Async Product", description="Test", price=9.99,
+            category=self.category, stock_quantity=3
+        )
+
+    def test_orm_store_matches_drf_list(self):
+        from retailhive.async_db import OrmStore, set_store
+        previous = set_store(OrmStore())
+        try:
+            async_data = self.client.get('/api/products/async/products/').json()
+        finally:
+            set_store(previous)
+        sync_data = self.client.get('/api/products/products/').json()
+        self.assertEqual(async_data[0]['name'], sync_data[0]['name'])
+        self.assertEqual(async_data[0]['price'], sync_data[0]['price'])
+        self.assertEqual(async_data[0]['category_name'], 'Electronics')
+
+    def test_concurrent_requests_overlap_db_latency(self):
+        import asyncio
+        import time
+        from django.test import RequestFactory
+        from retailhive.async_db import MemoryStore, set_store
+        from apps.products.async_views import product_list
+        from apps.products.management.commands.bench_async import seed_store
+
+        store = MemoryStore(latency_ms=20)
+        seed_store(store, products=5)
+        previous = set_store(store)
+        request = RequestFactory().get('/api/products/async/products/')
+
+        async def run(count):
+            return await asyncio.gather(*(product_list(request) for _ in range(count)))
+
+        try:
+            started = time.perf_counter()
+            responses = asyncio.run(run(20))
+            elapsed = time.perf_counter() - started
+        finally:
+            set_store(previous)
+
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        # Each request makes 3 sequential round trips (60ms); run serially 20 would take >= 1.2s
+        self.assertLess(elapsed, 0.6)
+
+class FanOutTest(TransactionTestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Electronics")
+        Product.objects.create(name="Approved", description="", price=1, category=self.category, is_approved=True)
+        Product.objects.create(name="Pending", description="", price=1, category=self.category)
+
+    def run_counts(self, **kwargs):
+        from unittest import mock
+        import time
+        from django.db.backends.utils import CursorWrapper
+        from retailhive.fanout import fan_out
+
+        execute = CursorWrapper._execute
+
+        def slow_execute(self, *args, **kw):
+            # Inject 50ms of network latency into every query
+            time.sleep(0.05)
+            return execute(self, *args, **kw)
+
+        tasks = {
+            'total': Product.objects.count,
+            'approved': Product.objects.filter(is_approved=True).count,
+            'pending': Product.objects.filter(is_approved=False).count,
+            'categories': Category.objects.count,
+        }
+        with mock.patch.object(CursorWrapper, '_execute', slow_execute):
+            started = time.perf_counter()
+            results = fan_out(tasks, **kwargs)
+            return results, time.perf_counter() - started
+
+    def test_wall_time_approaches_slowest_query(self):
+        serial, serial_time = self.run_counts(max_concurrency=1)
+        concurrent, concurrent_time = self.run_counts(max_concurrency=4)
+        self.assertEqual(serial, concurrent)
+        self.assertEqual(concurrent, {'total': 2, 'approved': 1, 'pending': 1, 'categories': 1})
+        self.assertGreaterEqual(serial_time, 0.2)
+        self.assertLess(concurrent_time, serial_time / 2)
+
+    def test_timeout(self):
+        import time
+        from retailhive.fanout import fan_out, FanoutTimeout
+        with self.assertRaises(FanoutTimeout):
+            fan_out({'slow': lambda: time.sleep(0.5), 'fast': lambda: 1}, timeout=0.1)
+
+    def test_abandoned_work_holds_the_site_slot(self):
+        import threading
+        from retailhive.fanout import fan_out, FanoutTimeout
+        release = threading.Event()
+        with self.settings(FANOUT={'MAX_PER_SITE': 1}):
+            with self.assertRaises(FanoutTimeout):
+                fan_out({'a': release.wait, 'b': release.wait}, timeout=0.05, site='test_slots')
+            # The abandoned tasks still hold the slot, so this runs inline
+            self.assertEqual(fan_out({'a': threading.get_ident, 'b': threading.get_ident}, site='test_slots'),
+                             {'a': threading.get_ident(), 'b': threading.get_ident()})
+            release.set()
+
+class ProductDetailTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(
+            name="Reviewed", description="", price=1, category=self.category
+        )
+        self.users = [User.objects.create_user(username=f'u{i}', password='testpass') for i in range(12)]
+        for i, user in enumerate(self.users):
+            ProductReview.objects.create(product=self.product, user=user, rating=i % 5 + 1)
+
+    def test_summary_is_maintained_by_signals(self):
+        from .signals import rebuild_rating_summaries
+        summary = ProductRatingSummary.objects.get(product=self.product)
+        self.assertEqual(summary.histogram, {'1': 3, '2': 3, '3': 2, '4': 2, '5': 2})
+        
+        review = ProductReview.objects.filter(product=self.product, rating=1).first()
+        review.rating = 5
+        review.save()
+        ProductReview.objects.filter(product=self.product, rating=2).first().delete()
+        summary.refresh_from_db()
+        self.assertEqual(summary.histogram, {'1': 2, '2': 2, '3': 2, '4': 2, '5': 3})
+        
+        ProductRatingSummary.objects.all().delete()
+        rebuild_rating_summaries()
+        self.assertEqual(ProductRatingSummary.objects.get(product=self.product).histogram, summary.histogram)
+
+    def test_detail_embeds_summary_and_first_page(self):
+        # Product + summary in one query, first page of reviews in another
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/products/products/{self.product.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rating_summary']['count'], 12)
+        self.assertEqual(len(response.data['reviews']), 10)
+        self.assertIsNotNone(response.data['reviews_next_cursor'])
+
+    def test_keyset_pages_cover_all_reviews(self):
+        for sort in ['recent', 'highest', 'lowest']:
+            seen, cursor = [], None
+            while True:
+                params = {'sort': sort, 'page_size': 5}
+                if cursor:
+                    params['cursor'] = cursor
+                response = self.client.get(f'/api/products/products/{self.product.id}/reviews/', params)
+                seen += response.data['results']
+                cursor = response.data['next_cursor']
+                if not cursor:
+                    break
+            self.assertEqual(len({r['id'] for r in seen}), 12)
+            ratings = [r['rating'] for r in seen]
+            if sort != 'recent':
+                self.assertEqual(ratings, sorted(ratings, reverse=sort == 'highest'))
+        
+        response = self.client.get(f'/api/products/products/{self.product.id}/reviews/', {'cursor': 'junk'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class CategoryTreeTest(APITestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name="Electronics")
+        self.phones = Category.objects.create(name="Phones", parent=self.root)
+        self.laptops = Category.objects.create(name="Laptops", parent=self.root)
+
+    def listed(self, category, **kwargs):
+        return Product.objects.create(
+            name="P", description="", price=1, category=category, is_approved=True, **kwargs
+        )
+
+    def counts(self):
+        return {
+            c.name: (c.product_count, c.subtree_product_count)
+            for c in Category.objects.all()
+        }
+
+    def test_counts_follow_product_changes(self):
+        phone = self.listed(self.phones)
+        self.listed(self.laptops)
+        Product.objects.create(name="Unapproved", description="", price=1, category=self.phones)
+        self.assertEqual(self.counts(), {'Electronics': (0, 2), 'Phones': (1, 1), 'Laptops': (1, 1)})
+
+        phone.category = self.laptops
+        phone.save()
+        self.assertEqual(self.counts(), {'Electronics': (0, 2), 'Phones': (0, 0), 'Laptops': (2, 2)})
+
+        phone.is_active = False
+        phone.save()
+        Product.objects.filter(category=self.laptops, is_active=True).delete()
+        self.assertEqual(self.counts(), {'Electronics': (0, 0), 'Phones': (0, 0), 'Laptops': (0, 0)})
+
+    def test_moving_a_subtree_and_recount(self):
+        from .categories import recount_categories
+        self.listed(self.phones)
+        self.listed(self.phones)
+        self.phones.parent = self.laptops
+        self.phones.save()
+        self.assertEqual(self.phones.depth, 2)
+        self.assertTrue(self.phones.path.startswith(self.laptops.path))
+        self.assertEqual(self.counts(), {'Electronics': (0, 2), 'Phones': (2, 2), 'Laptops': (0, 2)})
+        with self.assertRaises(ValueError):
+            self.root.parent = self.phones
+            self.root.save()
+
+        # Bulk paths skip signals and recount explicitly
+        Product.objects.update(is_approved=False)
+        recount_categories([self.phones.id])
+        self.assertEqual(self.counts(), {'Electronics': (0, 0), 'Phones': (0, 0), 'Laptops': (0, 0)})
+
+    def test_list_is_in_tree_order_with_counts(self):
+        self.listed(self.laptops)
+        response = self.client.get('/api/products/categories/')
+        self.assertEqual([c['name'] for c in response.data], ['Electronics', 'Phones', 'Laptops'])
+        self.assertEqual(response.data[0]['subtree_product_count'], 1)
+        self.assertEqual(response.data[2]['depth'], 1)
+
+class FacetSearchTest(APITestCase):
+    def setUp(self):
+        from .facets import reset_index
+        reset_index()
+        self.addCleanup(reset_index)
+        self.user = User.objects.create_user(username='rater', password='testpass')
+        self.root = Category.objects.create(name="Electronics")
+        self.phones = Category.objects.create(name="Phones", parent=self.root)
+        self.books = Category.objects.create(name="Books")
+        self.cheap_phone = Product.objects.create(name="Cheap phone", description="", price=20, category=self.phones, stock_quantity=0)
+        self.phone = Product.objects.create(name="Phone", description="", price=300, category=self.phones, stock_quantity=5)
+        self.book = Product.objects.create(name="Book", description="", price=15, category=self.books, stock_quantity=2)
+        Product.objects.create(name="Hidden", description="", price=15, category=self.books, is_active=False)
+        ProductReview.objects.create(product=self.phone, user=self.user, rating=5)
+
+    def facets(self, **params):
+        from .facets import reset_index
+        reset_index()
+        return self.client.get('/api/products/products/facets/', params).data
+
+    def counts(self, data, facet, key):
+        return {item[key]: item['count'] for item in data['facets'][facet]}
+
+    def test_filters_and_disjunctive_counts(self):
+        data = self.facets()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(self.counts(data, 'category', 'name'), {'Electronics': 2, 'Phones': 2, 'Books': 1})
+        self.assertEqual(self.counts(data, 'price', 'key')['0-25'], 2)
+        self.assertEqual(data['facets']['in_stock'], 2)
+
+        data = self.facets(category=self.root.id, in_stock='1')
+        self.assertEqual([p['name'] for p in data['results']], ['Phone'])
+        # The category facet ignores its own filter but applies in_stock
+        self.assertEqual(self.counts(data, 'category', 'name'), {'Electronics': 1, 'Phones': 1, 'Books': 1})
+        self.assertEqual(data['facets']['in_stock'], 1)
+
+        data = self.facets(min_rating=4, price='250-500,0-25')
+        self.assertEqual([p['name'] for p in data['results']], ['Phone'])
+        self.assertEqual(self.counts(data, 'rating', 'min')[4], 1)
+
+        data = self.facets(q='phone', page_size=1, offset=1)
+        self.assertEqual((data['count'], [p['name'] for p in data['results']]), (2, ['Cheap phone']))
+
+    def test_index_is_rebuilt_after_changes(self):
+        from .facets import get_index
+        with self.settings(FACET_INDEX={'MIN_REBUILD_INTERVAL': 0}):
+            self.assertEqual(get_index().query()[0], 3)
+            self.book.is_active = False
+            self.book.save()
+            self.assertEqual(get_index().query()[0], 2)
+
+    def test_rebuild_runs_in_background_and_serves_previous_index(self):
+        import threading
+        from unittest import mock
+        from . import facets
+        previous = facets.get_index()
+        new = facets.FacetIndex([0])
+        release = threading.Event()
+
+        def slow_build(price_edges):
+            release.wait(5)
+            return new
+
+        facets.mark_stale()
+        with self.settings(FACET_INDEX={'MIN_REBUILD_INTERVAL': 0}), \
+                mock.patch.object(facets, 'in_transaction', return_value=False), \
+                mock.patch.object(facets.FacetIndex, 'build', side_effect=slow_build):
+            self.assertIs(facets.get_index(), previous)
+            builder = next(t for t in threading.enumerate() if t.name == 'facet-rebuild')
+            self.assertIs(facets.get_index(), previous)
+            release.set()
+            builder.join(5)
+        self.assertIs(facets.get_index(), new)
+
+    def test_bulk_approve_marks_index_stale(self):
+        from . import facets
+        facets.get_index()
+        admin = User.objects.create_user(username='admin', password='adminpass', is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.patch('/api/products/admin/products/bulk_approve/', {'product_ids': [self.book.pk]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(facets._stale)
+
+class SuggestTest(APITestCase):
+    def setUp(self):
+        from .suggest import reset_suggest_index
+        reset_suggest_index()
+        self.addCleanup(reset_suggest_index)
+        self.phones = Category.objects.create(name="Phones")
+        self.case = Product.objects.create(name="Phone Case", description="", price=5, category=self.phones)
+        self.phone = Product.objects.create(name="Cheap phone", description="", price=50, category=self.phones)
+
+    def test_word_prefixes_weighted_by_sales(self):
+        from .suggest import SuggestIndex
+        index = SuggestIndex.from_items({
+            ('product', 1): ('Phone Case', 10),
+            ('product', 2): ('Cheap phone', 50),
+            ('product', 3): ('Café crème', 1),
+            ('category', 1): ('Phones', 5),
+        })
+        self.assertEqual([s['text'] for s in index.suggest('ph')], ['Cheap phone', 'Phone Case', 'Phones'])
+        self.assertEqual([s['text'] for s in index.suggest('phone c')], ['Phone Case'])
+        self.assertEqual([s['text'] for s in index.suggest('CAFE')], ['Café crème'])
+
+        index.update('product', 1, 'Laptop sleeve')
+        index.update('product', 2, None)
+        self.assertEqual([s['text'] for s in index.suggest('p')], ['Phones'])
+        self.assertEqual([s['id'] for s in index.suggest('la')], [1])
+
+    def test_endpoint_follows_product_changes(self):
+        response = self.client.get('/api/products/products/suggest/', {'q': 'pho'})
+        self.assertEqual({s['text'] for s in response.data['suggestions']}, {'Phone Case', 'Cheap phone', 'Phones'})
+        
+        self.case.is_active = False
+        self.case.save()
+        response = self.client.get('/api/products/products/suggest/', {'q': 'phone c'})
+        self.assertEqual(response.data['suggestions'], [])
+
+    def test_expired_index_is_rebuilt_in_background(self):
+        import threading
+        from unittest import mock
+        from . import suggest
+        current = suggest.get_suggest_index()
+        rebuilt = suggest.SuggestIndex.from_items({('product', self.case.pk): ('Phone Case', 0)})
+        release = threading.Event()
+
+        def slow_build():
+            release.wait(5)
+            return rebuilt
+
+        with self.settings(SUGGEST={'MAX_AGE': 0}), \
+                mock.patch.object(suggest, 'in_transaction', return_value=False), \
+                mock.patch.object(suggest.SuggestIndex, 'build', side_effect=slow_build):
+            self.assertIs(suggest.get_suggest_index(), current)
+            builder = next(t for t in threading.enumerate() if t.name == 'suggest-rebuild')
+            self.assertIs(suggest.get_suggest_index(), current)
+            # Made during the build, so replayed onto the new index
+            Product.objects.create(name="Phablet", description="", price=50, category=self.phones)
+            release.set()
+            builder.join(5)
+        index = suggest.get_suggest_index()
+        self.assertIs(index, rebuilt)
+        self.assertEqual({s['text'] for s in index.suggest('ph')}, {'Phone Case', 'Phablet'})
+
+    def test_bulk_reject_removes_suggestions(self):
+        from .suggest import get_suggest_index
+        get_suggest_index()
+        admin = User.objects.create_user(username='admin', password='adminpass', is_staff=True)
+        self.client.force_authenticate(admin)
+        before = Product.objects.get(pk=self.case.pk).updated_at
+        self.client.patch('/api/products/admin/products/bulk_reject/', {'product_ids': [self.case.pk]}, format='json')
+        self.assertGreater(Product.objects.get(pk=self.case.pk).updated_at, before)
+        self.assertEqual(get_suggest_index().suggest('phone c'), [])
+
+    def test_snapshot_round_trip_and_lookup_speed(self):
+        import tempfile
+        import time
+        from .suggest import SuggestIndex, save_index_snapshot, load_index_snapshot
+        with tempfile.TemporaryDirectory() as directory, self.settings(SNAPSHOT_DIR=directory):
+            save_index_snapshot(SuggestIndex.build())
+            Product.objects.create(name="Phablet", description="", price=50, category=self.phones)
+            index = load_index_snapshot(max_age=60)
+        self.assertIn('Phablet', [s['text'] for s in index.suggest('ph', 20)])
+
+        index = SuggestIndex.from_items({('product', i): (f'Product {i} model {i % 97}', i % 13) for i in range(20000)})
+        prefixes = ['p', 'pr', 'prod', 'product 1', 'product 123', 'model 5', 'm']
+        for prefix in prefixes:
+            index.suggest(prefix)  # fills the cache for large ranges
+        started = time.perf_counter()
+        for _ in range(100):
+            for prefix in prefixes:
+                index.suggest(prefix)
+        self.assertLess((time.perf_counter() - started) / (100 * len(prefixes)), 0.001)
+
+class RankingTest(APITestCase):
+    def setUp(self):
+        from .ranking import reset_ranking_service
+        reset_ranking_service()
+        self.addCleanup(reset_ranking_service)
+        self.user = User.objects.create_user(username='shopper', password='pass12345')
+        self.electronics = Category.objects.create(name="Electronics")
+        self.phones = Category.objects.create(name="Phones", parent=self.electronics)
+        self.books = Category.objects.create(name="Books")
+        self.phone = Product.objects.create(name="Phone", description="", price=100, category=self.phones, is_approved=True)
+        self.book = Product.objects.create(name="Book", description="", price=10, category=self.books, is_approved=True)
+
+    def order(self, product, quantity):
+        from apps.orders.models import Order, OrderItem
+        order = Order.objects.create(user=self.user, total_amount=product.price * quantity, shipping_address='1 Main St')
+        OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
+
+    def test_decay_keeps_recent_events_ahead(self):
+        from .ranking import RankingBoard
+        board = RankingBoard(half_life_hours=1, weights={'order': 1}, t0=0)
+        board.add(1, 4, 0, listing=10)
+        board.add(2, 1, 2 * 3600, listing=20)
+        # Two half-lives later product 1's 4 units are worth 1, so a single new unit ties
+        (first, first_score), (second, second_score) = board.top(2, now=2 * 3600)
+        self.assertAlmostEqual(first_score, 1)
+        self.assertAlmostEqual(second_score, 1)
+        board.add(2, 1, 3 * 3600, listing=20)
+        self.assertEqual([pk for pk, _ in board.top(2, now=3 * 3600)], [2, 1])
+        self.assertEqual([pk for pk, _ in board.top(2, category_ids=[10])], [1])
+
+        board.rebase(100 * 3600)
+        self.assertEqual([pk for pk, _ in board.top(2)], [2, 1])
+
+    def test_endpoints_follow_orders_and_listing(self):
+        self.order(self.book, 1)
+        response = self.client.get('/api/products/products/top_sellers/')
+        self.assertEqual([p['id'] for p in response.data['results']], [self.book.id])
+
+        # Events after the first read are applied incrementally
+        self.order(self.phone, 3)
+        response = self.client.get('/api/products/products/top_sellers/')
+        self.assertEqual([p['id'] for p in response.data['results']], [self.phone.id, self.book.id])
+        self.assertAlmostEqual(response.data['results'][0]['score'], 3, places=2)
+
+        response = self.client.get('/api/products/products/trending/', {'category': self.electronics.id})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.phone.id])
+
+        self.phone.is_active = False
+        self.phone.save()
+        response = self.client.get('/api/products/products/top_sellers/', {'limit': 1})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.book.id])
+
+    def test_bulk_approval_updates_listings(self):
+        from .ranking import get_ranking_service
+        self.order(self.book, 1)
+        self.order(self.phone, 3)
+        admin = User.objects.create_user(username='admin', password='adminpass', is_staff=True)
+        self.client.force_authenticate(admin)
+        self.client.patch('/api/products/admin/products/bulk_reject/', {'product_ids': [self.phone.id]}, format='json')
+        self.assertEqual([pk for pk, _ in get_ranking_service().top('top_sellers')], [self.book.id])
+        self.assertEqual([p['id'] for p in self.client.get('/api/products/admin/products/dashboard_stats/').data['top_products']],
+                         [self.book.id])
+
+        Product.objects.filter(pk=self.phone.pk).update(is_active=True)
+        self.client.patch('/api/products/admin/products/bulk_approve/', {'product_ids': [self.phone.id]}, format='json')
+        self.assertEqual([pk for pk, _ in get_ranking_service().top('top_sellers')], [self.phone.id, self.book.id])
+
+        # A product hidden without a signal is still never shown
+        Product.objects.filter(pk=self.book.pk).update(is_approved=False)
+        response = self.client.get('/api/products/products/top_sellers/')
+        self.assertEqual([p['id'] for p in response.data['results']], [self.phone.id])
+
+    def test_build_matches_incremental_and_snapshot_reloads(self):
+        import tempfile
+        from .ranking import RankingService, save_rankings_snapshot, get_ranking_service, reset_ranking_service
+        self.order(self.book, 2)
+        self.order(self.phone, 1)
+        from apps.orders.models import Cart, CartItem
+        ProductReview.objects.create(product=self.phone, user=self.user, rating=5, comment='Great')
+        CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=self.phone, quantity=2)
+        service = RankingService.build()
+        self.assertEqual([pk for pk, _ in service.top('top_sellers')], [self.book.id, self.phone.id])
+        self.assertEqual([pk for pk, _ in service.top('trending')], [self.phone.id, self.book.id])
+
+        with tempfile.TemporaryDirectory() as directory, self.settings(SNAPSHOT_DIR=directory):
+            save_rankings_snapshot(service)
+            reset_ranking_service()
+            loaded = get_ranking_service()
+        self.assertIsNot(loaded, service)
+        self.assertEqual([pk for pk, _ in loaded.top('trending')], [self.phone.id, self.book.id])
+
+class RecommendationsTest(APITestCase):
+    def setUp(self):
+        from apps.orders.models import Order, OrderItem
+        from .recommendations import reset_recommendations
+        reset_recommendations()
+        self.addCleanup(reset_recommendations)
+        self.user = User.objects.create_user(username='shopper', password='pass12345')
+        self.category = Category.objects.create(name="Office")
+        self.pen, self.ink, self.paper, self.stapler = [
+            Product.objects.create(name=name, description="", price=5, category=self.category, is_approved=True)
+            for name in ('Pen', 'Ink', 'Paper', 'Stapler')
+        ]
+        baskets = [
+            [self.pen, self.ink], [self.pen, self.ink], [self.pen, self.ink, self.paper],
+            [self.paper, self.stapler], [self.paper, self.stapler], [self.pen],
+        ]
+        for basket in baskets:
+            order = Order.objects.create(user=self.user, total_amount=5, shipping_address='1 Main St')
+            OrderItem.objects.bulk_create([OrderItem(order=order, product=p, quantity=1, price=5) for p in basket])
+
+    def test_pairs_counted_and_pruned(self):
+        from .recommendations import build_recommendations
+        neighbors, stats = build_recommendations(top_n=1, min_count=2, chunk_size=3, shards=2, use_numpy=False)
+        self.assertEqual(stats['order_items'], 12)
+        self.assertEqual([pk for pk, _ in neighbors[self.pen.id]], [self.ink.id])
+        self.assertEqual([pk for pk, _ in neighbors[self.stapler.id]], [self.paper.id])
+        # Pen/paper were bought together once, below min_count
+        self.assertNotIn(self.paper.id, [pk for pk, _ in neighbors[self.pen.id]])
+        # cosine: 3 shared orders / sqrt(4 pen orders * 3 ink orders)
+        self.assertAlmostEqual(neighbors[self.pen.id][0][1], 3 / (12 ** 0.5), places=4)
+
+    @skipUnless(__import__('importlib').util.find_spec('numpy'), 'NumPy is not installed')
+    def test_numpy_matches_python(self):
+        from .recommendations import build_recommendations
+        options = {'top_n': 3, 'min_count': 1, 'chunk_size': 4, 'shards': 3}
+        self.assertEqual(
+            build_recommendations(use_numpy=True, **options)[0],
+            build_recommendations(use_numpy=False, **options)[0],
+        )
+
+    def test_product_and_cart_endpoints(self):
+        import tempfile
+        from apps.orders.models import Cart, CartItem
+        from .recommendations import build_recommendations, save_recommendations
+        with tempfile.TemporaryDirectory() as directory, self.settings(SNAPSHOT_DIR=directory):
+            save_recommendations(build_recommendations(min_count=1)[0])
+            response = self.client.get(f'/api/products/products/{self.pen.id}/bought_together/')
+            self.assertEqual([p['id'] for p in response.data['results']], [self.ink.id, self.paper.id])
+
+            CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=self.pen, quantity=1)
+            CartItem.objects.create(cart=Cart.objects.get(user=self.user), product=self.stapler, quantity=1)
+            self.client.force_authenticate(self.user)
+            response = self.client.get('/api/orders/cart/recommendations/')
+        self.assertEqual([p['id'] for p in response.data['results']], [self.paper.id, self.ink.id])
+
+class StockReconciliationTest(TestCase):
+    def setUp(self):
+        from apps.orders.models import Order, OrderItem
+        self.user = User.objects.create_user(username='shopper', password='pass12345')
+        self.category = Category.objects.create(name="Office")
+        self.pen = Product.objects.create(name="Pen", description="", price=1, category=self.category, stock_quantity=20)
+        self.ink = Product.objects.create(name="Ink", description="", price=1, category=self.category, stock_quantity=10)
+        order = Order.objects.create(user=self.user, total_amount=5, shipping_address='1 Main St')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.pen, quantity=3, price=1),
+            OrderItem(order=order, product=self.ink, quantity=2, price=1),
+        ])
+        Product.objects.filter(pk__in=[self.pen.pk, self.ink.pk]).update(stock_quantity=F('stock_quantity') - 2)
+
+    def run_reconcile(self, **options):
+        from .reconcile import reconcile
+        return reconcile(**options)
+
+    def test_expected_stock_from_events(self):
+        from .inventory import restore_stock
+        restore_stock({self.pen.pk: 1})
+        # Pen: set 20, -3 ordered, +1 restocked = 18, but stock is 19; ink matches
+        mismatches, stats = self.run_reconcile(chunk_size=1, use_numpy=False)
+        self.assertEqual(mismatches, {self.pen.pk: (19, 18)})
+        self.assertEqual(stats['order_items'], 2)
+
+    @skipUnless(__import__('importlib').util.find_spec('numpy'), 'NumPy is not installed')
+    def test_numpy_matches_python(self):
+        self.pen.stock_quantity = 5
+        self.pen.save()
+        self.assertEqual(self.run_reconcile(use_numpy=True)[0], self.run_reconcile(use_numpy=False)[0])
+
+    def test_apply_sets_new_baseline(self):
+        from .reconcile import apply_corrections
+        mismatches, _ = self.run_reconcile(use_numpy=False)
+        self.assertEqual(apply_corrections(mismatches), {self.pen.pk: 17})
+        self.assertEqual(Product.objects.get(pk=self.pen.pk).stock_quantity, 17)
+        self.assertEqual(self.run_reconcile(use_numpy=False)[0], {})
+
+class StartupImportTest(SimpleTestCase):
+    def test_parse_importtime(self):
+        from retailhive.importtime import parse_importtime, total_ms, by_package
+        rows = parse_importtime(
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       200 |        200 |   django.utils\n'
+            'import time:       300 |        500 | django\n'
+            'import time:      1000 |       1000 | numpy\n'
+        )
+        self.assertEqual(rows[0], ('django.utils', 200, 200, 1))
+        self.assertEqual(total_ms(rows), 1.5)
+        self.assertEqual(by_package(rows), [('numpy', 1.0, 1), ('django', 0.5, 2)])
+
+    def test_cold_start_within_budget(self):
+        from django.conf import settings
+        from retailhive.importtime import profile_startup, total_ms, deferred_imports, get_config
+        rows = profile_startup()
+        self.assertEqual(deferred_imports(rows), [])
+        imported = {name for name, _, _, _ in rows}
+        if not any(db.get('ENGINE') == 'djongo' for db in settings.DATABASES.values()):
+            self.assertNotIn('djongo', imported)
+            self.assertNotIn('pymongo', imported)
+        self.assertLess(total_ms(rows), get_config()['IMPORT_BUDGET_MS'])
+
+class RenderingTest(APITestCase):
+    def setUp(self):
+        from .catalog import reset_catalog
+        reset_catalog()
+        self.addCleanup(reset_catalog)
+
+    def test_fast_renderer_matches_json_renderer(self):
+        import datetime
+        from decimal import Decimal
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        from retailhive.renderers import FastJSONRenderer
+        data = {
+            'price': Decimal('19.99'),
+            'created_at': datetime.datetime(2024, 1, 2, 3, 4, 5, 678000, tzinfo=datetime.timezone.utc),
+            'local': datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone(datetime.timedelta(hours=5, minutes=30))),
+            'day': datetime.date(2024, 1, 2),
+            'counts': {1: 2, 3: 4},
+            'label': gettext_lazy('Electronics'),
+            'text': 'line\u2028break é',
+            'nested': [(1, 2.5), None, True],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render({'big': 2 ** 70}), JSONRenderer().render({'big': 2 ** 70}))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_large_responses_are_compressed(self):
+        import gzip
+        import json
+        category = Category.objects.create(name="Electronics")
+        Product.objects.bulk_create([
+            Product(name=f"Product {i}", description="Long description " * 10, price=10, category=category,
+                    stock_quantity=5, is_approved=True)
+            for i in range(20)
+        ])
+        response = self.client.get('/api/products/products/', HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))), 20)
+
+        plain = self.client.get('/api/products/products/', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        small = self.client.get('/api/products/categories/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+class CatalogSnapshotTest(APITestCase):
+    def setUp(self):
+        import tempfile
+        from .catalog import reset_catalog
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        overrides = self.settings(SNAPSHOT_DIR=directory.name, CATALOG_SNAPSHOT=self.config())
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        reset_catalog()
+        self.addCleanup(reset_catalog)
+
+        self.user = User.objects.create_user(username='shopper', password='shopperpass')
+        self.root = Category.objects.create(name="Electronics")
+        self.phones = Category.objects.create(name="Phones", parent=self.root)
+        self.books = Category.objects.create(name="Books")
+        self.phone = Product.objects.create(name="Phone", description="", price=100, category=self.phones, is_approved=True)
+        Product.objects.create(name="Tablet", description="", price=200, category=self.root, is_approved=True)
+        Product.objects.create(name="Novel", description="", price=10, category=self.books)
+        Product.objects.create(name="Retired", description="", price=5, category=self.books, is_active=False)
+
+    def config(self, **overrides):
+        return {'BASE_URL': 'http://testserver', **overrides}
+
+    def rebuild(self):
+        # Requests never build inside the test transaction; the background rebuild does this
+        from .catalog import rebuild
+        self.assertIsNotNone(rebuild())
+
+    def authenticated(self, url, **extra):
+        self.client.force_authenticate(self.user)
+        try:
+            return self.client.get(url, **extra)
+        finally:
+            self.client.force_authenticate(None)
+
+    def test_anonymous_list_is_served_from_snapshot(self):
+        import gzip
+        import os
+        first = self.client.get('/api/products/products/')
+        self.assertEqual([p['name'] for p in first.json()], ['Phone', 'Tablet', 'Novel'])
+        self.assertEqual(os.listdir(self.directory), [])
+        self.rebuild()
+        self.assertEqual(first.content, self.authenticated('/api/products/products/').content)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/products/products/', HTTP_ACCEPT_ENCODING='gzip')
+            not_modified = self.client.get('/api/products/products/', HTTP_IF_NONE_MATCH=cached['ETag'])
+        self.assertEqual(cached['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(cached.content), first.content)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_pages_and_categories_match_database_path(self):
+        from django.test import override_settings
+        with override_settings(CATALOG_SNAPSHOT=self.config(PAGE_SIZE=2)):
+            self.rebuild()
+            for url in ['/api/products/products/?page=2', f'/api/products/products/?category={self.root.id}',
+                        f'/api/products/products/?category={self.root.id}&page=1', '/api/products/products/?page=3',
+                        '/api/products/products/?category=999999']:
+                anonymous = self.client.get(url)
+                self.assertEqual((anonymous.status_code, anonymous.content),
+                                 (self.authenticated(url).status_code, self.authenticated(url).content), url)
+            self.assertEqual(self.client.get('/api/products/products/?page=2').json()['count'], 3)
+            self.assertEqual(self.client.get('/api/products/products/?page=3').status_code, status.HTTP_404_NOT_FOUND)
+            self.assertEqual(self.client.get('/api/products/products/?page=x').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_changes_are_visible_immediately(self):
+        self.rebuild()
+        self.phone.price = 150
+        self.phone.save()
+        Product.objects.filter(pk=self.phone.pk).update(stock_quantity=0)
+        from .inventory import restore_stock
+        restore_stock({self.phone.pk: 4})
+
+        # Until a rebuild the list comes from the database...
+        data = self.client.get('/api/products/products/').json()
+        self.assertEqual((data[0]['price'], data[0]['stock_quantity']), ('150.00', 4))
+        # ...and afterwards from the rebuilt snapshot
+        self.rebuild()
+        with self.assertNumQueries(0):
+            data = self.client.get('/api/products/products/').json()
+        self.assertEqual((data[0]['price'], data[0]['stock_quantity']), ('150.00', 4))
+
+    def test_stale_request_rebuilds_in_background(self):
+        import threading
+        from unittest import mock
+        from django.test import override_settings
+        from . import catalog
+        release = threading.Event()
+        with override_settings(CATALOG_SNAPSHOT=self.config(MIN_REBUILD_INTERVAL=0)), \
+                mock.patch.object(catalog, 'in_transaction', return_value=False), \
+                mock.patch.object(catalog, 'build_catalog', side_effect=lambda base_url: release.wait(5)) as build:
+            response = self.client.get('/api/products/products/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            builder = next(t for t in threading.enumerate() if t.name == 'catalog-rebuild')
+            release.set()
+            builder.join(5)
+        build.assert_called_once_with('http://testserver')
+
+    def test_stale_snapshot_is_not_served_while_rebuilding(self):
+        import threading
+        from unittest import mock
+        from django.test import override_settings
+        from . import catalog
+        self.rebuild()
+        self.phone.is_active = False
+        self.phone.save()
+        release = threading.Event()
+        with override_settings(CATALOG_SNAPSHOT=self.config(MIN_REBUILD_INTERVAL=0)), \
+                mock.patch.object(catalog, 'in_transaction', return_value=False), \
+                mock.patch.object(catalog, 'build_catalog', side_effect=lambda base_url: release.wait(5)):
+            for _ in range(2):
+                names = [p['name'] for p in self.client.get('/api/products/products/').json()]
+                self.assertEqual(names, ['Tablet', 'Novel'])
+            builder = next(t for t in threading.enumerate() if t.name == 'catalog-rebuild')
+            release.set()
+            builder.join(5)
+        # The build produced no newer snapshot, so the old one is still not trusted
+        self.assertIsNone(catalog.get_snapshot())
+
+    def test_other_hosts_and_databases_use_database_path(self):
+        from unittest import mock
+        from . import catalog
+        self.rebuild()
+        with self.assertNumQueries(0):
+            self.client.get('/api/products/products/')
+        response = self.client.get('/api/products/products/', HTTP_HOST='evil.example')
+        # Served from the database, not from (or into) the snapshot
+        self.assertNotIn('ETag', response)
+
+        catalog.reset_catalog()
+        with mock.patch.object(catalog, 'database_fingerprint', return_value='another database'):
+            self.assertIsNone(catalog.CatalogSnapshot.load())
+
+class ChangeFeedTest(APITestCase):
+    def setUp(self):
+        overrides = self.settings(CHANGE_FEED={'SETTLE_SECONDS': 0})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.admin = User.objects.create_user(username='admin', password='adminpass', is_staff=True)
+        self.category = Category.objects.create(name="Electronics")
+        self.product = Product.objects.create(
+            name="Phone", description="", price=100, category=self.category, stock_quantity=5, is_approved=True
+        )
+
+    def feed(self, since=0, limit=None):
+        params = {'since': since, **({'limit': limit} if limit else {})}
+        return self.client.get('/api/products/products/changes/', params)
+
+    def test_mutations_are_logged_in_sequence(self):
+        from .inventory import reserve_stock
+        self.product.price = 120
+        self.product.save()
+        self.product.name = "Phone 2"
+        self.product.save()   # untracked field: no entry
+        reserve_stock({self.product.pk: 2})
+        self.client.force_authenticate(self.admin)
+        self.client.patch('/api/products/admin/products/bulk_reject/', {'product_ids': [self.product.pk]}, format='json')
+        self.client.force_authenticate(None)
+        product_id = self.product.pk
+        self.product.refresh_from_db()
+        self.product.delete()
+
+        seen, since, more = [], 0, True
+        while more:
+            data = self.feed(since, limit=2).json()
+            seen += data['results']
+            since, more = data['next_since'], data['has_more']
+        self.assertEqual([entry['changes'] for entry in seen],
+                         [['created'], ['price'], ['stock'], ['approval', 'active'], ['deleted']])
+        self.assertEqual([entry['seq'] for entry in seen], sorted(entry['seq'] for entry in seen))
+        self.assertEqual((seen[2]['price'], seen[2]['stock_quantity']), ('120.00', 3))
+        self.assertEqual(seen[-1]['product'], product_id)
+        self.assertEqual(self.feed(since).json(), {'results': [], 'next_since': since, 'has_more': False})
+
+    def test_unsettled_entries_are_held_back(self):
+        with self.settings(CHANGE_FEED={'SETTLE_SECONDS': 60}):
+            self.assertEqual(self.feed().json()['results'], [])
+        self.assertEqual(len(self.feed().json()['results']), 1)
+        self.assertEqual(self.feed(since=-1).status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Without since, only the cursor to follow from
+        current = self.client.get('/api/products/products/changes/').json()
+        self.assertEqual((current['results'], current['next_since']), ([], self.feed().json()['next_since']))
+
+    def test_compaction_keeps_latest_state(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .changes import compact
+        from .models import ProductChange
+        gone = Product.objects.create(name="Gone", description="", price=1, category=self.category)
+        gone.delete()
+        self.product.price = 90
+        self.product.save()
+        ProductChange.objects.update(created_at=timezone.now() - timedelta(days=30))
+        last = ProductChange.objects.order_by('id').last()
+        self.product.stock_quantity = 7
+        self.product.save()
+
+        removed, point = compact(retention_days=7)
+        # The old "Phone" entries are superseded by the new one and "Gone" is dropped entirely
+        self.assertEqual(removed, 4)
+        self.assertEqual(point, last.id - 1)
+        self.assertEqual(self.feed(point - 1).status_code, status.HTTP_410_GONE)
+        results = self.feed().json()['results']
+        self.assertEqual([(entry['changes'], entry['price'], entry['stock_quantity']) for entry in results],
+                         [(['stock'], '90.00', 7)])
+        self.assertEqual(self.feed(point).json()['results'], results)
+
+        # A product whose last entry is old keeps it
+        self.assertEqual(compact(retention_days=0), (0, point))
@@ -3,6 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import ProductViewSet, CategoryViewSet
 from .retailer_views import RetailerProductViewSet
 from .admin_views import AdminProductViewSet
+from . import async_views
 
 # Public router
 router = DefaultRouter()
@@ -18,6 +19,8 @@ admin_router = DefaultRouter()
 admin_router.register(r'products', AdminProductViewSet, basename='admin-product')
 
 urlpatterns = [
+    path('async/products/', async_views.product_list, name='async_product_list'),
+    path('async/products/search/', async_views.product_search, name='async_product_search'),
     path('', include(router.urls)),
     path('retailer/', include(retailer_router.urls)),
     path('admin/', include(admin_router.urls)),
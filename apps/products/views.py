@@ -4,10 +4,17 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, AllowAny
 from django.db.models import Q
 from .models import Product, Category, ProductReview
-from .serializers import ProductSerializer, CategorySerializer, ProductReviewSerializer, ProductCreateSerializer
+from .serializers import ProductSerializer, ProductDetailSerializer, CategorySerializer, ProductReviewSerializer, ProductCreateSerializer, ProductChangeSerializer
+from .pagination import review_page, parse_page_size
+from .facets import get_index, search_bits, FACET_PAGE_SIZE, MAX_FACET_PAGE_SIZE
+from .suggest import get_suggest_index, DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS
+from .ranking import top_products, subtree_ids, DEFAULT_TOP_K, MAX_TOP_K
+from .recommendations import DEFAULT_RECOMMENDATIONS, MAX_RECOMMENDATIONS
+from .changes import changes_since, current_sequence
+from . import catalog, recommendations
 
 class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.all()
+    queryset = Category.objects.order_by('path')
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
     pagination_class = None
@@ -15,8 +22,8 @@ class CategoryViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         """Override list to handle djongo issues"""
         try:
-            # Get all categories without complex queries
-            categories = list(Category.objects.all())
+            # All categories in tree order (parents before children), with cached product counts
+            categories = list(self.get_queryset())
             serializer = self.get_serializer(categories, many=True)
             return Response(serializer.data)
         except Exception as e:
@@ -24,25 +31,54 @@ class CategoryViewSet(viewsets.ModelViewSet):
             return Response([])
 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('category', 'retailer').prefetch_related('reviews__user')
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
     pagination_class = None
     
+    def get_queryset(self):
+        # Single-product actions must not prefetch every review
+        if self.action in ['retrieve', 'reviews', 'add_review']:
+            return Product.objects.select_related('category', 'retailer', 'rating_summary')
+        return super().get_queryset()
+    
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return ProductCreateSerializer
+        if self.action == 'retrieve':
+            return ProductDetailSerializer
         return ProductSerializer
     
     def list(self, request, *args, **kwargs):
-        """Override list to handle djongo issues"""
+        """
+        List active products, optionally within a category subtree (?category=)
+        or one page at a time (?page=). Anonymous requests are served from the
+        pre-rendered catalog snapshot when it is current
+        """
         try:
-            # Get all products without complex filtering
-            products = list(Product.objects.all())
-            # Filter active products in Python instead of database
-            active_products = [p for p in products if getattr(p, 'is_active', True)]
-            serializer = self.get_serializer(active_products, many=True)
-            return Response(serializer.data)
+            category, page = catalog.parse_params(request.query_params)
+        except ValueError:
+            return Response({'error': 'category and page must be positive integers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if not request.user.is_authenticated and request.accepted_renderer.format == 'json':
+            response = catalog.serve(request, category, page)
+            if response is not None:
+                return response
+        
+        try:
+            active_products = catalog.catalog_queryset()
+            if category is not None:
+                active_products = active_products.filter(category_id__in=subtree_ids(category))
+            if page is None:
+                serializer = self.get_serializer(active_products, many=True)
+                return Response(serializer.data)
+            
+            page_size = catalog.get_config()['PAGE_SIZE']
+            envelope = catalog.page_envelope(active_products.count(), page, page_size)
+            if page > envelope['num_pages']:
+                return Response({'error': 'Page not found'}, status=status.HTTP_404_NOT_FOUND)
+            serializer = self.get_serializer(active_products[(page - 1) * page_size:page * page_size], many=True)
+            return Response({**envelope, 'results': serializer.data})
         except Exception as e:
             # Fallback to empty list if there's an error
             return Response([])
@@ -52,23 +88,150 @@ class ProductViewSet(viewsets.ModelViewSet):
         """Search products"""
         query = request.query_params.get('q', '')
         try:
-            products = list(Product.objects.all())
+            products = self.get_queryset().filter(is_active=True)
             if query:
-                # Filter in Python to avoid djongo issues
-                filtered_products = [
-                    p for p in products 
-                    if query.lower() in p.name.lower() or query.lower() in p.description.lower()
-                ]
-            else:
-                filtered_products = products
+                products = products.filter(Q(name__icontains=query) | Q(description__icontains=query))
             
-            # Only return active products
-            active_products = [p for p in filtered_products if getattr(p, 'is_active', True)]
-            serializer = self.get_serializer(active_products, many=True)
+            serializer = self.get_serializer(products, many=True)
             return Response(serializer.data)
         except Exception as e:
             return Response([])
     
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Autocomplete product and category names for ?q= (best sellers first)"""
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', DEFAULT_SUGGESTIONS)), MAX_SUGGESTIONS))
+        except ValueError:
+            limit = DEFAULT_SUGGESTIONS
+        suggestions = get_suggest_index().suggest(request.query_params.get('q', ''), limit)
+        return Response({'suggestions': suggestions})
+    
+    @action(detail=False, methods=['get'])
+    def top_sellers(self, request):
+        """Best sellers by recent units sold (?category=&limit=)"""
+        return self.ranked_response(request, 'top_sellers')
+    
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Products with the most recent orders, cart adds and reviews (?category=&limit=)"""
+        return self.ranked_response(request, 'trending')
+    
+    def ranked_response(self, request, board):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', DEFAULT_TOP_K)), MAX_TOP_K))
+            category = request.query_params.get('category')
+            category_id = int(category) if category else None
+        except ValueError:
+            return Response({'error': 'category and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return self.scored_response(top_products(board, limit, category_id, queryset=self.get_queryset()))
+    
+    def scored_response(self, scored):
+        """Serialize [(product, score)] in order, adding each score to its product"""
+        serializer = self.get_serializer([product for product, _ in scored], many=True)
+        for data, (_, score) in zip(serializer.data, scored):
+            data['score'] = round(score, 4)
+        return Response({'results': serializer.data})
+    
+    @action(detail=True, methods=['get'])
+    def bought_together(self, request, pk=None):
+        """Products frequently bought together with this one (?limit=)"""
+        try:
+            product_id = int(pk)
+            limit = max(1, min(int(request.query_params.get('limit', DEFAULT_RECOMMENDATIONS)), MAX_RECOMMENDATIONS))
+        except ValueError:
+            return Response({'error': 'Product id and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        neighbors = recommendations.for_product(product_id, limit)
+        products = self.get_queryset().filter(is_active=True).in_bulk([pk for pk, _ in neighbors])
+        return self.scored_response([(products[pk], score) for pk, score in neighbors if pk in products])
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Filter active products by category, price bucket, minimum rating and
+        availability, returning one page of products plus facet counts
+        """
+        params = request.query_params
+        try:
+            categories = [int(pk) for value in params.getlist('category') for pk in value.split(',') if pk]
+            min_rating = int(params['min_rating']) if params.get('min_rating') else None
+            offset = max(0, int(params.get('offset', 0)))
+        except ValueError:
+            return Response({'error': 'category, min_rating and offset must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        prices = [key for value in params.getlist('price') for key in value.split(',') if key]
+        page_size = parse_page_size(params.get('page_size'), default=FACET_PAGE_SIZE)
+        
+        index = get_index()
+        query = params.get('q', '').strip()
+        count, ids, counts = index.query(
+            categories=categories,
+            prices=prices,
+            min_rating=min_rating,
+            in_stock=params.get('in_stock') in ('1', 'true'),
+            restrict=search_bits(index, query) if query else None,
+            offset=offset,
+            limit=min(page_size, MAX_FACET_PAGE_SIZE),
+        )
+        
+        products = {product.id: product for product in self.get_queryset().filter(id__in=ids)}
+        serializer = self.get_serializer([products[pk] for pk in ids if pk in products], many=True)
+        return Response({
+            'count': count,
+            'offset': offset,
+            'results': serializer.data,
+            'facets': counts,
+        })
+    
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Product changes after sequence ?since= (0 for the whole log), ?limit=
+        at a time. 410 when since predates the compacted log; without since,
+        just the current cursor
+        """
+        if 'since' not in request.query_params:
+            return Response({'results': [], 'next_since': current_sequence(), 'has_more': False})
+        
+        try:
+            since = int(request.query_params['since'])
+            limit = int(request.query_params['limit']) if request.query_params.get('limit') else None
+            if since < 0 or (limit is not None and limit < 1):
+                raise ValueError
+        except ValueError:
+            return Response({'error': 'since and limit must be non-negative integers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            entries, next_since, more = changes_since(since, limit)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+        
+        return Response({
+            'results': ProductChangeSerializer(entries, many=True).data,
+            'next_since': next_since,
+            'has_more': more,
+        })
+    
+    @action(detail=True, methods=['get'])
+    def reviews(self, request, pk=None):
+        """Keyset-paginated reviews (?sort=recent|highest|lowest&cursor=&page_size=)"""
+        product = self.get_object()
+        try:
+            reviews, next_cursor = review_page(
+                product.pk,
+                sort=request.query_params.get('sort', 'recent'),
+                cursor=request.query_params.get('cursor'),
+                page_size=parse_page_size(request.query_params.get('page_size')),
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'results': ProductReviewSerializer(reviews, many=True).data,
+            'next_cursor': next_cursor,
+        })
+    
     @action(detail=True, methods=['post'])
     def add_review(self, request, pk=None):
         if not request.user.is_authenticated:
@@ -78,10 +241,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             product = self.get_object()
             
             # Check if user already reviewed this product
-            existing_reviews = list(ProductReview.objects.all())
-            user_review = next((r for r in existing_reviews if r.product.id == product.id and r.user.id == request.user.id), None)
-            
-            if user_review:
+            if ProductReview.objects.filter(product=product, user=request.user).exists():
                 return Response({'error': 'You have already reviewed this product'}, status=status.HTTP_400_BAD_REQUEST)
             
             serializer = ProductReviewSerializer(data=request.data)
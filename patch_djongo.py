@@ -1,22 +1,69 @@
 """
 Patch djongo to fix connection issues
+
+djongo closes its MongoClient whenever Django closes a connection, which
+happens at the end of every request, so each request paid a fresh TLS +
+SCRAM handshake. The patched wrapper borrows the process-wide pooled client
+from retailhive.mongo instead and never closes it.
+
+Importing this module has no side effects: ProductsConfig.ready() calls
+apply() once the apps are loaded, and only when a djongo database is
+configured, so settings and SQL-only processes never import djongo or
+pymongo.
 """
+import logging
+import threading
+
 import djongo.base
+from djongo.base import DjongoClient
+
+from retailhive import mongo
+
+logger = logging.getLogger(__name__)
+
+_applied = False
+_lock = threading.Lock()
+
+
+def patched_get_new_connection(self, connection_params):
+    """Hand out a database on the shared pooled client"""
+    name = connection_params.pop('name')
+    enforce_schema = connection_params.pop('enforce_schema')
+
+    self.client_connection = mongo.get_client()
+    database = self.client_connection[name]
+    self.djongo_connection = DjongoClient(database, enforce_schema)
+    return database
 
-# Store the original _close method
-original_close = djongo.base.DatabaseWrapper._close
 
 def patched_close(self):
-    """Patched version of _close that handles connection properly"""
+    """Release the connection without tearing down the shared pool"""
     try:
         if hasattr(self, 'connection') and self.connection is not None:
-            self.connection.close()
             self.connection = None
     except Exception:
         # Ignore any errors during close
         pass
 
-# Apply the patch
-djongo.base.DatabaseWrapper._close = patched_close
 
-print("✅ Djongo connection patch applied")
\ No newline at end of file
+def patched_is_usable(self):
+    """Used by CONN_HEALTH_CHECKS before reusing a persistent connection"""
+    if self.connection is None:
+        return False
+    if not mongo.is_healthy():
+        mongo.reset_client()
+        return False
+    return True
+
+
+def apply():
+    """Install the patched methods on djongo's DatabaseWrapper; safe to call more than once"""
+    global _applied
+    with _lock:
+        if _applied:
+            return
+        djongo.base.DatabaseWrapper.get_new_connection = patched_get_new_connection
+        djongo.base.DatabaseWrapper._close = patched_close
+        djongo.base.DatabaseWrapper.is_usable = patched_is_usable
+        _applied = True
+    logger.debug('Djongo connection patch applied')
@@ -0,0 +1,273 @@
+"""
+Async document stores for the ASGI read path.
+
+The async views talk to a small Motor-compatible subset (find/sort/skip/
+limit/to_list, find_one, count_documents) so one worker can keep many
+database round trips in flight. Three stores implement it:
+
+* MotorStore  - Motor (async pymongo) against the djongo collections
+* OrmStore    - Django's async ORM, for the SQL backends
+* MemoryStore - in-process collections with optional injected latency,
+                used by tests and the bench_async command
+"""
+import asyncio
+import re
+from functools import reduce
+from operator import and_, or_
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Q
+
+_store = None
+
+
+class MemoryCursor:
+    def __init__(self, store, docs, projection=None):
+        self._store = store
+        self._docs = docs
+        self._projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = [(key_or_list, direction or 1)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    async def to_list(self, length=None):
+        await self._store.wait()
+        docs = list(self._docs)
+        for key, direction in reversed(self._sort or []):
+            docs.sort(key=lambda d: (d.get(key) is None, d.get(key)), reverse=direction < 0)
+        docs = docs[self._skip:]
+        limit = min(x for x in (self._limit, length) if x) if (self._limit or length) else None
+        if limit:
+            docs = docs[:limit]
+        return [project(doc, self._projection) for doc in docs]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in await self.to_list():
+            yield doc
+
+
+class MemoryCollection:
+    def __init__(self, store, name):
+        self._store = store
+        self.name = name
+        self.docs = []
+
+    def find(self, filter=None, projection=None):
+        return MemoryCursor(self._store, [d for d in self.docs if matches(d, filter or {})], projection)
+
+    async def find_one(self, filter=None, projection=None):
+        docs = await self.find(filter, projection).limit(1).to_list()
+        return docs[0] if docs else None
+
+    async def count_documents(self, filter):
+        await self._store.wait()
+        return sum(1 for d in self.docs if matches(d, filter))
+
+    async def insert_many(self, docs):
+        self.docs.extend(dict(d) for d in docs)
+
+
+class MemoryStore:
+    """In-process stand-in for Motor; every operation costs latency_ms"""
+
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+        self._collections = {}
+
+    async def wait(self):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+
+class MotorStore:
+    """Motor database on the same cluster and pool options as retailhive.mongo"""
+
+    def __init__(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+        from retailhive import mongo
+
+        options = mongo.get_client_options()
+        options.pop('document_class', None)
+        self._client = AsyncIOMotorClient(**options)
+        self._db = self._client[settings.DATABASES[mongo.get_mongo_alias()]['NAME']]
+
+    def __getitem__(self, name):
+        return self._db[name]
+
+
+class OrmCursor:
+    def __init__(self, model, filter, projection):
+        self._model = model
+        self._filter = filter
+        self._projection = projection
+        self._order = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        keys = [(key_or_list, direction or 1)] if isinstance(key_or_list, str) else key_or_list
+        self._order = [('-' if d < 0 else '') + k for k, d in keys]
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def queryset(self):
+        queryset = self._model._default_manager.filter(to_q(self._filter))
+        if self._order:
+            queryset = queryset.order_by(*self._order)
+        fields = [k for k, v in (self._projection or {}).items() if v]
+        queryset = queryset.values(*fields)
+        end = self._skip + self._limit if self._limit else None
+        return queryset[self._skip:end]
+
+    async def to_list(self, length=None):
+        queryset = self.queryset()
+        if length:
+            queryset = queryset[:length]
+        return [row async for row in queryset]
+
+    def __aiter__(self):
+        return self.queryset().__aiter__()
+
+
+class OrmCollection:
+    def __init__(self, model):
+        self._model = model
+
+    def find(self, filter=None, projection=None):
+        return OrmCursor(self._model, filter or {}, projection)
+
+    async def find_one(self, filter=None, projection=None):
+        docs = await self.find(filter, projection).limit(1).to_list()
+        return docs[0] if docs else None
+
+    async def count_documents(self, filter):
+        return await self._model._default_manager.filter(to_q(filter)).acount()
+
+
+class OrmStore:
+    """Django async ORM behind the same collection API, keyed by db_table"""
+
+    def __init__(self):
+        self._models = {model._meta.db_table: model for model in apps.get_models()}
+
+    def __getitem__(self, name):
+        return OrmCollection(self._models[name])
+
+
+def to_q(filter):
+    """Translate the supported Mongo filter subset to a Q object"""
+    parts = []
+    for key, value in filter.items():
+        if key in ('$or', '$and'):
+            combine = or_ if key == '$or' else and_
+            parts.append(reduce(combine, [to_q(f) for f in value]))
+        elif isinstance(value, dict):
+            for op, arg in value.items():
+                if op == '$regex':
+                    lookup = 'iregex' if 'i' in value.get('$options', '') else 'regex'
+                    parts.append(Q(**{f'{key}__{lookup}': arg}))
+                elif op == '$ne':
+                    parts.append(~Q(**{key: arg}))
+                elif op != '$options':
+                    parts.append(Q(**{f'{key}__{ORM_LOOKUPS[op]}': arg}))
+        else:
+            parts.append(Q(**{key: value}))
+    return reduce(and_, parts, Q())
+
+
+ORM_LOOKUPS = {'$in': 'in', '$gt': 'gt', '$gte': 'gte', '$lt': 'lt', '$lte': 'lte'}
+
+
+def matches(doc, filter):
+    """Evaluate the supported Mongo filter subset against a document"""
+    for key, cond in filter.items():
+        if key == '$or':
+            if not any(matches(doc, f) for f in cond):
+                return False
+            continue
+        if key == '$and':
+            if not all(matches(doc, f) for f in cond):
+                return False
+            continue
+        value = doc.get(key)
+        if not isinstance(cond, dict):
+            if value != cond:
+                return False
+            continue
+        for op, arg in cond.items():
+            if op == '$in' and value not in arg:
+                return False
+            if op == '$ne' and value == arg:
+                return False
+            if op in ('$gt', '$gte', '$lt', '$lte'):
+                if value is None:
+                    return False
+                if op == '$gt' and not value > arg:
+                    return False
+                if op == '$gte' and not value >= arg:
+                    return False
+                if op == '$lt' and not value < arg:
+                    return False
+                if op == '$lte' and not value <= arg:
+                    return False
+            if op == '$regex':
+                flags = re.IGNORECASE if 'i' in cond.get('$options', '') else 0
+                if value is None or not re.search(arg, str(value), flags):
+                    return False
+    return True
+
+
+def project(doc, projection):
+    if not projection:
+        return dict(doc)
+    return {k: v for k, v in doc.items() if projection.get(k)}
+
+
+def get_store():
+    """Return the configured async store (ASYNC_DB['BACKEND'])"""
+    global _store
+    if _store is None:
+        config = getattr(settings, 'ASYNC_DB', {})
+        backend = config.get('BACKEND', 'orm')
+        if backend == 'motor':
+            _store = MotorStore()
+        elif backend == 'memory':
+            _store = MemoryStore(latency_ms=config.get('LATENCY_MS', 0))
+        else:
+            _store = OrmStore()
+    return _store
+
+
+def set_store(store):
+    """Swap the store (tests and benchmarks); returns the previous one"""
+    global _store
+    previous, _store = _store, store
+    return previous
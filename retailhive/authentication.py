@@ -0,0 +1,191 @@
+"""
+Token authentication with an in-process LRU + TTL cache of token -> user.
+
+DRF's TokenAuthentication reads the token and its user from the database on
+every request. CachedTokenAuthentication keeps recently used tokens (with
+the user and their role) in a bounded cache. Entries are dropped when the
+token is deleted (logout), the user is saved (password or status change) or
+their profile changes; the TTL bounds staleness across worker processes.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model, user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from apps.products.permissions import ROLE_CACHE_ATTR, get_user_role
+
+
+class TokenCache:
+    """Thread-safe LRU cache with a per-entry TTL and hit/miss counters"""
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user, token, role = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return user, token, role
+
+    def set(self, key, user, token, role):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, user, token, role)
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    def _remove(self, key):
+        _, user, _, _ = self._entries.pop(key)
+        keys = self._keys_by_user.get(user.pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user.pk]
+
+
+_config = getattr(settings, 'TOKEN_CACHE', {})
+token_cache = TokenCache(
+    max_size=_config.get('MAX_SIZE', 10000),
+    ttl=_config.get('TTL', 60),
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that serves repeat tokens from token_cache"""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            cached = self.load_credentials(key)
+        return self.build_credentials(*cached)
+
+    def load_credentials(self, key):
+        """Read the token, user and role from the database and cache them"""
+        try:
+            token = Token.objects.select_related('user').get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        user = token.user
+        role = get_user_role(user)
+        token_cache.set(key, user, token, role)
+        return user, token, role
+
+    def build_credentials(self, user, token, role):
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        # Each request gets its own copy so per-request state never leaks
+        user = copy.copy(user)
+        setattr(user, ROLE_CACHE_ATTR, role)
+        return user, token
+
+    async def aauthenticate(self, request):
+        """Async variant for plain Django async views; returns (user, token) or None"""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode() or len(auth) != 2:
+            return None
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        return await self.aauthenticate_key(key)
+
+    async def aauthenticate_key(self, key):
+        """(user, token) for a raw token key, e.g. one passed where headers can't be set"""
+        cached = token_cache.get(key)
+        if cached is None:
+            cached = await sync_to_async(self.load_credentials)(key)
+        return self.build_credentials(*cached)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=Token)
+def invalidate_regenerated_token(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_changed_user(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender='users.UserProfile')
+@receiver(post_delete, sender='users.UserProfile')
+def invalidate_changed_profile(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.user_id)
+
+
+@receiver(user_logged_out)
+def invalidate_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        token_cache.invalidate_user(user.pk)
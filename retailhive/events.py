@@ -0,0 +1,142 @@
+"""
+Publish/subscribe for the server-sent events endpoint.
+
+Writers publish (event, data) pairs to channels such as 'product:42' or
+'user:7'; each open event stream is a Subscription to a few channels.
+publish() is called from request threads, signal handlers and management
+commands, never blocks and costs a dict lookup when nobody listens.
+
+Backpressure: every subscription has a bounded queue (EVENTS['QUEUE_SIZE']).
+A client that reads slower than events arrive does not hold up writers or
+grow memory; when its queue is full it is emptied and a single 'resync'
+event is queued, telling the client to refetch its state.
+
+MemoryBroker only reaches streams served by the same process. Set
+EVENTS['BROKER'] to the dotted path of a class with the same interface
+(subscribe, unsubscribe, publish, has_subscribers) to fan out across
+workers, e.g. over Redis pub/sub.
+"""
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+_broker = None
+
+
+def get_config():
+    config = {
+        'BROKER': 'memory',
+        'QUEUE_SIZE': 100,
+        'MAX_SUBSCRIBERS': 1000,
+        'MAX_PRODUCTS': 50,
+        'HEARTBEAT_SECONDS': 15,
+        'MAX_CONNECTION_SECONDS': 300,
+    }
+    config.update(getattr(settings, 'EVENTS', {}))
+    return config
+
+
+class Subscription:
+    """One event stream: a bounded queue fed on the event loop that created it"""
+
+    def __init__(self, channels, queue_size, loop):
+        self.channels = frozenset(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, event):
+        # Runs on self.loop
+        if self.queue.full():
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(('resync', {'dropped': self.dropped}))
+        if self.queue.full():
+            self.dropped += 1
+        else:
+            self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class MemoryBroker:
+    """In-process broker; publish() is thread-safe and hands events to each subscriber's loop"""
+
+    def __init__(self, queue_size=100, max_subscribers=1000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._channels = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels):
+        """Subscribe the running event loop to channels; None when the broker is full"""
+        subscription = Subscription(channels, self.queue_size, asyncio.get_running_loop())
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            self._count += 1
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None and subscription in subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+            self._count -= 1
+
+    def has_subscribers(self, channel):
+        return channel in self._channels
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # The stream's loop is gone
+                self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {'subscribers': self._count, 'channels': len(self._channels)}
+
+
+def get_broker():
+    """Return the configured broker (EVENTS['BROKER'])"""
+    global _broker
+    if _broker is None:
+        config = get_config()
+        if config['BROKER'] == 'memory':
+            _broker = MemoryBroker(config['QUEUE_SIZE'], config['MAX_SUBSCRIBERS'])
+        else:
+            _broker = import_string(config['BROKER'])(config)
+    return _broker
+
+
+def set_broker(broker):
+    """Swap the broker (tests); returns the previous one"""
+    global _broker
+    previous, _broker = _broker, broker
+    return previous
+
+
+def publish(channel, event, data):
+    """Publish an event unless nobody is subscribed to the channel"""
+    broker = get_broker()
+    if broker.has_subscribers(channel):
+        broker.publish(channel, (event, data))
@@ -0,0 +1,137 @@
+"""
+Run independent database reads concurrently.
+
+Endpoints such as the admin dashboard issue several unrelated queries; run
+serially, each one pays a full network round trip. fan_out() runs them on
+a shared thread pool, at most `max_concurrency` at a time for one call,
+so the wall time approaches the slowest query instead of the sum.
+
+Worker threads get their own database connections. After each task they
+are released with close_old_connections(), which keeps them open for
+CONN_MAX_AGE like request threads do. Inside a transaction the reads run
+inline on the caller's connection, because other connections cannot see
+its uncommitted writes.
+
+A timeout abandons the work, it does not cancel it: tasks still queued are
+dropped, but a query already running keeps its worker thread until the
+database answers. So that a slow database cannot fill the shared pool
+with abandoned queries, each call site (the `site` argument) may only
+have MAX_PER_SITE fan-outs holding work in the pool. A call's slot is
+freed when its last task finishes, not when the call returns, and a call
+that finds no free slot runs its tasks inline on the request thread.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+_executor = None
+_executor_lock = threading.Lock()
+_site_slots = {}
+
+
+class FanoutTimeout(Exception):
+    """Raised when the fanned-out queries do not finish within the timeout"""
+
+
+def get_config():
+    config = {'MAX_WORKERS': 16, 'MAX_CONCURRENCY': 4, 'MAX_PER_SITE': 2, 'TIMEOUT': 10}
+    config.update(getattr(settings, 'FANOUT', {}))
+    return config
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_config()['MAX_WORKERS'],
+                thread_name_prefix='fanout',
+            )
+        return _executor
+
+
+def get_site_slots(site):
+    """The semaphore bounding how many fan-outs from `site` hold work in the pool"""
+    with _executor_lock:
+        if site not in _site_slots:
+            _site_slots[site] = threading.BoundedSemaphore(get_config()['MAX_PER_SITE'])
+        return _site_slots[site]
+
+
+def release_when_done(slots, futures):
+    """Release a site slot once every future (finished, running or cancelled) is done"""
+    pending = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            pending[0] -= 1
+            if pending[0]:
+                return
+        slots.release()
+
+    if not futures:
+        slots.release()
+    for future in futures:
+        future.add_done_callback(done)
+
+
+def run_task(func):
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+def in_transaction():
+    return any(conn.in_atomic_block for conn in connections.all(initialized_only=True))
+
+
+def fan_out(tasks, max_concurrency=None, timeout=None, site='default'):
+    """
+    Run a dict of {name: callable} concurrently and return {name: result}.
+
+    Raises FanoutTimeout if they have not all finished after `timeout`
+    seconds; tasks still running then are abandoned, not cancelled. The
+    first exception raised by a task is re-raised.
+    """
+    config = get_config()
+    max_concurrency = max_concurrency or config['MAX_CONCURRENCY']
+    timeout = config['TIMEOUT'] if timeout is None else timeout
+
+    if len(tasks) <= 1 or max_concurrency <= 1 or in_transaction():
+        return {name: func() for name, func in tasks.items()}
+
+    slots = get_site_slots(site)
+    if not slots.acquire(blocking=False):
+        # This site's earlier fan-outs are still holding workers
+        return {name: func() for name, func in tasks.items()}
+
+    executor = get_executor()
+    deadline = time.monotonic() + timeout
+    queue = list(tasks.items())
+    submitted = []
+    running = {}
+    results = {}
+    try:
+        while queue or running:
+            while queue and len(running) < max_concurrency:
+                name, func = queue.pop(0)
+                future = executor.submit(run_task, func)
+                submitted.append(future)
+                running[future] = name
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise FanoutTimeout(f'Timed out waiting for {sorted(running.values())}')
+            done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    finally:
+        for future in running:
+            future.cancel()
+        release_when_done(slots, submitted)
+    return results
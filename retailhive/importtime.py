@@ -0,0 +1,90 @@
+"""
+Import-time profile of a cold worker start.
+
+profile_startup() boots the project in a fresh interpreter under
+`python -X importtime`, the way a new WSGI worker does: django.setup(),
+the URLconf (which imports every view) and the middleware chain. The
+per-module lines it prints on stderr are parsed into rows of
+(module, self us, cumulative us, depth); depth 0 rows are the imports made
+directly by the boot code, so their cumulative times add up to the total.
+
+Modules listed in STARTUP['DEFERRED_MODULES'] are only needed by
+management commands or rarely used paths and should not be imported at
+boot; see retailhive.lazy.
+"""
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+
+STARTUP_CODE = (
+    'import django; django.setup(); '
+    'from django.urls import get_resolver; get_resolver().url_patterns; '
+    'from django.core.handlers.wsgi import WSGIHandler; WSGIHandler()'
+)
+
+
+def get_config():
+    config = {
+        'IMPORT_BUDGET_MS': 1500,
+        'DEFERRED_MODULES': ['numpy', 'motor'],
+    }
+    config.update(getattr(settings, 'STARTUP', {}))
+    return config
+
+
+def parse_importtime(output):
+    """[(module, self us, cumulative us, depth)] from -X importtime output"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            own, cumulative, name = line[len('import time:'):].split('|', 2)
+            own, cumulative = int(own), int(cumulative)
+        except ValueError:
+            continue  # the header line
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), own, cumulative, depth))
+    return rows
+
+
+def profile_startup(code=STARTUP_CODE, timeout=120):
+    """Run `code` in a new interpreter with this process's settings and path, and return its import rows"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(path for path in sys.path if path)
+    env.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        env=env, capture_output=True, text=True, timeout=timeout,
+    )
+    if result.returncode:
+        lines = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        raise RuntimeError(lines[-1] if lines else f'exit status {result.returncode}')
+    return parse_importtime(result.stderr)
+
+
+def total_ms(rows):
+    return sum(cumulative for _, _, cumulative, depth in rows if depth == 0) / 1000
+
+
+def by_package(rows):
+    """[(top-level package, self ms, module count)], slowest first"""
+    packages = defaultdict(lambda: [0, 0])
+    for name, own, _, _ in rows:
+        package = packages[name.split('.')[0]]
+        package[0] += own
+        package[1] += 1
+    return sorted(
+        ((name, own / 1000, count) for name, (own, count) in packages.items()),
+        key=lambda item: -item[1],
+    )
+
+
+def deferred_imports(rows, deferred=None):
+    """The deferred modules (or their submodules) that the profiled boot imported"""
+    deferred = get_config()['DEFERRED_MODULES'] if deferred is None else deferred
+    imported = {name.split('.')[0] for name, _, _, _ in rows}
+    return [name for name in deferred if name in imported]
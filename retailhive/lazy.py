@@ -0,0 +1,45 @@
+"""
+Deferred imports for heavy optional dependencies.
+
+Modules such as NumPy cost tens of milliseconds to import, yet most workers
+never touch the code paths that need them (offline builds, reconciliation).
+optional_module() checks that a module is installed without importing it
+and returns a proxy that imports it on first attribute access, so
+`np = optional_module('numpy')` keeps the usual `np is None` check while
+leaving the import cost to the first caller that needs it.
+"""
+import importlib
+import importlib.util
+import threading
+
+
+class LazyModule:
+    """Stand-in for a module, imported on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<lazy module {self._name!r} ({state})>'
+
+
+def optional_module(name):
+    """A LazyModule for `name` if it is installed, else None"""
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        spec = None
+    return LazyModule(name) if spec is not None else None
@@ -0,0 +1,144 @@
+"""
+Response compression for large API bodies.
+
+CompressionMiddleware compresses text-like responses (JSON, NDJSON, CSV,
+HTML, ...) of at least COMPRESSION['MIN_SIZE'] bytes. Smaller bodies fit in
+a packet or two anyway, and compressing them costs more CPU than it saves.
+Brotli is used when the client accepts it and the `brotli` package is
+installed, otherwise gzip. Streaming responses (the exports) are compressed
+chunk by chunk and flushed after each chunk, so rows keep arriving as they
+are produced.
+
+Responses that already have a Content-Encoding, such as pre-compressed
+pages, and server-sent event streams, whose events must reach the client
+as soon as they are written, are left alone. Like Django's GZipMiddleware, gzip output carries
+random bytes in its header to make BREACH-style length attacks harder,
+and strong ETags are made weak.
+"""
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MAX_RANDOM_BYTES = 100
+
+
+def get_config():
+    config = {
+        'MIN_SIZE': 1024,
+        'BROTLI_QUALITY': 5,
+        'CONTENT_TYPES': [
+            'application/json', 'application/x-ndjson', 'application/javascript',
+            'application/xml', 'text/',
+        ],
+        'EXCLUDED_CONTENT_TYPES': ['text/event-stream'],
+    }
+    config.update(getattr(settings, 'COMPRESSION', {}))
+    return config
+
+
+def accepted_encodings(header):
+    """Content codings the client accepts (q > 0) from an Accept-Encoding header"""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = accepted_encodings(header)
+    if brotli is not None and ('br' in accepted or '*' in accepted):
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding, quality=None):
+    """Compress a whole body with 'br' or 'gzip'"""
+    if encoding == 'br':
+        return brotli.compress(content, quality=quality or get_config()['BROTLI_QUALITY'])
+    return compress_string(content, max_random_bytes=MAX_RANDOM_BYTES)
+
+
+def brotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def brotli_async_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    async for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def gzip_async_sequence(sequence):
+    # One gzip member per chunk, as GZipMiddleware does for async streams
+    async for chunk in sequence:
+        yield compress_string(chunk, max_random_bytes=MAX_RANDOM_BYTES)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress large text responses with brotli or gzip"""
+
+    def process_response(self, request, response):
+        config = get_config()
+        if response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not any(content_type.startswith(prefix) for prefix in config['CONTENT_TYPES']):
+            return response
+        if content_type in config['EXCLUDED_CONTENT_TYPES']:
+            return response
+        if not response.streaming and len(response.content) < config['MIN_SIZE']:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            content = response.streaming_content
+            if encoding == 'br':
+                sequence = brotli_async_sequence if response.is_async else brotli_sequence
+                response.streaming_content = sequence(content, config['BROTLI_QUALITY'])
+            elif response.is_async:
+                response.streaming_content = gzip_async_sequence(content)
+            else:
+                response.streaming_content = compress_sequence(content, max_random_bytes=MAX_RANDOM_BYTES)
+            del response.headers['Content-Length']
+        else:
+            compressed = compress(response.content, encoding, config['BROTLI_QUALITY'])
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
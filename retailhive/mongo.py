@@ -0,0 +1,178 @@
+"""
+Process-wide MongoDB client shared by djongo and the management commands.
+
+Every MongoClient owns a connection pool, so creating (or closing) one per
+request throws away already authenticated TLS connections to Atlas. This
+module keeps a single pooled client per process, recreates it after a fork
+and exposes counters of how many connections the pool had to set up.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from pymongo import MongoClient
+from pymongo.monitoring import ConnectionPoolListener
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionStats(ConnectionPoolListener):
+    """Counts pool events so connection setups can be measured"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.check_out_failed = 0
+            self.pools_cleared = 0
+
+    def _incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'created': self.created,
+                'closed': self.closed,
+                'checked_out': self.checked_out,
+                'check_out_failed': self.check_out_failed,
+                'pools_cleared': self.pools_cleared,
+            }
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr('pools_cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._incr('created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr('closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incr('check_out_failed')
+
+    def connection_checked_out(self, event):
+        self._incr('checked_out')
+
+    def connection_checked_in(self, event):
+        pass
+
+
+stats = ConnectionStats()
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+_last_health_check = 0.0
+
+
+def get_mongo_alias():
+    """Return the database alias served by djongo"""
+    for alias, config in settings.DATABASES.items():
+        if config.get('ENGINE') == 'djongo':
+            return alias
+    return 'default'
+
+
+def get_client_options():
+    """Build MongoClient kwargs from the database CLIENT and MONGO_POOL settings"""
+    options = dict(settings.DATABASES[get_mongo_alias()].get('CLIENT', {}))
+    options.update(getattr(settings, 'MONGO_POOL', {}))
+    # djongo expects documents to keep their field order
+    options.setdefault('document_class', OrderedDict)
+    return options
+
+
+def get_client():
+    """Return the shared MongoClient, creating it on first use in this process"""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _lock:
+        if _client is None or _client_pid != pid:
+            # A client inherited from the parent process must not be used
+            # (or closed) in a forked worker; just drop the reference.
+            _client = MongoClient(
+                event_listeners=[stats],
+                connect=False,
+                **get_client_options()
+            )
+            _client_pid = pid
+            logger.debug('Created pooled MongoClient for pid %s', pid)
+    return _client
+
+
+def get_database(name=None):
+    """Return a database handle on the shared client"""
+    return get_client()[name or settings.DATABASES[get_mongo_alias()]['NAME']]
+
+
+def ping():
+    """Run a ping against the cluster, returning the round trip in ms or None"""
+    started = time.monotonic()
+    try:
+        get_client().admin.command('ping')
+    except Exception as e:
+        logger.warning('MongoDB health check failed: %s', e)
+        return None
+    return (time.monotonic() - started) * 1000
+
+
+def is_healthy():
+    """Throttled health check used when reusing persistent connections"""
+    global _last_health_check
+    interval = getattr(settings, 'MONGO_HEALTH_CHECK_INTERVAL', 30)
+    now = time.monotonic()
+    if now - _last_health_check < interval:
+        return True
+    if ping() is None:
+        return False
+    _last_health_check = now
+    return True
+
+
+def reset_client(close=True):
+    """Discard the shared client, closing its pool unless told otherwise"""
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and close and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def _reset_after_fork():
+    global _client, _client_pid, _lock
+    # Sockets and locks copied from the parent are unusable in the child
+    _lock = threading.Lock()
+    _client = None
+    _client_pid = None
+    stats._lock = threading.Lock()
+    stats.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,62 @@
+"""
+Fast JSON rendering for API responses.
+
+FastJSONRenderer encodes with orjson when it is installed, which is several
+times faster than the stdlib encoder behind DRF's JSONRenderer on large
+payloads such as the product list. With the default settings the output
+is the same JSON that JSONRenderer writes:
+  - types orjson does not know (Decimal, lazy strings, QuerySets,
+    timedelta, ...) go through DRF's own JSONEncoder.default, so a raw
+    Decimal still renders as a number;
+  - UTC datetimes end in 'Z' (OPT_UTC_Z), as DRF writes them;
+  - non-string dict keys are converted like json.dumps converts them;
+  - U+2028 and U+2029 are escaped so the body is also valid JavaScript.
+The exceptions: floats that need an exponent are spelled differently
+(1e-5 rather than 1e-05), and NaN or infinity render as null where
+JSONRenderer raises.
+Requests for indented output (the browsable API, ?indent=), settings
+that change the output (UNICODE_JSON or COMPACT_JSON off) and values
+orjson rejects (such as integers over 64 bits) fall back to
+JSONRenderer.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+_encoder = JSONEncoder()
+
+
+def dumps(data):
+    """Encode `data` as compact UTF-8 JSON bytes the way JSONRenderer does, using orjson if available"""
+    if orjson is None:
+        return JSONRenderer().render(data)
+    body = orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+    if b'\xe2\x80\xa8' in body or b'\xe2\x80\xa9' in body:
+        body = body.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return body
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson when it is installed"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            orjson is None
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return dumps(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
@@ -1,14 +1,17 @@
 import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Apply djongo patch to fix connection issues
-try:
-    import patch_djongo
-except ImportError:
-    pass
+# Storage backend for the default database: 'mongo' (djongo), 'sqlite' or 'postgres'
+DB_BACKEND = os.getenv('DB_BACKEND', 'mongo')
+
+# Optional second backend exposed as the 'mirror' alias (see `manage.py copy_store`)
+DB_MIRROR = os.getenv('DB_MIRROR', '')
+
+MONGO_ENABLED = 'mongo' in (DB_BACKEND, DB_MIRROR)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -28,14 +31,17 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
-    'djongo',
     'apps.products',
     'apps.users',
     'apps.orders',
 ]
 
+if MONGO_ENABLED:
+    INSTALLED_APPS.insert(INSTALLED_APPS.index('apps.products'), 'djongo')
+
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'retailhive.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,9 +71,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'retailhive.wsgi.application'
 
-# MongoDB Database
-DATABASES = {
-    'default': {
+# Databases, one entry per supported backend
+DATABASE_BACKENDS = {
+    'mongo': {
         'ENGINE': 'djongo',
         'NAME': 'retailhive',
         'ENFORCE_SCHEMA': False,
@@ -76,11 +82,48 @@ DATABASES = {
             'authSource': 'admin',
             'authMechanism': 'SCRAM-SHA-1',
             'tlsAllowInvalidCertificates': True,
-        }
-    }
+        },
+        # Keep connections across requests; the shared client pools sockets
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+    },
+    'sqlite': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('SQLITE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')),
+    },
+    'postgres': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('POSTGRES_DB', 'retailhive'),
+        'USER': os.getenv('POSTGRES_USER', 'retailhive'),
+        'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+        'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+        'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+
+DATABASES = {
+    'default': DATABASE_BACKENDS[DB_BACKEND],
+}
+
+if DB_MIRROR and DB_MIRROR != DB_BACKEND:
+    DATABASES['mirror'] = DATABASE_BACKENDS[DB_MIRROR]
+
+# Pool options for the process-wide MongoClient (see retailhive/mongo.py)
+MONGO_POOL = {
+    'maxPoolSize': int(os.getenv('MONGO_MAX_POOL_SIZE', '50')),
+    'minPoolSize': int(os.getenv('MONGO_MIN_POOL_SIZE', '0')),
+    'maxIdleTimeMS': int(os.getenv('MONGO_MAX_IDLE_TIME_MS', '300000')),
+    'serverSelectionTimeoutMS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '10000')),
+    'heartbeatFrequencyMS': int(os.getenv('MONGO_HEARTBEAT_FREQUENCY_MS', '10000')),
 }
 
-# Disable Django's database migrations for MongoDB
+# Seconds between pings when a persistent connection is reused
+MONGO_HEALTH_CHECK_INTERVAL = int(os.getenv('MONGO_HEALTH_CHECK_INTERVAL', '30'))
+
+# Disable Django's database migrations for MongoDB; SQL backends create
+# their tables (and Meta.indexes) with `manage.py migrate --run-syncdb`
 MIGRATION_MODULES = {
     'contenttypes': None,
     'auth': None,
@@ -104,15 +147,132 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'retailhive.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed when installed; same output as JSONRenderer (retailhive.renderers)
+    'DEFAULT_RENDERER_CLASSES': [
+        'retailhive.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': None,  # Disable pagination to avoid djongo issues
     'PAGE_SIZE': 20
 }
 
+# Brotli/gzip compression of large text responses (retailhive.middleware)
+COMPRESSION = {
+    'MIN_SIZE': int(os.getenv('COMPRESSION_MIN_SIZE', '1024')),
+    'BROTLI_QUALITY': int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5')),
+}
+
+# In-process token -> user cache used by CachedTokenAuthentication
+TOKEN_CACHE = {
+    'MAX_SIZE': int(os.getenv('TOKEN_CACHE_MAX_SIZE', '10000')),
+    'TTL': int(os.getenv('TOKEN_CACHE_TTL', '60')),
+}
+
+# Concurrent fan-out of independent reads (retailhive.fanout)
+FANOUT = {
+    'MAX_WORKERS': int(os.getenv('FANOUT_MAX_WORKERS', '16')),
+    'MAX_CONCURRENCY': int(os.getenv('FANOUT_MAX_CONCURRENCY', '4')),
+    # Fan-outs per call site that may hold pool workers, including abandoned ones
+    'MAX_PER_SITE': int(os.getenv('FANOUT_MAX_PER_SITE', '2')),
+    'TIMEOUT': float(os.getenv('FANOUT_TIMEOUT', '10')),
+}
+
+# In-memory facet bitsets for products/facets/ (apps.products.facets)
+FACET_INDEX = {
+    'PRICE_BUCKETS': [0, 25, 50, 100, 250, 500, 1000],
+    'MIN_REBUILD_INTERVAL': int(os.getenv('FACET_INDEX_MIN_REBUILD_INTERVAL', '5')),
+    'MAX_AGE': int(os.getenv('FACET_INDEX_MAX_AGE', '60')),
+}
+
+# Search suggestions (apps.products.suggest)
+SUGGEST = {
+    'MAX_AGE': int(os.getenv('SUGGEST_MAX_AGE', '3600')),
+    'SNAPSHOT_MAX_AGE': int(os.getenv('SUGGEST_SNAPSHOT_MAX_AGE', '86400')),
+}
+
+# Popularity rankings (apps.products.ranking); weights are per unit ordered / added / review
+RANKING = {
+    'BOARDS': {
+        'top_sellers': {
+            'half_life_hours': float(os.getenv('RANKING_TOP_SELLERS_HALF_LIFE_HOURS', '720')),
+            'weights': {'order': 1.0},
+        },
+        'trending': {
+            'half_life_hours': float(os.getenv('RANKING_TRENDING_HALF_LIFE_HOURS', '24')),
+            'weights': {'order': 3.0, 'cart': 1.0, 'review': 2.0},
+        },
+    },
+    'RELOAD_CHECK_INTERVAL': int(os.getenv('RANKING_RELOAD_CHECK_INTERVAL', '30')),
+}
+
+# "Frequently bought together" (apps.products.recommendations, built by build_recommendations)
+RECOMMENDATIONS = {
+    'TOP_N': int(os.getenv('RECOMMENDATIONS_TOP_N', '20')),
+    'MIN_COUNT': int(os.getenv('RECOMMENDATIONS_MIN_COUNT', '2')),
+    'MAX_BASKET': int(os.getenv('RECOMMENDATIONS_MAX_BASKET', '50')),
+    'CHUNK_SIZE': int(os.getenv('RECOMMENDATIONS_CHUNK_SIZE', '200000')),
+    'SHARDS': int(os.getenv('RECOMMENDATIONS_SHARDS', '1')),
+    'RELOAD_CHECK_INTERVAL': int(os.getenv('RECOMMENDATIONS_RELOAD_CHECK_INTERVAL', '30')),
+}
+
+# Idempotency-Key handling for order and cart writes (apps.orders.idempotency)
+IDEMPOTENCY = {
+    'TTL': int(os.getenv('IDEMPOTENCY_TTL', '86400')),
+    'IN_FLIGHT_TIMEOUT': int(os.getenv('IDEMPOTENCY_IN_FLIGHT_TIMEOUT', '60')),
+}
+
+# Cold start import budget, checked by `manage.py profile_imports --check` (retailhive.importtime)
+STARTUP = {
+    'IMPORT_BUDGET_MS': float(os.getenv('STARTUP_IMPORT_BUDGET_MS', '1500')),
+    # Only needed by management commands or rarely used paths; imported lazily
+    'DEFERRED_MODULES': ['numpy', 'motor'],
+}
+
+# Pre-rendered product list pages for anonymous requests (apps.products.catalog)
+CATALOG_SNAPSHOT = {
+    'PAGE_SIZE': int(os.getenv('CATALOG_SNAPSHOT_PAGE_SIZE', '48')),
+    'MIN_REBUILD_INTERVAL': int(os.getenv('CATALOG_SNAPSHOT_MIN_REBUILD_INTERVAL', '5')),
+    'MAX_AGE': int(os.getenv('CATALOG_SNAPSHOT_MAX_AGE', '600')),
+    'RELOAD_CHECK_INTERVAL': int(os.getenv('CATALOG_SNAPSHOT_RELOAD_CHECK_INTERVAL', '5')),
+    # Public API URL the image links are built against; the snapshot is off while empty
+    'BASE_URL': os.getenv('CATALOG_SNAPSHOT_BASE_URL', ''),
+}
+
+# Product change feed for incremental sync (apps.products.changes)
+CHANGE_FEED = {
+    'BATCH_SIZE': int(os.getenv('CHANGE_FEED_BATCH_SIZE', '500')),
+    'MAX_BATCH_SIZE': int(os.getenv('CHANGE_FEED_MAX_BATCH_SIZE', '5000')),
+    # Entries younger than this are held back until their transactions have committed
+    'SETTLE_SECONDS': float(os.getenv('CHANGE_FEED_SETTLE_SECONDS', '2')),
+    # compact_product_changes keeps every entry younger than this
+    'RETENTION_DAYS': int(os.getenv('CHANGE_FEED_RETENTION_DAYS', '7')),
+}
+
+# On-disk snapshots of in-memory indexes (retailhive.snapshots)
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join(BASE_DIR, 'snapshots'))
+
+# Async store used by the ASGI views ('motor', 'orm' or 'memory')
+ASYNC_DB = {
+    'BACKEND': os.getenv('ASYNC_DB_BACKEND', 'motor' if DB_BACKEND == 'mongo' else 'orm'),
+    'LATENCY_MS': float(os.getenv('ASYNC_DB_LATENCY_MS', '0')),
+}
+
+# Server-sent events for live stock and cart updates (retailhive.events)
+EVENTS = {
+    # 'memory' (this process only) or the dotted path of a broker class taking this dict
+    'BROKER': os.getenv('EVENTS_BROKER', 'memory'),
+    'QUEUE_SIZE': int(os.getenv('EVENTS_QUEUE_SIZE', '100')),
+    'MAX_SUBSCRIBERS': int(os.getenv('EVENTS_MAX_SUBSCRIBERS', '1000')),
+    'MAX_PRODUCTS': int(os.getenv('EVENTS_MAX_PRODUCTS', '50')),
+    'HEARTBEAT_SECONDS': float(os.getenv('EVENTS_HEARTBEAT_SECONDS', '15')),
+    'MAX_CONNECTION_SECONDS': float(os.getenv('EVENTS_MAX_CONNECTION_SECONDS', '300')),
+}
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -121,6 +281,9 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_ALL_ORIGINS = DEBUG
 
+# The client sends Idempotency-Key on order and cart writes
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
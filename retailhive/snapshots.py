@@ -0,0 +1,63 @@
+"""
+On-disk snapshots of in-memory indexes.
+
+Indexes that are expensive to build from the database (search suggestions,
+rankings, recommendations) save a snapshot after a full build, so a new
+worker can load the snapshot instead of rebuilding. Snapshots are pickles
+written atomically (temp file + rename) under SNAPSHOT_DIR. They carry a
+format version and the time they were built, and loading returns None
+when the file is missing, unreadable, from another version, or older
+than max_age.
+
+Snapshots are only ever read from SNAPSHOT_DIR, which must not be
+writable by untrusted users (pickle).
+"""
+import os
+import pickle
+import tempfile
+import time
+
+from django.conf import settings
+
+
+def snapshot_path(name):
+    return os.path.join(settings.SNAPSHOT_DIR, f'{name}.pickle')
+
+
+def snapshot_mtime(name):
+    """Modification time of snapshot `name`, or None if it doesn't exist"""
+    try:
+        return os.path.getmtime(snapshot_path(name))
+    except OSError:
+        return None
+
+
+def save_snapshot(name, data, version=1):
+    """Atomically write data as snapshot `name`; returns the file path"""
+    path = snapshot_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = {'version': version, 'built_at': time.time(), 'data': data}
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'.{name}.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+
+def load_snapshot(name, version=1, max_age=None):
+    """Return (data, built_at) for snapshot `name`, or None if it is missing, stale or unreadable"""
+    try:
+        with open(snapshot_path(name), 'rb') as f:
+            payload = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+        return None
+    if not isinstance(payload, dict) or payload.get('version') != version:
+        return None
+    if max_age is not None and time.time() - payload['built_at'] > max_age:
+        return None
+    return payload['data'], payload['built_at']
@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+class CachedTokenAuthTest(APITestCase):
+    def setUp(self):
+        from rest_framework.authtoken.models import Token
+        from retailhive.authentication import token_cache
+        token_cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+    
+    def test_token_is_cached_and_invalidated_on_delete(self):
+        from retailhive.authentication import token_cache
+        self.assertEqual(self.client.get('/api/orders/orders/').status_code, status.HTTP_200_OK)
+        hits = token_cache.stats()['hits']
+        self.assertEqual(self.client.get('/api/orders/orders/').status_code, status.HTTP_200_OK)
+        self.assertEqual(token_cache.stats()['hits'], hits + 1)
+        
+        self.token.delete()
+        self.assertEqual(self.client.get('/api/orders/orders/').status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_password_change_invalidates_cache(self):
+        from retailhive.authentication import token_cache
+        self.client.get('/api/orders/orders/')
+        self.assertEqual(token_cache.stats()['size'], 1)
+        self.user.set_password('newpass')
+        self.user.save()
+        self.assertEqual(token_cache.stats()['size'], 0)
@@ -46,7 +46,9 @@ api.interceptors.response.use(
                         error.message || 
                         'An error occurred';
     
-    return Promise.reject(new Error(errorMessage));
+    const wrapped = new Error(errorMessage);
+    wrapped.status = error.response?.status;
+    return Promise.reject(wrapped);
   }
 );
 
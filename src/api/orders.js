@@ -1,5 +1,24 @@
 import api from './axios';
 
+const MAX_RETRIES = 2;
+
+// Writes send an Idempotency-Key and retry with the same key when the
+// response was lost (timeout, dropped connection) or the first attempt is
+// still running (409); the server replays the original result instead of
+// placing the order or adding the item twice.
+const idempotentRequest = async (send) => {
+  const config = { headers: { 'Idempotency-Key': crypto.randomUUID() } };
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await send(config);
+    } catch (error) {
+      const retryable = error.status === undefined || error.status === 409;
+      if (!retryable || attempt >= MAX_RETRIES) throw error;
+      await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** attempt));
+    }
+  }
+};
+
 export const ordersAPI = {
   getOrders: async () => {
     try {
@@ -13,7 +32,7 @@ export const ordersAPI = {
 
   createOrder: async (orderData) => {
     try {
-      const response = await api.post('/orders/orders/create_order/', orderData);
+      const response = await idempotentRequest((config) => api.post('/orders/orders/create_order/', orderData, config));
       return response.data;
     } catch (error) {
       console.error('Error creating order:', error);
@@ -21,6 +40,16 @@ export const ordersAPI = {
     }
   },
 
+  cancelOrder: async (orderId, reason = '') => {
+    try {
+      const response = await api.post(`/orders/orders/${orderId}/cancel/`, { reason });
+      return response.data;
+    } catch (error) {
+      console.error('Error cancelling order:', error);
+      throw error;
+    }
+  },
+
   getCart: async () => {
     try {
       const response = await api.get('/orders/cart/');
@@ -33,7 +62,7 @@ export const ordersAPI = {
 
   addToCart: async (itemData) => {
     try {
-      const response = await api.post('/orders/cart/add/', itemData);
+      const response = await idempotentRequest((config) => api.post('/orders/cart/add/', itemData, config));
       return response.data;
     } catch (error) {
       console.error('Error adding to cart:', error);
@@ -43,7 +72,7 @@ export const ordersAPI = {
 
   removeFromCart: async (itemId) => {
     try {
-      const response = await api.delete(`/orders/cart/remove/${itemId}/`);
+      const response = await idempotentRequest((config) => api.delete(`/orders/cart/remove/${itemId}/`, config));
       return response.data;
     } catch (error) {
       console.error('Error removing from cart:', error);
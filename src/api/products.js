@@ -21,6 +21,50 @@ export const productsAPI = {
     }
   },
 
+  suggest: async (query, limit = 8) => {
+    try {
+      const response = await api.get('/products/products/suggest/', {
+        params: { q: query, limit }
+      });
+      return response.data.suggestions || [];
+    } catch (error) {
+      console.error('Error fetching suggestions:', error);
+      return [];
+    }
+  },
+
+  topSellers: async (limit = 8, category = null) => {
+    try {
+      const params = { limit };
+      if (category) params.category = category;
+      const response = await api.get('/products/products/top_sellers/', { params });
+      return response.data.results || [];
+    } catch (error) {
+      console.error('Error fetching top sellers:', error);
+      return [];
+    }
+  },
+
+  facets: async (params = {}) => {
+    try {
+      const response = await api.get('/products/products/facets/', { params });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching facets:', error);
+      return { count: 0, results: [], facets: { category: [], price: [], rating: [], in_stock: 0 } };
+    }
+  },
+
+  getReviews: async (id, params = {}) => {
+    try {
+      const response = await api.get(`/products/products/${id}/reviews/`, { params });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching reviews:', error);
+      throw error;
+    }
+  },
+
   searchProducts: async (query) => {
     try {
       const response = await api.get('/products/products/search/', {
@@ -33,6 +77,16 @@ export const productsAPI = {
     }
   },
 
+  // Change feed: without `since` only the cursor to follow from; throws so
+  // callers can tell a 410 (cursor older than the compacted log) apart
+  getChanges: async (since = null, limit = null) => {
+    const params = {};
+    if (since !== null) params.since = since;
+    if (limit) params.limit = limit;
+    const response = await api.get('/products/products/changes/', { params });
+    return response.data;
+  },
+
   getCategories: async () => {
     try {
       const response = await api.get('/products/categories/');
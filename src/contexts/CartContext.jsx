@@ -1,7 +1,13 @@
-import React, { createContext, useContext, useState, useEffect } from 'react';
+import React, { createContext, useContext, useState, useEffect, useCallback } from 'react';
+import api from '../api/axios.js';
 import { ordersAPI } from '../api/orders.js';
 import { useAuth } from './AuthContext.jsx';
 
+// Server-sent events for cart changes (other tabs and devices) and stock of
+// the products in the cart or on screen, instead of refetching to notice them
+const EVENTS_URL = `${api.defaults.baseURL}/orders/async/events/`;
+const MAX_WATCHED_PRODUCTS = 50;
+
 const CartContext = createContext();
 
 export const useCart = () => {
@@ -15,6 +21,8 @@ export const useCart = () => {
 export const CartProvider = ({ children }) => {
   const [cart, setCart] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [stockLevels, setStockLevels] = useState({});
+  const [watched, setWatched] = useState({});
   const { isAuthenticated } = useAuth();
 
   const fetchCart = async () => {
@@ -63,12 +71,70 @@ export const CartProvider = ({ children }) => {
     }
   }, [isAuthenticated]);
 
+  // Subscribe to live stock levels for a product while it is shown; returns the unsubscribe
+  const watchProduct = useCallback((productId) => {
+    const id = Number(productId);
+    setWatched(prev => ({ ...prev, [id]: (prev[id] || 0) + 1 }));
+    return () => setWatched(prev => {
+      const next = { ...prev };
+      if (next[id] > 1) next[id] -= 1;
+      else delete next[id];
+      return next;
+    });
+  }, []);
+
+  const productIds = [...new Set([
+    ...(cart?.items || []).map(item => item.product?.id).filter(Boolean),
+    ...Object.keys(watched).map(Number),
+  ])].sort((a, b) => a - b).slice(0, MAX_WATCHED_PRODUCTS).join(',');
+
+  useEffect(() => {
+    const token = localStorage.getItem('token');
+    if (!productIds && !(isAuthenticated && token)) return undefined;
+
+    const params = new URLSearchParams();
+    if (productIds) params.set('products', productIds);
+    if (isAuthenticated && token) params.set('token', token);
+    const source = new EventSource(`${EVENTS_URL}?${params}`);
+    let timer;
+    let dropped = false;
+    // Several cart events in a row (checkout empties the cart) cost one refetch
+    const refetchCart = () => {
+      clearTimeout(timer);
+      timer = setTimeout(() => {
+        if (isAuthenticated) fetchCart();
+      }, 200);
+    };
+
+    // 'ready' arrives on every (re)connect; after a dropped connection events may have been missed
+    source.addEventListener('ready', () => {
+      if (dropped) refetchCart();
+      dropped = false;
+    });
+    source.addEventListener('cart', refetchCart);
+    source.addEventListener('resync', refetchCart);
+    source.addEventListener('product', (event) => {
+      const change = JSON.parse(event.data);
+      setStockLevels(prev => ({ ...prev, [change.product]: change.stock_quantity ?? 0 }));
+    });
+    source.onerror = () => {
+      dropped = true;
+    };
+
+    return () => {
+      clearTimeout(timer);
+      source.close();
+    };
+  }, [isAuthenticated, productIds]);
+
   const value = {
     cart,
     loading,
     addToCart,
     removeFromCart,
     fetchCart,
+    stockLevels,
+    watchProduct,
     cartItemsCount: cart?.total_items || 0,
     cartTotal: cart?.total_price || 0
   };
@@ -54,6 +54,16 @@ const CustomerDashboard = () => {
     }
   };
 
+  const handleCancelOrder = async (orderId) => {
+    if (!window.confirm(`Cancel order #${orderId}?`)) return;
+    try {
+      await ordersAPI.cancelOrder(orderId);
+      fetchDashboardData();
+    } catch (error) {
+      alert(error.message || 'Failed to cancel order');
+    }
+  };
+
   if (!isAuthenticated) {
     return (
       <div className="container mx-auto px-4 py-8 text-center">
@@ -286,6 +296,14 @@ const CustomerDashboard = () => {
                           <p className="text-sm text-gray-600">
                             <strong>Shipping Address:</strong> {order.shipping_address}
                           </p>
+                          {['pending', 'processing'].includes(order.status) && (
+                            <button
+                              onClick={() => handleCancelOrder(order.id)}
+                              className="mt-3 text-sm text-red-600 hover:text-red-800"
+                            >
+                              Cancel order
+                            </button>
+                          )}
                         </div>
                       </div>
                     ))}
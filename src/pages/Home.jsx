@@ -12,8 +12,14 @@ const Home = () => {
   useEffect(() => {
     const fetchFeaturedProducts = async () => {
       try {
-        const data = await productsAPI.getProducts({ page_size: 8 });
-        setFeaturedProducts(data.results || data);
+        // Best sellers come from the ranking service; fall back to the newest products
+        const topSellers = await productsAPI.topSellers(8);
+        if (topSellers.length > 0) {
+          setFeaturedProducts(topSellers);
+        } else {
+          const data = await productsAPI.facets({ page_size: 8 });
+          setFeaturedProducts(data.results);
+        }
       } catch (error) {
         console.error('Error fetching featured products:', error);
       } finally {
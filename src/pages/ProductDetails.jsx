@@ -13,19 +13,29 @@ const ProductDetails = () => {
   const [quantity, setQuantity] = useState(1);
   const [review, setReview] = useState({ rating: 5, comment: '' });
   const [submittingReview, setSubmittingReview] = useState(false);
+  const [reviews, setReviews] = useState([]);
+  const [reviewsCursor, setReviewsCursor] = useState(null);
+  const [reviewSort, setReviewSort] = useState('recent');
+  const [loadingReviews, setLoadingReviews] = useState(false);
   
-  const { addToCart } = useCart();
+  const { addToCart, stockLevels, watchProduct } = useCart();
   const { isAuthenticated } = useAuth();
 
   useEffect(() => {
     fetchProduct();
   }, [id]);
 
+  // Live stock level from the cart's event stream
+  useEffect(() => watchProduct(id), [id, watchProduct]);
+
   const fetchProduct = async () => {
     try {
       setLoading(true);
       const data = await productsAPI.getProduct(id);
       setProduct(data);
+      setReviews(data.reviews || []);
+      setReviewsCursor(data.reviews_next_cursor || null);
+      setReviewSort('recent');
     } catch (error) {
       console.error('Error fetching product:', error);
     } finally {
@@ -33,6 +43,26 @@ const ProductDetails = () => {
     }
   };
 
+  const fetchReviews = async (sort, cursor = null) => {
+    try {
+      setLoadingReviews(true);
+      const params = { sort };
+      if (cursor) params.cursor = cursor;
+      const data = await productsAPI.getReviews(id, params);
+      setReviews(prev => (cursor ? [...prev, ...data.results] : data.results));
+      setReviewsCursor(data.next_cursor);
+    } catch (error) {
+      console.error('Error fetching reviews:', error);
+    } finally {
+      setLoadingReviews(false);
+    }
+  };
+
+  const handleReviewSortChange = (e) => {
+    setReviewSort(e.target.value);
+    fetchReviews(e.target.value);
+  };
+
   const handleAddToCart = async () => {
     if (!isAuthenticated) {
       alert('Please login to add items to cart');
@@ -79,6 +109,9 @@ const ProductDetails = () => {
     );
   }
 
+  const stockQuantity = stockLevels[product.id] ?? product.stock_quantity;
+  const inStock = stockQuantity > 0;
+
   return (
     <div className="container mx-auto px-4 py-8">
       <div className="grid grid-cols-1 lg:grid-cols-2 gap-8 mb-12">
@@ -115,19 +148,19 @@ const ProductDetails = () => {
               ))}
             </div>
             <span className="ml-2 text-gray-600">
-              ({product.reviews?.length || 0} reviews)
+              ({product.rating_summary?.count ?? product.reviews?.length ?? 0} reviews)
             </span>
           </div>
 
           {/* Stock Status */}
           <div className="mb-6">
-            <span className={`text-sm font-medium ${product.is_in_stock ? 'text-green-600' : 'text-red-600'}`}>
-              {product.is_in_stock ? `In Stock (${product.stock_quantity} available)` : 'Out of Stock'}
+            <span className={`text-sm font-medium ${inStock ? 'text-green-600' : 'text-red-600'}`}>
+              {inStock ? `In Stock (${stockQuantity} available)` : 'Out of Stock'}
             </span>
           </div>
 
           {/* Quantity and Add to Cart */}
-          {product.is_in_stock && (
+          {inStock && (
             <div className="flex items-center space-x-4 mb-6">
               <div className="flex items-center">
                 <label htmlFor="quantity" className="mr-2 text-sm font-medium">
@@ -139,7 +172,7 @@ const ProductDetails = () => {
                   onChange={(e) => setQuantity(parseInt(e.target.value))}
                   className="px-3 py-1 border border-gray-300 rounded focus:outline-none focus:ring-2 focus:ring-blue-500"
                 >
-                  {[...Array(Math.min(10, product.stock_quantity))].map((_, i) => (
+                  {[...Array(Math.min(10, stockQuantity))].map((_, i) => (
                     <option key={i + 1} value={i + 1}>
                       {i + 1}
                     </option>
@@ -201,8 +234,19 @@ const ProductDetails = () => {
 
         {/* Reviews List */}
         <div className="space-y-6">
-          {product.reviews && product.reviews.length > 0 ? (
-            product.reviews.map((review, index) => (
+          {reviews.length > 0 && (
+            <select
+              value={reviewSort}
+              onChange={handleReviewSortChange}
+              className="border border-gray-300 rounded-md px-3 py-1 text-sm"
+            >
+              <option value="recent">Most recent</option>
+              <option value="highest">Highest rated</option>
+              <option value="lowest">Lowest rated</option>
+            </select>
+          )}
+          {reviews.length > 0 ? (
+            reviews.map((review, index) => (
               <div key={index} className="border-b pb-4">
                 <div className="flex items-center mb-2">
                   <div className="flex text-yellow-400">
@@ -229,6 +273,11 @@ const ProductDetails = () => {
           ) : (
             <p className="text-gray-500">No reviews yet. Be the first to review this product!</p>
           )}
+          {reviewsCursor && (
+            <Button onClick={() => fetchReviews(reviewSort, reviewsCursor)} loading={loadingReviews}>
+              Load more reviews
+            </Button>
+          )}
         </div>
       </div>
     </div>
@@ -3,23 +3,90 @@ import { productsAPI } from '../api/products.js';
 import ProductCard from '../components/ProductCard.jsx';
 import Loader from '../components/Loader.jsx';
 
+const PAGE_SIZE = 24;
+const CHANGE_POLL_MS = 30000;
+
 const ProductList = () => {
   const [products, setProducts] = useState([]);
   const [categories, setCategories] = useState([]);
+  const [facetCounts, setFacetCounts] = useState(null);
+  const [totalCount, setTotalCount] = useState(0);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [searchQuery, setSearchQuery] = useState('');
+  const [appliedQuery, setAppliedQuery] = useState('');
+  const [suggestions, setSuggestions] = useState([]);
   const [selectedCategory, setSelectedCategory] = useState('');
+  const [selectedPrice, setSelectedPrice] = useState('');
+  const [minRating, setMinRating] = useState('');
+  const [inStockOnly, setInStockOnly] = useState(false);
 
   useEffect(() => {
-    fetchProducts();
     fetchCategories();
   }, []);
 
+  useEffect(() => {
+    fetchProducts();
+  }, [appliedQuery, selectedCategory, selectedPrice, minRating, inStockOnly]);
+
+  // Keep the loaded products' price, stock and availability current from the
+  // change feed instead of downloading the list again
+  useEffect(() => {
+    let since = null;
+    let active = true;
+    let timer;
+    const poll = async () => {
+      try {
+        let data;
+        do {
+          data = await productsAPI.getChanges(since);
+          if (since !== null) applyChanges(data.results);
+          since = data.next_since;
+        } while (data.has_more && active);
+      } catch (error) {
+        // 410: fell behind the compacted log, so start following from now
+        if (error.response?.status === 410) since = null;
+      }
+      if (active) timer = setTimeout(poll, CHANGE_POLL_MS);
+    };
+    poll();
+    return () => {
+      active = false;
+      clearTimeout(timer);
+    };
+  }, []);
+
+  // Autocomplete from the suggestion index while typing (debounced)
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!query) {
+      setSuggestions([]);
+      return undefined;
+    }
+    const timer = setTimeout(async () => {
+      setSuggestions(await productsAPI.suggest(query));
+    }, 150);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
+
+  // Filtering and facet counts happen on the server; only one page is downloaded
+  const buildParams = (offset) => {
+    const params = { offset, page_size: PAGE_SIZE };
+    if (appliedQuery) params.q = appliedQuery;
+    if (selectedCategory) params.category = selectedCategory;
+    if (selectedPrice) params.price = selectedPrice;
+    if (minRating) params.min_rating = minRating;
+    if (inStockOnly) params.in_stock = 1;
+    return params;
+  };
+
   const fetchProducts = async () => {
     try {
       setLoading(true);
-      const data = await productsAPI.getProducts();
-      setProducts(data.results || data);
+      const data = await productsAPI.facets(buildParams(0));
+      setProducts(data.results);
+      setTotalCount(data.count);
+      setFacetCounts(data.facets);
     } catch (error) {
       console.error('Error fetching products:', error);
     } finally {
@@ -27,6 +94,33 @@ const ProductList = () => {
     }
   };
 
+  const fetchMore = async () => {
+    try {
+      setLoadingMore(true);
+      const data = await productsAPI.facets(buildParams(products.length));
+      setProducts(prev => [...prev, ...data.results]);
+    } catch (error) {
+      console.error('Error fetching products:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const applyChanges = (changes) => {
+    if (changes.length === 0) return;
+    // Later entries of a product carry its newest values
+    const latest = new Map(changes.map(change => [change.product, change]));
+    setProducts(prev => prev
+      .filter(product => {
+        const change = latest.get(product.id);
+        return !change || (!change.changes.includes('deleted') && change.is_active);
+      })
+      .map(product => {
+        const change = latest.get(product.id);
+        return change ? { ...product, price: change.price, stock_quantity: change.stock_quantity } : product;
+      }));
+  };
+
   const fetchCategories = async () => {
     try {
       const data = await productsAPI.getCategories();
@@ -36,29 +130,15 @@ const ProductList = () => {
     }
   };
 
-  const handleSearch = async (e) => {
+  const handleSearch = (e) => {
     e.preventDefault();
-    if (!searchQuery.trim()) {
-      fetchProducts();
-      return;
-    }
-
-    try {
-      setLoading(true);
-      const data = await productsAPI.searchProducts(searchQuery);
-      setProducts(data);
-    } catch (error) {
-      console.error('Error searching products:', error);
-    } finally {
-      setLoading(false);
-    }
+    setAppliedQuery(searchQuery.trim());
   };
 
-  const filteredProducts = selectedCategory
-    ? products.filter(product => product.category === parseInt(selectedCategory))
-    : products;
+  const countFor = (facet, key, value) =>
+    facetCounts?.[facet]?.find(item => item[key] === value)?.count ?? 0;
 
-  if (loading) {
+  if (loading && products.length === 0) {
     return <Loader text="Loading products..." />;
   }
 
@@ -66,7 +146,7 @@ const ProductList = () => {
     <div className="container mx-auto px-4 py-8">
       <div className="mb-8">
         <h1 className="text-3xl font-bold text-gray-900 mb-6">Products</h1>
-        
+
         {/* Search and Filter */}
         <div className="flex flex-col md:flex-row gap-4 mb-6">
           <form onSubmit={handleSearch} className="flex-1">
@@ -77,7 +157,14 @@ const ProductList = () => {
                 className="flex-1 px-4 py-2 border border-gray-300 rounded-l-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
                 value={searchQuery}
                 onChange={(e) => setSearchQuery(e.target.value)}
+                list="product-suggestions"
+                autoComplete="off"
               />
+              <datalist id="product-suggestions">
+                {suggestions.map((suggestion) => (
+                  <option key={`${suggestion.kind}-${suggestion.id}`} value={suggestion.text} />
+                ))}
+              </datalist>
               <button
                 type="submit"
                 className="px-6 py-2 bg-blue-600 text-white rounded-r-lg hover:bg-blue-700 focus:outline-none focus:ring-2 focus:ring-blue-500"
@@ -86,7 +173,7 @@ const ProductList = () => {
               </button>
             </div>
           </form>
-          
+
           <select
             className="px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
             value={selectedCategory}
@@ -95,27 +182,78 @@ const ProductList = () => {
             <option value="">All Categories</option>
             {categories.map((category) => (
               <option key={category.id} value={category.id}>
-                {category.name}
+                {'\u00a0\u00a0'.repeat(category.depth || 0)}{category.name} ({countFor('category', 'id', category.id)})
+              </option>
+            ))}
+          </select>
+        </div>
+
+        <div className="flex flex-wrap items-center gap-4">
+          <select
+            className="px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
+            value={selectedPrice}
+            onChange={(e) => setSelectedPrice(e.target.value)}
+          >
+            <option value="">Any price</option>
+            {(facetCounts?.price || []).map((bucket) => (
+              <option key={bucket.key} value={bucket.key} disabled={bucket.count === 0}>
+                {bucket.max === null ? `$${bucket.min}+` : `$${bucket.min} - $${bucket.max}`} ({bucket.count})
               </option>
             ))}
           </select>
+
+          <select
+            className="px-4 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
+            value={minRating}
+            onChange={(e) => setMinRating(e.target.value)}
+          >
+            <option value="">Any rating</option>
+            {(facetCounts?.rating || []).map((level) => (
+              <option key={level.min} value={level.min}>
+                {level.min}+ stars ({level.count})
+              </option>
+            ))}
+          </select>
+
+          <label className="flex items-center gap-2 text-gray-700">
+            <input
+              type="checkbox"
+              checked={inStockOnly}
+              onChange={(e) => setInStockOnly(e.target.checked)}
+            />
+            In stock only ({facetCounts?.in_stock ?? 0})
+          </label>
+
+          <span className="text-sm text-gray-500">{totalCount} products</span>
         </div>
       </div>
 
       {/* Products Grid */}
-      {filteredProducts.length === 0 ? (
+      {products.length === 0 ? (
         <div className="text-center py-12">
           <p className="text-gray-500 text-lg">No products found.</p>
         </div>
       ) : (
         <div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6">
-          {filteredProducts.map((product) => (
+          {products.map((product) => (
             <ProductCard key={product.id} product={product} />
           ))}
         </div>
       )}
+
+      {products.length < totalCount && (
+        <div className="text-center mt-8">
+          <button
+            onClick={fetchMore}
+            disabled={loadingMore}
+            className="px-6 py-2 bg-blue-600 text-white rounded-lg hover:bg-blue-700 disabled:opacity-50"
+          >
+            {loadingMore ? 'Loading...' : 'Load more'}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
 
-export default ProductList;
\ No newline at end of file
+export default ProductList;